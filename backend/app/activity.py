@@ -0,0 +1,155 @@
+# app/activity.py
+"""Per-user activity rollup behind /api/users/{id}/activity.
+
+user_project_activity holds one row per (user, project) the user has
+commented on or voted for: their vote, their comment count and when they last
+did either. Comment and vote writes call record_comment()/record_votes() in
+the same transaction, so the profile page is one indexed range scan joined to
+projects instead of a handful of queries per touched project.
+
+rebuild() recomputes the table from comments and votes; it runs once when the
+table is added to an existing database.
+"""
+from datetime import datetime
+from typing import Iterable, Optional
+
+from sqlalchemy import String, and_, cast, delete, func, insert, null, or_, select, tuple_, union_all, update
+from sqlalchemy.orm import Session
+
+from .comment_threads import decode_cursor, encode_cursor
+from .models import Comment, Project, UserProjectActivity, Vote
+from .toggles import dialect_insert
+
+A = UserProjectActivity
+# votes carry no timestamp, so rows rebuilt from a vote alone sort last
+UNKNOWN_TIME = "1970-01-01T00:00:00"
+CHUNK = 300
+
+
+# ---- maintenance ----
+
+def record_comment(db: Session, user_id: int, project_id: int, created_at: str):
+    stmt = dialect_insert(db, A).values(user_id=user_id, project_id=project_id, comment_count=1, last_activity_at=created_at)
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=["user_id", "project_id"],
+        set_={"comment_count": A.comment_count + 1, "last_activity_at": stmt.excluded.last_activity_at},
+    ))
+
+
+def record_votes(db: Session, votes: Iterable[tuple[int, int, Optional[str]]], at: Optional[str] = None):
+    """Apply (user_id, project_id, vote_type) final states; vote_type None means the vote was removed"""
+    at = at or datetime.now().isoformat()
+    sets, removed = [], []
+    for user_id, project_id, vote_type in votes:
+        if vote_type is None:
+            removed.append((user_id, project_id))
+        else:
+            sets.append({"user_id": user_id, "project_id": project_id, "vote_type": vote_type, "comment_count": 0, "last_activity_at": at})
+    no_sync = {"synchronize_session": False}
+
+    for i in range(0, len(sets), CHUNK):
+        stmt = dialect_insert(db, A).values(sets[i:i + CHUNK])
+        db.execute(stmt.on_conflict_do_update(
+            index_elements=["user_id", "project_id"],
+            set_={"vote_type": stmt.excluded.vote_type, "last_activity_at": stmt.excluded.last_activity_at},
+        ))
+    for i in range(0, len(removed), CHUNK):
+        pairs = tuple_(A.user_id, A.project_id).in_(removed[i:i + CHUNK])
+        db.execute(update(A).where(pairs).values(vote_type=None), execution_options=no_sync)
+        # nothing left on the project: it drops off the profile
+        db.execute(delete(A).where(pairs, A.comment_count == 0), execution_options=no_sync)
+
+
+def record_vote(db: Session, user_id: int, project_id: int, vote_type: Optional[str]):
+    record_votes(db, [(user_id, project_id, vote_type)])
+
+
+def rebuild(db: Session) -> int:
+    """Recompute the whole table from comments and votes and commit; returns the row count"""
+    comments = select(
+        Comment.user_id, Comment.project_id, cast(null(), String).label("vote_type"),
+        func.count(Comment.id).label("comment_count"), func.max(Comment.created_at).label("at"),
+    ).group_by(Comment.user_id, Comment.project_id)
+    votes = select(Vote.user_id, Vote.project_id, Vote.vote_type, 0, cast(null(), String))
+    both = union_all(comments, votes).subquery()
+    rows = select(
+        both.c.user_id, both.c.project_id, func.max(both.c.vote_type), func.sum(both.c.comment_count),
+        func.coalesce(func.max(both.c.at), UNKNOWN_TIME),
+    ).group_by(both.c.user_id, both.c.project_id)
+
+    db.execute(delete(A), execution_options={"synchronize_session": False})
+    db.execute(insert(A).from_select(["user_id", "project_id", "vote_type", "comment_count", "last_activity_at"], rows))
+    count = db.query(func.count()).select_from(A).scalar()
+    db.commit()
+    return count
+
+
+def needs_rebuild(db: Session) -> bool:
+    """Empty rollup next to existing comments or votes, i.e. the table was just added"""
+    if db.query(A.user_id).first() is not None:
+        return False
+    return db.query(Comment.id).first() is not None or db.query(Vote.id).first() is not None
+
+
+# ---- read ----
+
+def load_activity(db: Session, user_id: int, limit: Optional[int] = None, before: Optional[str] = None) -> tuple[list[dict], Optional[str]]:
+    """Most recently touched projects first, with project tallies and the user's own vote/comments.
+
+    One query regardless of how many projects the user touched; the tallies are
+    correlated subqueries over the indexed project_id columns, evaluated only
+    for the rows on the page. Raises ValueError for a malformed cursor.
+    """
+    comments_count = select(func.count(Comment.id)).where(Comment.project_id == A.project_id).scalar_subquery()
+    upvotes = select(func.count(Vote.id)).where(Vote.project_id == A.project_id, Vote.vote_type == "upvote").scalar_subquery()
+    downvotes = select(func.count(Vote.id)).where(Vote.project_id == A.project_id, Vote.vote_type == "downvote").scalar_subquery()
+
+    query = (
+        db.query(
+            A.project_id, A.vote_type, A.comment_count, A.last_activity_at,
+            Project.title, Project.preamble, Project.location, Project.phase, Project.coordinates,
+            Project.image_url, Project.image_width, Project.image_height, Project.image_placeholder,
+            comments_count.label("comments_count"), upvotes.label("upvotes"), downvotes.label("downvotes"),
+        )
+        .join(Project, Project.id == A.project_id)
+        .filter(A.user_id == user_id)
+    )
+    if before:
+        at, project_id = decode_cursor(before)
+        query = query.filter(or_(
+            A.last_activity_at < at,
+            and_(A.last_activity_at == at, A.project_id < project_id),
+        ))
+    query = query.order_by(A.last_activity_at.desc(), A.project_id.desc())
+    if limit:
+        query = query.limit(limit + 1)
+
+    rows = query.all()
+    next_cursor = None
+    if limit and len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].last_activity_at, rows[-1].project_id)
+
+    projects = [
+        {
+            "id": r.project_id,
+            "title": r.title,
+            "description": r.preamble,
+            "location": r.location,
+            "phase": r.phase,
+            "comments_count": r.comments_count,
+            "upvotes": r.upvotes,
+            "downvotes": r.downvotes,
+            "user_vote": r.vote_type,
+            "user_comment_count": r.comment_count,
+            "latitude": r.coordinates.get("latitude") if r.coordinates else None,
+            "longitude": r.coordinates.get("longitude") if r.coordinates else None,
+            "images": r.image_url,
+            "image_width": r.image_width,
+            "image_height": r.image_height,
+            "image_placeholder": r.image_placeholder,
+            "last_activity_at": r.last_activity_at,
+        }
+        for r in rows
+    ]
+    return projects, next_cursor
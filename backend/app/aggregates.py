@@ -0,0 +1,43 @@
+# app/aggregates.py
+"""Grouped count queries for list routes: one query per statistic, not one per row.
+
+`ids=None` aggregates over the whole table, which is cheaper than a long IN list
+when the route lists everything anyway.
+"""
+from typing import Iterable, Optional
+
+from sqlalchemy import func, case
+from sqlalchemy.orm import Session
+
+
+def count_by(db: Session, model, key: str, ids: Optional[Iterable[int]] = None) -> dict[int, int]:
+    """{key value: row count}, e.g. count_by(db, Comment, "project_id")"""
+    col = getattr(model, key)
+    query = db.query(col, func.count(model.id))
+    if ids is not None:
+        query = query.filter(col.in_(list(ids)))
+    return dict(query.group_by(col).all())
+
+
+def vote_tallies(db: Session, vote_model, key: str, ids: Optional[Iterable[int]] = None) -> dict[int, tuple[int, int]]:
+    """{key value: (upvotes, downvotes)}"""
+    col = getattr(vote_model, key)
+    query = db.query(
+        col,
+        func.sum(case((vote_model.vote_type == "upvote", 1), else_=0)),
+        func.sum(case((vote_model.vote_type == "downvote", 1), else_=0)),
+    )
+    if ids is not None:
+        query = query.filter(col.in_(list(ids)))
+    return {k: (up, down) for k, up, down in query.group_by(col).all()}
+
+
+def user_votes(db: Session, vote_model, key: str, user_id: Optional[int], ids: Optional[Iterable[int]] = None) -> dict[int, str]:
+    """{key value: vote_type} for one user's votes"""
+    if not user_id:
+        return {}
+    col = getattr(vote_model, key)
+    query = db.query(col, vote_model.vote_type).filter(vote_model.user_id == user_id)
+    if ids is not None:
+        query = query.filter(col.in_(list(ids)))
+    return dict(query.all())
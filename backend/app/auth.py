@@ -6,3 +6,7 @@ def hash_password(pw: str) -> str:
 
 def verify_password(pw: str, pw_hash: str) -> bool:
     return pbkdf2_sha256.verify(pw, pw_hash)
+
+def hash_fixture_password(pw: str) -> str:
+    """Single-round hash for mock/seed users only; verify_password() accepts it"""
+    return pbkdf2_sha256.using(rounds=1).hash(pw)
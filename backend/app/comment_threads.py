@@ -0,0 +1,117 @@
+# app/comment_threads.py
+from dataclasses import dataclass
+from typing import Iterable, Optional
+
+from sqlalchemy import func, or_, and_
+from sqlalchemy.orm import Session
+
+from .models import User, Comment, CommentLike, PostComment, PostCommentLike
+
+
+@dataclass(frozen=True)
+class ThreadSpec:
+    """Which comment/like tables a thread lives in and the column it hangs off"""
+    comment: type
+    like: type
+    parent_key: str  # "project_id" or "post_id"
+
+
+PROJECT_THREAD = ThreadSpec(Comment, CommentLike, "project_id")
+POST_THREAD = ThreadSpec(PostComment, PostCommentLike, "post_id")
+
+
+def encode_cursor(created_at: str, comment_id: int) -> str:
+    return f"{created_at}|{comment_id}"
+
+
+def decode_cursor(cursor: str) -> tuple[str, int]:
+    """Raises ValueError for malformed cursors"""
+    created_at, _, comment_id = cursor.rpartition("|")
+    if not created_at:
+        raise ValueError("malformed cursor")
+    return created_at, int(comment_id)
+
+
+def like_counts(db: Session, like_model, comment_ids: Iterable[int]) -> dict[int, int]:
+    """{comment_id: likes} in one grouped query; comments without likes are absent"""
+    comment_ids = list(comment_ids)
+    if not comment_ids:
+        return {}
+    return dict(
+        db.query(like_model.comment_id, func.count(like_model.id))
+        .filter(like_model.comment_id.in_(comment_ids))
+        .group_by(like_model.comment_id)
+        .all()
+    )
+
+
+def liked_by(db: Session, like_model, user_id: Optional[int], comment_ids: Iterable[int]) -> set[int]:
+    """Which of comment_ids user_id has liked, in one query"""
+    comment_ids = list(comment_ids)
+    if not user_id or not comment_ids:
+        return set()
+    return {
+        row[0]
+        for row in db.query(like_model.comment_id).filter(
+            like_model.user_id == user_id,
+            like_model.comment_id.in_(comment_ids),
+        )
+    }
+
+
+def load_thread(
+    db: Session,
+    spec: ThreadSpec,
+    parent_id: int,
+    viewer_id: Optional[int] = None,
+    limit: Optional[int] = None,
+    before: Optional[str] = None,
+) -> tuple[list[dict], Optional[str]]:
+    """Newest-first comments for one project/post with authors, like counts and viewer likes.
+
+    Runs three queries regardless of thread size. `before` is a cursor from a
+    previous page; returns (comments, next_cursor) where next_cursor is None on
+    the last page.
+    """
+    C = spec.comment
+    parent_col = getattr(C, spec.parent_key)
+
+    query = (
+        db.query(C.id, parent_col, C.user_id, C.content, C.created_at, User.name)
+        .outerjoin(User, User.id == C.user_id)
+        .filter(parent_col == parent_id)
+    )
+    if before:
+        created_at, comment_id = decode_cursor(before)
+        query = query.filter(or_(
+            C.created_at < created_at,
+            and_(C.created_at == created_at, C.id < comment_id),
+        ))
+    query = query.order_by(C.created_at.desc(), C.id.desc())
+    if limit:
+        query = query.limit(limit + 1)
+
+    rows = query.all()
+    next_cursor = None
+    if limit and len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].created_at, rows[-1].id)
+
+    ids = [r.id for r in rows]
+    counts = like_counts(db, spec.like, ids)
+    liked = liked_by(db, spec.like, viewer_id, ids)
+
+    comments = [
+        {
+            "id": r.id,
+            spec.parent_key: r[1],
+            "user_id": r.user_id,
+            "user_name": r.name or "Unknown",
+            "content": r.content,
+            "created_at": r.created_at,
+            "likes": counts.get(r.id, 0),
+            "liked_by_user": r.id in liked,
+        }
+        for r in rows
+    ]
+    return comments, next_cursor
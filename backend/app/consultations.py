@@ -0,0 +1,116 @@
+# app/consultations.py
+"""Bulk consultation intake and export.
+
+validate_batch() checks every submitted item on its own, so one bad row only
+rejects that row; insert_batch() writes the accepted ones with executemany
+INSERT ... RETURNING in one transaction.
+
+export_csv()/export_ndjson() are generators for StreamingResponse. Rows come
+from a yield_per() cursor as plain tuples (no ORM identities to accumulate)
+and are emitted in chunks, so memory stays flat however many submissions a
+project has. Text cells in the CSV that a spreadsheet would run as a formula
+(=, +, -, @) are prefixed with '.
+"""
+import csv
+import io
+from datetime import datetime
+from typing import Iterator, Optional
+
+from pydantic import ValidationError
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+from .models import Consultation
+from .schemas import ConsultationCreate
+from .serialization import dumps
+
+EXPORT_COLUMNS = ("id", "project_id", "user_id", "phase", "content", "consent_at", "created_at")
+EXPORT_BATCH = 1000  # rows per database fetch and per streamed chunk
+INSERT_CHUNK = 500
+FORMULA_PREFIXES = ("=", "+", "-", "@", "\t", "\r")  # what spreadsheets read as the start of a formula
+
+
+def validate_batch(items: list, project_id: int, user_id: int) -> tuple[list[dict], list[dict]]:
+    """(rows to insert, one result per item); a result gets its id once inserted"""
+    now_iso = datetime.now().isoformat()
+    rows, results = [], []
+    for index, item in enumerate(items):
+        result = {"index": index, "ok": False}
+        results.append(result)
+        try:
+            body = ConsultationCreate.model_validate(item)
+        except ValidationError as e:
+            result["errors"] = [{"loc": list(err["loc"]), "msg": err["msg"]} for err in e.errors()]
+            continue
+        content = body.content.strip()
+        if body.project_id != project_id:
+            result["errors"] = [{"loc": ["project_id"], "msg": "project_id måste matcha :project_id i URL"}]
+        elif not content:
+            result["errors"] = [{"loc": ["content"], "msg": "Content får inte vara tomt"}]
+        else:
+            result["ok"] = True
+            rows.append({
+                "project_id": project_id,
+                "user_id": user_id,
+                "phase": body.phase,
+                "content": content,
+                "consent_at": now_iso,
+                "created_at": now_iso,
+            })
+    return rows, results
+
+
+def insert_batch(db: Session, rows: list[dict]) -> list[int]:
+    """Insert and commit; returns the new ids in the order of rows"""
+    ids = []
+    stmt = insert(Consultation).returning(Consultation.id, sort_by_parameter_order=True)
+    for i in range(0, len(rows), INSERT_CHUNK):
+        ids.extend(db.scalars(stmt, rows[i:i + INSERT_CHUNK]).all())
+    db.commit()
+    return ids
+
+
+def _export_query(db: Session, project_id: int, phase: Optional[str]):
+    query = db.query(*(getattr(Consultation, c) for c in EXPORT_COLUMNS)).filter(Consultation.project_id == project_id)
+    if phase:
+        query = query.filter(Consultation.phase == phase)
+    return query.order_by(Consultation.id).yield_per(EXPORT_BATCH)
+
+
+def _chunks(db: Session, project_id: int, phase: Optional[str]) -> Iterator[list]:
+    """Lists of up to EXPORT_BATCH row tuples; closes the session when done"""
+    try:
+        batch = []
+        for row in _export_query(db, project_id, phase):
+            batch.append(row)
+            if len(batch) >= EXPORT_BATCH:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+    finally:
+        db.close()
+
+
+def _spreadsheet_safe(value):
+    """Citizen text starting like a formula gets a leading ' so Excel shows it as text"""
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def export_csv(db: Session, project_id: int, phase: Optional[str] = None) -> Iterator[str]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    # BOM so Excel opens the UTF-8 file with å/ä/ö intact
+    yield "\ufeff" + ",".join(EXPORT_COLUMNS) + "\r\n"
+    for batch in _chunks(db, project_id, phase):
+        writer.writerows([_spreadsheet_safe(v) for v in row] for row in batch)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+
+def export_ndjson(db: Session, project_id: int, phase: Optional[str] = None) -> Iterator[bytes]:
+    for batch in _chunks(db, project_id, phase):
+        yield b"".join(dumps(dict(zip(EXPORT_COLUMNS, row))) + b"\n" for row in batch)
@@ -0,0 +1,176 @@
+# app/entity_cache.py
+"""Users and projects by id, cached per request and optionally per process.
+
+The request tier lives in Session.info and goes away with the session, so a
+route that looks up the same author or project several times hits the
+database once. The process tier is a TTL + LRU map of small frozen snapshots
+(UserRef, ProjectRef), off when cache_size=0. Writes that change a cached row
+call invalidate_user()/invalidate_project() after commit. With a bus
+(shared_state.InvalidationBus) the process-tier invalidation reaches every
+worker; without one, the TTL bounds how stale other workers can get.
+"""
+import time
+from collections import Counter, OrderedDict
+from dataclasses import dataclass
+from threading import Lock
+from typing import Callable, Iterable, Optional
+
+from sqlalchemy.orm import Session
+
+from .models import User, Project
+from .settings import settings
+from .shared_state import InvalidationBus, invalidation
+
+REQUEST_KEY = "entity_cache"
+
+
+@dataclass(frozen=True, slots=True)
+class UserRef:
+    id: int
+    name: str
+    bio: Optional[str]
+
+
+@dataclass(frozen=True, slots=True)
+class ProjectRef:
+    id: int
+    title: str
+    phase: Optional[str]
+
+
+def _load_users(db: Session, ids: list[int]) -> dict[int, UserRef]:
+    rows = db.query(User.id, User.name, User.bio).filter(User.id.in_(ids))
+    return {row.id: UserRef(id=row.id, name=row.name, bio=row.bio) for row in rows}
+
+
+def _load_projects(db: Session, ids: list[int]) -> dict[int, ProjectRef]:
+    rows = db.query(Project.id, Project.title, Project.phase).filter(Project.id.in_(ids))
+    return {row.id: ProjectRef(id=row.id, title=row.title, phase=row.phase) for row in rows}
+
+
+class EntityCache:
+    def __init__(self, cache_size: int = 0, ttl: float = 60.0, bus: Optional[InvalidationBus] = None):
+        self.cache_size = cache_size
+        self.ttl = ttl
+        self._cache: "OrderedDict[tuple[str, int], tuple[float, object]]" = OrderedDict()
+        self._lock = Lock()
+        self.stats = Counter()
+        self.bus = bus if cache_size else None  # nothing to invalidate elsewhere without a process tier
+        if self.bus:
+            for kind in ("user", "project"):
+                self.bus.register(f"entity-{kind}", lambda key, kind=kind: self._drop(kind, key))
+
+    # ---- process tier ----
+    def _cached(self, key: tuple[str, int]):
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires < time.monotonic():
+                del self._cache[key]
+                return None
+            self._cache.move_to_end(key)
+            return value
+
+    def _store(self, key: tuple[str, int], value):
+        with self._lock:
+            self._cache[key] = (time.monotonic() + self.ttl, value)
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    # ---- lookups ----
+    def _get_many(self, db: Session, kind: str, ids: Iterable[int], load: Callable) -> dict:
+        local = db.info.setdefault(REQUEST_KEY, {})
+        found, missing = {}, []
+        for id_ in dict.fromkeys(ids):
+            key = (kind, id_)
+            if key in local:
+                self.stats["request_hits"] += 1
+                value = local[key]
+            elif self.cache_size and (value := self._cached(key)) is not None:
+                self.stats["process_hits"] += 1
+                local[key] = value
+            else:
+                missing.append(id_)
+                continue
+            if value is not None:
+                found[id_] = value
+
+        if missing:
+            self.stats["misses"] += len(missing)
+            loaded = load(db, missing)
+            for id_ in missing:
+                value = loaded.get(id_)
+                # misses are only remembered for the request; the row may be created later
+                local[(kind, id_)] = value
+                if value is not None:
+                    found[id_] = value
+                    if self.cache_size:
+                        self._store((kind, id_), value)
+        return found
+
+    def users(self, db: Session, user_ids: Iterable[int]) -> dict[int, UserRef]:
+        return self._get_many(db, "user", user_ids, _load_users)
+
+    def user(self, db: Session, user_id: int) -> Optional[UserRef]:
+        return self.users(db, [user_id]).get(user_id)
+
+    def projects(self, db: Session, project_ids: Iterable[int]) -> dict[int, ProjectRef]:
+        return self._get_many(db, "project", project_ids, _load_projects)
+
+    def project(self, db: Session, project_id: int) -> Optional[ProjectRef]:
+        return self.projects(db, [project_id]).get(project_id)
+
+    # ---- invalidation ----
+    def _drop(self, kind: str, key: str):
+        """Process tier only; key is an id or "*" for every entry of kind"""
+        if key == "*":
+            self._clear_local(kind)
+            return
+        with self._lock:
+            self._cache.pop((kind, int(key)), None)
+
+    def _clear_local(self, kind: Optional[str]):
+        with self._lock:
+            if kind is None:
+                self._cache.clear()
+            else:
+                for key in [k for k in self._cache if k[0] == kind]:
+                    del self._cache[key]
+
+    def _invalidate(self, kind: str, id_: int, db: Optional[Session]):
+        if db is not None:
+            db.info.get(REQUEST_KEY, {}).pop((kind, id_), None)
+        if self.bus:
+            self.bus.publish(f"entity-{kind}", id_)
+        else:
+            self._drop(kind, str(id_))
+
+    def invalidate_user(self, user_id: int, db: Optional[Session] = None):
+        self._invalidate("user", user_id, db)
+
+    def invalidate_project(self, project_id: int, db: Optional[Session] = None):
+        self._invalidate("project", project_id, db)
+
+    def clear(self, kind: Optional[str] = None):
+        if not self.bus:
+            self._clear_local(kind)
+            return
+        for k in ([kind] if kind else ["user", "project"]):
+            self.bus.publish(f"entity-{k}")
+
+    def metrics(self) -> dict:
+        hits = self.stats["request_hits"] + self.stats["process_hits"]
+        lookups = hits + self.stats["misses"]
+        return {
+            "request_hits": self.stats["request_hits"],
+            "process_hits": self.stats["process_hits"],
+            "misses": self.stats["misses"],
+            "size": len(self._cache),
+            "hit_rate": round(hits / lookups, 4) if lookups else None,
+        }
+
+
+entity_cache = EntityCache(cache_size=settings.ENTITY_CACHE_SIZE, ttl=settings.ENTITY_CACHE_TTL, bus=invalidation)
@@ -0,0 +1,237 @@
+# app/http_cache.py
+"""Conditional GET and response compression.
+
+ETags are derived from per-table generation counters (content_versions), not
+from the response body, so a 304 is answered before the route touches the
+data. Every session commit bumps the counters of the tables it wrote, in the
+same transaction, which keeps them correct across workers.
+"""
+import gzip
+import hashlib
+from typing import Callable, Iterable, Optional
+
+from fastapi import Depends, Request
+from fastapi.responses import Response
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from starlette.datastructures import Headers, MutableHeaders
+
+from .models import ContentVersion
+from .toggles import dialect_insert
+
+try:
+    import brotli
+except ImportError:  # brotli is optional, gzip is always available
+    brotli = None
+
+TOUCHED = "touched_tables"
+COMPRESSIBLE = ("application/json", "application/geo+json", "application/x-ndjson", "text/", "image/svg+xml")
+ENCODING_SUFFIX = {"gzip": "-gz", "br": "-br"}
+
+
+# ---- table generation counters ----
+
+def _touch(session: Session, tables: Iterable[str]):
+    session.info.setdefault(TOUCHED, set()).update(t for t in tables if t != ContentVersion.__tablename__)
+
+
+@event.listens_for(Session, "after_flush")
+def _track_flush(session, flush_context):
+    _touch(session, (obj.__table__.name for obj in (*session.new, *session.dirty, *session.deleted)))
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _track_execute(orm_execute_state):
+    # bulk insert/update/delete statements, e.g. the atomic toggles
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        _touch(orm_execute_state.session, [orm_execute_state.statement.table.name])
+
+
+@event.listens_for(Session, "before_commit")
+def _bump_versions(session):
+    session.flush()
+    tables = session.info.pop(TOUCHED, None)
+    if not tables:
+        return
+    stmt = dialect_insert(session, ContentVersion).values([{"name": t, "version": 1} for t in sorted(tables)])
+    stmt = stmt.on_conflict_do_update(index_elements=["name"], set_={"version": ContentVersion.version + 1})
+    # straight on the connection so the session events above don't see it
+    session.connection().execute(stmt)
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_touched(session):
+    session.info.pop(TOUCHED, None)
+
+
+def content_versions(db: Session, tables: Iterable[str]) -> dict[str, int]:
+    tables = list(tables)
+    rows = dict(db.query(ContentVersion.name, ContentVersion.version).filter(ContentVersion.name.in_(tables)).all())
+    return {t: rows.get(t, 0) for t in tables}
+
+
+# ---- conditional GET ----
+
+class NotModified(Exception):
+    def __init__(self, etag: str):
+        self.etag = etag
+
+
+def not_modified_handler(request: Request, exc: NotModified) -> Response:
+    return Response(status_code=304, headers=_cache_headers(request.scope["state"]))
+
+
+def _cache_headers(state: dict) -> dict:
+    headers = {"ETag": state["etag"], "Cache-Control": state["cache_control"]}
+    if state.get("vary"):
+        headers["Vary"] = state["vary"]
+    return headers
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*":
+            return True
+        candidate = candidate.removeprefix("W/").strip('"')
+        for suffix in ENCODING_SUFFIX.values():
+            candidate = candidate.removesuffix(suffix)
+        if candidate == etag.strip('"'):
+            return True
+    return False
+
+
+def conditional_get(
+    get_db: Callable,
+    tables: Iterable[str],
+    viewer: Optional[Callable] = None,
+    include_tables: Optional[dict[str, Iterable[str]]] = None,
+):
+    """Dependency that answers 304 when If-None-Match matches the current content version.
+
+    `viewer` is a dependency returning the requesting user id for routes whose
+    body differs per user (e.g. user_vote); such responses are marked private.
+    `include_tables` maps ?include= names to the extra tables they read.
+    """
+    tables = tuple(tables)
+    include_tables = {name: tuple(t) for name, t in (include_tables or {}).items()}
+
+    def check(request: Request, db: Session, viewer_id) -> None:
+        wanted = tables
+        for name in request.query_params.get("include", "").split(","):
+            wanted += tuple(t for t in include_tables.get(name.strip(), ()) if t not in wanted)
+        versions = content_versions(db, wanted)
+        key = "|".join([
+            # scheme and host too: bodies embed absolute URLs (geojson thumbnails)
+            str(request.base_url),
+            request.url.path,
+            str(sorted(request.query_params.multi_items())),
+            str(viewer_id),
+            *(f"{t}={v}" for t, v in versions.items()),
+        ])
+        etag = '"' + hashlib.sha1(key.encode()).hexdigest()[:20] + '"'
+        state = request.scope.setdefault("state", {})
+        state["etag"] = etag
+        state["cache_control"] = "private, no-cache" if viewer else "public, no-cache"
+        state["vary"] = "Authorization, Cookie" if viewer else None
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match and _etag_matches(if_none_match, etag):
+            raise NotModified(etag)
+
+    if viewer is None:
+        def dependency(request: Request, db: Session = Depends(get_db)):
+            check(request, db, None)
+    else:
+        def dependency(request: Request, db: Session = Depends(get_db), viewer_id=Depends(viewer)):
+            check(request, db, viewer_id)
+    return Depends(dependency)
+
+
+# ---- compression ----
+
+def _choose_encoding(accept_encoding: str) -> Optional[str]:
+    offered = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        if params.strip().startswith("q="):
+            try:
+                q = float(params.strip()[2:])
+            except ValueError:
+                q = 0.0
+        offered[name.strip().lower()] = q
+    if brotli is not None and offered.get("br", 0) > 0:
+        return "br"
+    if offered.get("gzip", 0) > 0:
+        return "gzip"
+    return None
+
+
+class CompressionMiddleware:
+    """gzip/brotli for complete bodies above minimum_size; streamed bodies pass through.
+
+    Also attaches the ETag/Cache-Control/Vary headers set by conditional_get().
+    """
+
+    def __init__(self, app, minimum_size: int = 1024, gzip_level: int = 6, brotli_quality: int = 5):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        state = scope.setdefault("state", {})
+        encoding = _choose_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        start_message = None
+        streaming = False
+
+        async def send_wrapper(message):
+            nonlocal start_message, streaming
+            if message["type"] == "http.response.start":
+                start_message = message
+                return
+            if message["type"] != "http.response.body" or streaming:
+                await send(message)
+                return
+
+            headers = MutableHeaders(raw=start_message["headers"])
+            if start_message["status"] == 200 and "etag" in state and "etag" not in headers:
+                for name, value in _cache_headers(state).items():
+                    if name == "Vary":
+                        headers.add_vary_header(value)
+                    else:
+                        headers[name] = value
+
+            body = message.get("body", b"")
+            if message.get("more_body", False):
+                # streaming response: forward as-is
+                streaming = True
+                await send(start_message)
+                await send(message)
+                return
+
+            content_type = headers.get("content-type", "")
+            if (
+                encoding
+                and len(body) >= self.minimum_size
+                and "content-encoding" not in headers
+                and content_type.startswith(COMPRESSIBLE)
+            ):
+                if encoding == "br":
+                    body = brotli.compress(body, quality=self.brotli_quality)
+                else:
+                    body = gzip.compress(body, compresslevel=self.gzip_level)
+                headers["Content-Encoding"] = encoding
+                headers["Content-Length"] = str(len(body))
+                headers.add_vary_header("Accept-Encoding")
+                if "etag" in headers:
+                    # a strong ETag must differ per representation
+                    headers["ETag"] = headers["etag"][:-1] + ENCODING_SUFFIX[encoding] + '"'
+            await send(start_message)
+            await send({"type": "http.response.body", "body": body})
+
+        await self.app(scope, receive, send_wrapper)
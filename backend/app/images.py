@@ -0,0 +1,425 @@
+# app/images.py
+"""Image proxy behind /api/img: project and post images resized to a few
+fixed widths, as WebP or JPEG, from a disk cache.
+
+A source URL is fetched once. The original is stored under the sha256 of its
+bytes and every variant under that hash plus width and format, so two URLs
+serving the same image share their variants, and a new width needs no
+second fetch. The cache directory is bounded by size: the least recently
+served files are deleted first (access order is kept in memory and in file
+mtimes, so it survives restarts). Variants never change for a given source,
+so responses carry a long max-age.
+
+Only http(s) URLs on IMG_ALLOWED_HOSTS (by default the hosts the scraped
+and seeded images come from) that resolve to public addresses are fetched,
+redirects included; IMG_ALLOW_PRIVATE lifts the address check for local
+testing. The connection goes to the address that was checked, with the
+Host header and TLS server name of the URL, so a DNS answer that changes
+between check and connect (rebinding) cannot redirect it. Fetch and resize run on a worker
+thread, and concurrent requests for the same variant share one fetch.
+
+The scraper can fill the same cache ahead of time (scrape.py --images):
+prefetch() stores the original and the map thumbnail variants, and returns
+the dimensions and a tiny placeholder image that are kept on the project
+row. Processing is skipped when an image's bytes hash to a stored entry.
+
+Without Pillow (it is in requirements.txt) thumbnail_url() returns the
+original URL unchanged and /api/img answers 501.
+"""
+import asyncio
+import base64
+import hashlib
+import http.client
+import io
+import ipaddress
+import json
+import logging
+import os
+import socket
+import ssl
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+from urllib.parse import quote, urljoin, urlsplit
+
+from anyio import to_thread
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # pragma: no cover - Pillow is in requirements.txt
+    Image = None
+
+log = logging.getLogger("stadsurr")
+
+WIDTHS = (160, 320, 640, 1280)
+THUMBNAIL_WIDTH = 320
+FORMATS = {"webp": "image/webp", "jpeg": "image/jpeg"}
+QUALITY = {"webp": 80, "jpeg": 82}
+PLACEHOLDER_SIZE = 16  # px, longest side of the inline blur placeholder
+FAILURE_TTL = 60.0  # seconds a failed source is not retried
+MAX_REDIRECTS = 5
+USER_AGENT = "StadsSurr image proxy"
+
+
+class ImageError(Exception):
+    def __init__(self, status: int, detail: str):
+        super().__init__(detail)
+        self.status = status
+        self.detail = detail
+
+
+def snap_width(width: int) -> int:
+    """The smallest fixed width at least `width` wide (the largest for anything bigger)"""
+    return next((w for w in WIDTHS if w >= width), WIDTHS[-1])
+
+
+def url_name(url: str) -> str:
+    return "url/" + hashlib.sha256(url.encode()).hexdigest()
+
+
+def source_name(digest: str) -> str:
+    return f"src/{digest[:2]}/{digest}"
+
+
+def variant_name(digest: str, width: int, fmt: str) -> str:
+    return f"var/{digest[:2]}/{digest}-{width}.{fmt}"
+
+
+def meta_name(digest: str) -> str:
+    return f"meta/{digest[:2]}/{digest}.json"
+
+
+def variant_etag(digest: str, width: int, fmt: str) -> str:
+    return f'"{digest[:20]}-{width}{fmt[0]}"'
+
+
+def thumbnail_url(src: Optional[str], base_url: str, width: int = THUMBNAIL_WIDTH) -> Optional[str]:
+    """Proxied URL for an http(s) image; anything else is returned as is"""
+    if Image is None or not src or not src.startswith(("http://", "https://")):
+        return src or None
+    return f"{base_url}/api/img?url={quote(src, safe='')}&w={width}"
+
+
+# ---- fetching ----
+
+def host_allowed(url: str, allowed_hosts: list[str]) -> bool:
+    host = (urlsplit(url).hostname or "").lower()
+    return not allowed_hosts or any(host == h or host.endswith("." + h) for h in allowed_hosts)
+
+
+def check_source_url(url: str, allowed_hosts: list[str], allow_private: bool) -> str:
+    """The address to connect to for `url`, once scheme, host and every
+    address the host resolves to have been checked"""
+    parts = urlsplit(url)
+    if parts.scheme not in ("http", "https") or not parts.hostname:
+        raise ImageError(400, "Ogiltig bildadress")
+    if not host_allowed(url, allowed_hosts):
+        raise ImageError(400, "Bildadressen är inte tillåten")
+    try:
+        infos = socket.getaddrinfo(parts.hostname, parts.port or 443, proto=socket.IPPROTO_TCP)
+    except socket.gaierror:
+        raise ImageError(502, "Kunde inte hämta bilden")
+    addresses = [info[4][0] for info in infos]
+    if not allow_private:
+        for address in addresses:
+            if not ipaddress.ip_address(address.split("%")[0]).is_global:
+                raise ImageError(400, "Bildadressen är inte tillåten")
+    return addresses[0]
+
+
+class _PinnedHTTPConnection(http.client.HTTPConnection):
+    """Connects to an already checked address; Host stays the URL's host"""
+
+    def __init__(self, host, port, address: str, timeout: float):
+        super().__init__(host, port, timeout=timeout)
+        self.address = address
+
+    def connect(self):
+        self.sock = socket.create_connection((self.address, self.port), self.timeout)
+
+
+class _PinnedHTTPSConnection(http.client.HTTPSConnection):
+    """As above, with the certificate and SNI checked against the URL's host"""
+
+    def __init__(self, host, port, address: str, timeout: float):
+        super().__init__(host, port, timeout=timeout, context=ssl.create_default_context())
+        self.address = address
+
+    def connect(self):
+        sock = socket.create_connection((self.address, self.port), self.timeout)
+        self.sock = self._context.wrap_socket(sock, server_hostname=self.host)
+
+
+def fetch(url: str, allowed_hosts: list[str], allow_private: bool, max_bytes: int, timeout: float) -> bytes:
+    """GET `url`, following redirects; each hop is checked and connected to
+    by the address that was checked, so DNS cannot change it in between"""
+    for _ in range(MAX_REDIRECTS + 1):
+        address = check_source_url(url, allowed_hosts, allow_private)
+        parts = urlsplit(url)
+        connection_class = _PinnedHTTPSConnection if parts.scheme == "https" else _PinnedHTTPConnection
+        connection = connection_class(parts.hostname, parts.port, address, timeout)
+        target = (parts.path or "/") + (f"?{parts.query}" if parts.query else "")
+        try:
+            connection.request("GET", target, headers={"User-Agent": USER_AGENT, "Accept": "image/*"})
+            response = connection.getresponse()
+            if response.status in (301, 302, 303, 307, 308) and response.getheader("Location"):
+                url = urljoin(url, response.getheader("Location"))
+                continue
+            if response.status != 200:
+                raise OSError(f"HTTP {response.status}")
+            if not response.getheader("Content-Type", "").startswith("image/"):
+                raise ImageError(502, "Adressen pekar inte på en bild")
+            body = response.read(max_bytes + 1)
+        except (OSError, http.client.HTTPException) as e:
+            log.warning(f"⚠️ Image fetch failed for {url}: {e}")
+            raise ImageError(502, "Kunde inte hämta bilden")
+        finally:
+            connection.close()
+        if len(body) > max_bytes:
+            raise ImageError(502, "Bilden är för stor")
+        return body
+    raise ImageError(502, "Kunde inte hämta bilden: för många omdirigeringar")
+
+
+def open_image(source: bytes, width: int):
+    """Decoded and upright, at a reduced scale when the format allows it"""
+    try:
+        image = Image.open(io.BytesIO(source))
+        image.draft("RGB", (width, width * 4))  # JPEG: decode at a reduced scale when possible
+        return ImageOps.exif_transpose(image)
+    except (OSError, ValueError, Image.DecompressionBombError) as e:
+        raise ImageError(502, f"Kunde inte läsa bilden: {e}")
+
+
+def render(source: bytes, width: int, fmt: str, image=None) -> bytes:
+    """Resize to `width` (never up) and encode as `fmt`; `image` is an
+    already opened copy of `source`, and is left unchanged"""
+    try:
+        image = open_image(source, width) if image is None else image.copy()
+        if image.width > width:
+            image.thumbnail((width, image.height), Image.LANCZOS)
+        if fmt == "jpeg" and image.mode != "RGB":
+            if image.mode in ("RGBA", "LA", "P"):
+                image = image.convert("RGBA")
+                background = Image.new("RGB", image.size, (255, 255, 255))
+                background.paste(image, mask=image.getchannel("A"))
+                image = background
+            else:
+                image = image.convert("RGB")
+        elif image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA" if "A" in image.getbands() or image.mode == "P" else "RGB")
+        out = io.BytesIO()
+        if fmt == "webp":
+            image.save(out, "WEBP", quality=QUALITY[fmt], method=4)
+        else:
+            image.save(out, "JPEG", quality=QUALITY[fmt], optimize=True, progressive=True)
+        return out.getvalue()
+    except (OSError, ValueError, Image.DecompressionBombError) as e:
+        raise ImageError(502, f"Kunde inte läsa bilden: {e}")
+
+
+# ---- disk cache ----
+
+class DiskCache:
+    """Files under `root` named by content, evicted least recently used first
+    once their total size passes `max_bytes`"""
+
+    def __init__(self, root: str, max_bytes: int):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._files: OrderedDict[str, int] = OrderedDict()  # name -> size, oldest first
+        self.size = 0
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+        found = []
+        for dirpath, _, filenames in os.walk(root):
+            for filename in filenames:
+                if filename.endswith(".tmp"):
+                    continue
+                path = os.path.join(dirpath, filename)
+                stat = os.stat(path)
+                found.append((stat.st_mtime, os.path.relpath(path, root), stat.st_size))
+        for _, name, size in sorted(found):
+            self._files[name] = size
+            self.size += size
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.root, name)
+
+    def get(self, name: str) -> Optional[bytes]:
+        with self._lock:
+            known = name in self._files
+            if known:
+                self._files.move_to_end(name)
+        try:
+            with open(self._path(name), "rb") as f:
+                data = f.read()
+            os.utime(self._path(name))
+        except FileNotFoundError:  # evicted by another worker
+            if known:
+                with self._lock:
+                    self.size -= self._files.pop(name, 0)
+            return None
+        if not known:  # written by another process (a worker, the scraper)
+            with self._lock:
+                if name not in self._files:
+                    self._files[name] = len(data)
+                    self.size += len(data)
+        return data
+
+    def put(self, name: str, data: bytes):
+        path = self._path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+        with self._lock:
+            self.size += len(data) - self._files.pop(name, 0)
+            self._files[name] = len(data)
+            evicted = []
+            while self.size > self.max_bytes and len(self._files) > 1:
+                old, size = self._files.popitem(last=False)
+                self.size -= size
+                evicted.append(old)
+        for old in evicted:
+            try:
+                os.remove(self._path(old))
+            except FileNotFoundError:
+                pass
+
+    def __len__(self) -> int:
+        return len(self._files)
+
+
+# ---- proxy ----
+
+class ImageProxy:
+    def __init__(self, cache: DiskCache, allowed_hosts: list[str], allow_private: bool, max_source_bytes: int, timeout: float):
+        self.cache = cache
+        self.allowed_hosts = [h.lower() for h in allowed_hosts]
+        self.allow_private = allow_private
+        self.max_source_bytes = max_source_bytes
+        self.timeout = timeout
+        self._inflight: dict[tuple, asyncio.Future] = {}
+        self._failures: dict[str, tuple[float, ImageError]] = {}
+        self.stats = {"hits": 0, "resized": 0, "fetched": 0, "failed": 0}
+
+    async def variant(self, url: str, width: int, fmt: str) -> tuple[bytes, str]:
+        """(encoded image, ETag); raises ImageError"""
+        key = (url, width, fmt)
+        pending = self._inflight.get(key)
+        if pending is not None:
+            return await asyncio.shield(pending)
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            result = await to_thread.run_sync(self._variant, url, width, fmt)
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            future.exception()  # retrieved here, so waiter-less failures are not logged as unhandled
+            raise
+        finally:
+            del self._inflight[key]
+
+    def _variant(self, url: str, width: int, fmt: str) -> tuple[bytes, str]:
+        mapped = self.cache.get(url_name(url))
+        digest = mapped.decode() if mapped else None
+        if digest:
+            data = self.cache.get(variant_name(digest, width, fmt))
+            if data is not None:
+                self.stats["hits"] += 1
+                return data, variant_etag(digest, width, fmt)
+
+        source = self.cache.get(source_name(digest)) if digest else None
+        if source is None:
+            failed = self._failures.get(url)
+            if failed and failed[0] > time.monotonic():
+                raise failed[1]
+            try:
+                source = fetch(url, self.allowed_hosts, self.allow_private, self.max_source_bytes, self.timeout)
+            except ImageError as e:
+                self.stats["failed"] += 1
+                if len(self._failures) > 10_000:
+                    self._failures.clear()
+                self._failures[url] = (time.monotonic() + FAILURE_TTL, e)
+                raise
+            self.stats["fetched"] += 1
+            digest = hashlib.sha256(source).hexdigest()
+            self.cache.put(source_name(digest), source)
+            self.cache.put(url_name(url), digest.encode())
+
+        data = render(source, width, fmt)
+        self.stats["resized"] += 1
+        self.cache.put(variant_name(digest, width, fmt), data)
+        return data, variant_etag(digest, width, fmt)
+
+    def prefetch(self, url: str, widths=(THUMBNAIL_WIDTH,)) -> dict:
+        """Fetch `url` now and store it with its variants at `widths`.
+
+        Returns the project row's image fields: content hash, dimensions and
+        an inline placeholder. When the fetched bytes hash to an image stored
+        before, the stored fields are returned without decoding it again.
+        """
+        source = fetch(url, self.allowed_hosts, self.allow_private, self.max_source_bytes, self.timeout)
+        self.stats["fetched"] += 1
+        digest = hashlib.sha256(source).hexdigest()
+        self.cache.put(url_name(url), digest.encode())
+        meta = self.cache.get(meta_name(digest))
+        missing = [(w, fmt) for w in widths for fmt in FORMATS if self.cache.get(variant_name(digest, w, fmt)) is None]
+        if meta is not None and not missing:
+            self.stats["hits"] += 1
+            return json.loads(meta)
+
+        self.cache.put(source_name(digest), source)
+        image = open_image(source, max(widths))
+        for w, fmt in missing:
+            self.cache.put(variant_name(digest, w, fmt), render(source, w, fmt, image))
+            self.stats["resized"] += 1
+        if meta is not None:
+            return json.loads(meta)
+        width, height = source_size(source)
+        fields = {
+            "image_hash": digest,
+            "image_width": width,
+            "image_height": height,
+            "image_placeholder": placeholder(image),
+        }
+        self.cache.put(meta_name(digest), json.dumps(fields).encode())
+        return fields
+
+
+def source_size(source: bytes) -> tuple[int, int]:
+    """Displayed (width, height) from the header alone; open_image() may have
+    decoded at a reduced scale"""
+    header = Image.open(io.BytesIO(source))
+    width, height = header.size
+    if header.getexif().get(0x0112) in (5, 6, 7, 8):  # EXIF orientation: rotated by 90°
+        width, height = height, width
+    return width, height
+
+
+def placeholder(image) -> str:
+    """A few hundred bytes of data: URI the client can show blurred (CSS filter) while the image loads"""
+    small = image.copy()
+    small.thumbnail((PLACEHOLDER_SIZE, PLACEHOLDER_SIZE), Image.BOX)
+    out = io.BytesIO()
+    small.convert("RGB").save(out, "WEBP", quality=40)
+    return "data:image/webp;base64," + base64.b64encode(out.getvalue()).decode()
+
+
+def create_image_proxy(settings) -> Optional[ImageProxy]:
+    if Image is None:
+        log.warning("⚠️ Pillow is not installed: thumbnails link the original images and /api/img answers 501")
+        return None
+    cache = DiskCache(settings.IMG_CACHE_DIR, int(settings.IMG_CACHE_MAX_MB * 2**20))
+    return ImageProxy(
+        cache,
+        allowed_hosts=settings.IMG_ALLOWED_HOSTS,
+        allow_private=settings.IMG_ALLOW_PRIVATE,
+        max_source_bytes=int(settings.IMG_MAX_SOURCE_MB * 2**20),
+        timeout=settings.IMG_FETCH_TIMEOUT,
+    )
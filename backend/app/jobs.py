@@ -0,0 +1,445 @@
+# app/jobs.py
+"""Background jobs: schedules, a queue table and the runners that drain it.
+
+A Job is a function of a Session with an optional trigger (Interval or Cron).
+The job_runs table is both the queue and the lock: a partial unique index
+allows one queued-or-running row per job, so however many web workers and
+job workers poll the same database, a job is enqueued once and runs in one
+place at a time (single flight). Claims are a conditional UPDATE, and a
+running row carries a lease (locked_until); a runner that dies mid-job leaves
+a row that is retried once the lease has passed.
+
+Failed runs are retried with exponential backoff up to max_attempts. When a
+run is done or has failed for good, the next tick enqueues the next
+occurrence of its trigger; occurrences missed while no runner was up are
+coalesced into a single run right away.
+
+JOBS_MODE picks where runs execute:
+
+    inprocess   an asyncio task in each web process polls the queue and runs
+                jobs on a daemon thread (the default)
+    worker      the web processes only serve requests; run
+                `python -m app.jobs worker` as a separate process
+    off         nothing runs; `python -m app.jobs run <job>` still works
+
+Durations and outcomes go to the /metrics histogram of the process that ran
+the job, and to job_runs for any process to read.
+"""
+import argparse
+import asyncio
+import logging
+import os
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Callable, Optional, Union
+
+from sqlalchemy import func, update
+from sqlalchemy.orm import Session
+
+from . import activity, metrics
+from .models import JobRun, User, UserFollow
+from .seed import refresh_projects_from_json, scraped_projects_path
+from .settings import settings
+from .toggles import dialect_insert
+
+log = logging.getLogger("stadsurr")
+
+PENDING = ("queued", "running")
+JOB_BUCKETS = (0.1, 0.5, 1, 5, 15, 60, 300, 900, 3600)
+JOB_DURATION = metrics.register(metrics.Histogram(
+    "stadssurr_job_duration_seconds", "Background job run time", JOB_BUCKETS, ("job", "status")
+))
+
+
+def _iso(dt: datetime) -> str:
+    return dt.isoformat(timespec="seconds")
+
+
+# ---- triggers ----
+
+@dataclass(frozen=True)
+class Interval:
+    seconds: float
+
+    def next_after(self, dt: datetime) -> datetime:
+        return dt + timedelta(seconds=self.seconds)
+
+
+class Cron:
+    """Five-field cron expression (minute hour day-of-month month day-of-week)
+    with *, lists, ranges and steps, in server local time."""
+
+    FIELDS = ((0, 59), (0, 23), (1, 31), (1, 12), (0, 6))
+
+    def __init__(self, expr: str):
+        parts = expr.split()
+        if len(parts) != 5:
+            raise ValueError(f"cron expression needs 5 fields: {expr!r}")
+        self.expr = expr
+        self.minutes, self.hours, self.days, self.months, self.weekdays = (
+            self._parse(part, lo, hi) for part, (lo, hi) in zip(parts, self.FIELDS)
+        )
+        # cron: when both day fields are restricted, either one matching is enough
+        self.either_day = parts[2] != "*" and parts[4] != "*"
+
+    @staticmethod
+    def _parse(part: str, lo: int, hi: int) -> frozenset:
+        values = set()
+        for item in part.split(","):
+            spec, _, step = item.partition("/")
+            if spec == "*":
+                start, end = lo, hi
+            elif "-" in spec:
+                start, end = (int(x) for x in spec.split("-"))
+            else:
+                start = end = int(spec)
+                if step:
+                    end = hi
+            if hi == 6:  # day of week: 7 is Sunday too
+                start, end = min(start, 7), min(end, 7)
+            values.update(range(start, end + 1, int(step or 1)))
+        if hi == 6 and 7 in values:
+            values.discard(7)
+            values.add(0)
+        if not values or min(values) < lo or max(values) > hi:
+            raise ValueError(f"cron field {part!r} outside {lo}-{hi}")
+        return frozenset(values)
+
+    def _day_matches(self, dt: datetime) -> bool:
+        dom = dt.day in self.days
+        dow = (dt.weekday() + 1) % 7 in self.weekdays
+        return (dom or dow) if self.either_day else (dom and dow)
+
+    def next_after(self, dt: datetime) -> datetime:
+        t = dt.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = t + timedelta(days=366 * 5)
+        while t < limit:
+            if t.month not in self.months:
+                t = (t.replace(day=1, hour=0, minute=0) + timedelta(days=32)).replace(day=1)
+            elif not self._day_matches(t):
+                t = t.replace(hour=0, minute=0) + timedelta(days=1)
+            elif t.hour not in self.hours:
+                t = t.replace(minute=0) + timedelta(hours=1)
+            elif t.minute not in self.minutes:
+                t += timedelta(minutes=1)
+            else:
+                return t
+        raise ValueError(f"cron expression never fires: {self.expr!r}")
+
+
+Trigger = Union[Interval, Cron]
+UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+
+def parse_trigger(spec: str) -> Optional[Trigger]:
+    """"every 6h" / "every 90s", a cron expression, or "" for run-by-hand only"""
+    spec = spec.strip()
+    if not spec:
+        return None
+    if spec.startswith("every "):
+        amount = spec[len("every "):].strip()
+        if amount[-1:] in UNITS:
+            return Interval(float(amount[:-1]) * UNITS[amount[-1]])
+        return Interval(float(amount))
+    return Cron(spec)
+
+
+# ---- registry ----
+
+@dataclass
+class Job:
+    name: str
+    func: Callable[[Session], Optional[str]]  # returns a short summary for job_runs.result
+    trigger: Optional[Trigger] = None  # None: only runs when enqueued
+    max_attempts: int = 3
+    retry_delay: float = 60.0  # seconds before the first retry, doubled after each failure
+    lease: float = 900.0  # seconds a run may take before another runner presumes it dead
+
+
+JOBS: dict[str, Job] = {}
+
+
+def register(job: Job) -> Job:
+    JOBS[job.name] = job
+    return job
+
+
+# ---- queue ----
+
+def enqueue(db: Session, name: str, run_at: Optional[datetime] = None) -> bool:
+    """Queue a run of `name` and commit. If one is already queued for later it
+    is moved up to run_at; returns False when a run is already pending."""
+    run_at = _iso(run_at or datetime.now())
+    inserted = db.execute(
+        dialect_insert(db, JobRun)
+        .values(job=name, status="queued", run_at=run_at, attempts=0)
+        .on_conflict_do_nothing(index_elements=["job"], index_where=JobRun.status.in_(PENDING))
+    ).rowcount
+    if not inserted:
+        db.execute(
+            update(JobRun).where(JobRun.job == name, JobRun.status == "queued", JobRun.run_at > run_at).values(run_at=run_at),
+            execution_options={"synchronize_session": False},
+        )
+    db.commit()
+    return bool(inserted)
+
+
+class JobRunner:
+    def __init__(self, session_factory, jobs: Optional[dict[str, Job]] = None, poll_interval: float = 5.0):
+        self.session_factory = session_factory
+        self.jobs = JOBS if jobs is None else jobs
+        self.poll_interval = poll_interval
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self._stop = threading.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    # -- one polling round --
+    def tick(self, now: Optional[datetime] = None) -> int:
+        """Schedule what is due, recover dead runs, run everything claimable; returns runs executed"""
+        now = now or datetime.now()
+        with self.session_factory() as db:
+            self._schedule(db, now)
+            self._recover(db, now)
+        ran = 0
+        while not self._stop.is_set():
+            claimed = self._claim(now)
+            if claimed is None:
+                break
+            self._execute(*claimed)
+            ran += 1
+        return ran
+
+    def _schedule(self, db: Session, now: datetime):
+        pending = {name for (name,) in db.query(JobRun.job).filter(JobRun.status.in_(PENDING))}
+        for job in self.jobs.values():
+            if job.trigger is None or job.name in pending:
+                continue
+            last = db.query(func.max(JobRun.run_at)).filter(JobRun.job == job.name).scalar()
+            next_run = job.trigger.next_after(datetime.fromisoformat(last) if last else now)
+            # occurrences missed while nothing ran (downtime) collapse into one run now
+            enqueue(db, job.name, max(next_run, now))
+
+    def _recover(self, db: Session, now: datetime):
+        stale = db.query(JobRun).filter(JobRun.status == "running", JobRun.locked_until < _iso(now)).all()
+        for run in stale:
+            log.warning(f"⚠️ Job {run.job} run {run.id} by {run.locked_by} passed its lease, requeueing")
+            job = self.jobs.get(run.job)
+            self._failed(run, job, now, "lease expired")
+        if stale:
+            db.commit()
+
+    def _claim(self, now: datetime) -> Optional[tuple[int, Job, int]]:
+        with self.session_factory() as db:
+            due = (
+                db.query(JobRun.id, JobRun.job)
+                .filter(JobRun.status == "queued", JobRun.run_at <= _iso(now), JobRun.job.in_(list(self.jobs)))
+                .order_by(JobRun.run_at)
+                .all()
+            )
+            for run_id, name in due:
+                job = self.jobs[name]
+                claimed = db.execute(
+                    update(JobRun)
+                    .where(JobRun.id == run_id, JobRun.status == "queued")
+                    .values(
+                        status="running",
+                        attempts=JobRun.attempts + 1,
+                        locked_by=self.worker_id,
+                        locked_until=_iso(datetime.now() + timedelta(seconds=job.lease)),
+                        started_at=_iso(datetime.now()),
+                    )
+                    .returning(JobRun.attempts),
+                    execution_options={"synchronize_session": False},
+                ).first()
+                db.commit()
+                if claimed is not None:  # otherwise another runner got there first
+                    return run_id, job, claimed.attempts
+        return None
+
+    def _execute(self, run_id: int, job: Job, attempt: int):
+        log.info(f"⏱️ Job {job.name} started (attempt {attempt}/{job.max_attempts})")
+        start = time.perf_counter()
+        with self.session_factory() as db:
+            try:
+                summary = job.func(db)
+                error = None
+            except Exception as e:
+                db.rollback()
+                summary, error = None, f"{type(e).__name__}: {e}"
+            elapsed = time.perf_counter() - start
+            run = db.get(JobRun, run_id)
+            run.duration_seconds = round(elapsed, 3)
+            if error is None:
+                run.status, run.result, run.finished_at = "done", summary, _iso(datetime.now())
+                run.locked_by = run.locked_until = None
+                log.info(f"✅ Job {job.name} done in {elapsed:.1f}s{': ' + summary if summary else ''}")
+            else:
+                self._failed(run, job, datetime.now(), error)
+            db.commit()
+        JOB_DURATION.observe((job.name, "ok" if error is None else "error"), elapsed)
+
+    @staticmethod
+    def _failed(run: JobRun, job: Optional[Job], now: datetime, error: str):
+        run.result = error[:2000]
+        run.locked_by = run.locked_until = None
+        if job is not None and run.attempts < job.max_attempts:
+            delay = job.retry_delay * 2 ** (run.attempts - 1)
+            run.status, run.run_at = "queued", _iso(now + timedelta(seconds=delay))
+            log.warning(f"⚠️ Job {run.job} failed ({error}), retry {run.attempts + 1} in {delay:.0f}s")
+        else:
+            run.status, run.finished_at = "failed", _iso(now)
+            log.error(f"❌ Job {run.job} failed for good after {run.attempts} attempts: {error}")
+
+    # -- in-process: asyncio task, job code on a daemon thread --
+    def start(self) -> asyncio.Task:
+        self._stop.clear()
+        self._task = asyncio.get_running_loop().create_task(self._loop())
+        return self._task
+
+    async def _loop(self):
+        while not self._stop.is_set():
+            try:
+                await self._in_thread(self.tick)
+            except Exception as e:
+                log.error(f"❌ Job runner tick failed: {e}")
+            await asyncio.sleep(self.poll_interval)
+
+    @staticmethod
+    async def _in_thread(fn):
+        # a daemon thread rather than the default executor, so a long job never
+        # holds up shutdown; its run is retried once the lease has passed
+        loop = asyncio.get_running_loop()
+        done = loop.create_future()
+
+        def target():
+            try:
+                result, error = fn(), None
+            except BaseException as e:
+                result, error = None, e
+            try:
+                loop.call_soon_threadsafe(done.set_exception if error else done.set_result, error or result)
+            except RuntimeError:
+                pass  # loop closed during shutdown
+
+        threading.Thread(target=target, daemon=True, name="stadssurr-jobs").start()
+        return await done
+
+    async def stop(self):
+        self._stop.set()
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    # -- separate worker process --
+    def run_forever(self):
+        signal.signal(signal.SIGTERM, lambda *_: self._stop.set())
+        log.info(f"🚀 Job worker {self.worker_id} polling every {self.poll_interval:g}s: {', '.join(self.jobs)}")
+        while not self._stop.is_set():
+            try:
+                self.tick()
+            except Exception as e:
+                log.error(f"❌ Job runner tick failed: {e}")
+            self._stop.wait(self.poll_interval)
+
+
+def last_runs(db: Session) -> dict[str, JobRun]:
+    """Most recent finished run per job"""
+    latest = (
+        db.query(JobRun.job, func.max(JobRun.id).label("id"))
+        .filter(JobRun.status.in_(("done", "failed")))
+        .group_by(JobRun.job)
+        .subquery()
+    )
+    return {run.job: run for run in db.query(JobRun).join(latest, JobRun.id == latest.c.id)}
+
+
+# ---- built-in jobs ----
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def scrape_projects(db: Session) -> str:
+    """Run the scraper, then merge its output into projects"""
+    command = [sys.executable, os.path.join("scraping", "scrape.py"), "--format", "ndjson"]
+    if settings.SCRAPE_IMAGES:
+        command += ["--images", "--image-cache-dir", os.path.abspath(settings.IMG_CACHE_DIR)]
+    completed = subprocess.run(
+        command,
+        cwd=BACKEND_DIR, capture_output=True, text=True, timeout=settings.SCRAPE_TIMEOUT,
+    )
+    if completed.returncode != 0:
+        raise RuntimeError(f"scraper exited with {completed.returncode}: {completed.stderr.strip()[-500:]}")
+    counts = refresh_projects_from_json(db, scraped_projects_path())
+    return ", ".join(f"{n} {k}" for k, n in counts.items())
+
+
+def reconcile_counters(db: Session) -> str:
+    """Recompute the denormalized counters from their source tables"""
+    rows = activity.rebuild(db)
+    followers = dict(db.query(UserFollow.followed_id, func.count(UserFollow.id)).group_by(UserFollow.followed_id))
+    fixed = 0
+    for user in db.query(User).all():
+        if user.followers_count != followers.get(user.id, 0):
+            user.followers_count = followers.get(user.id, 0)
+            fixed += 1
+    db.commit()
+    return f"{rows} activity rows, {fixed} follower counts fixed"
+
+
+register(Job("scrape_projects", scrape_projects, parse_trigger(settings.SCRAPE_SCHEDULE),
+             max_attempts=3, retry_delay=600, lease=settings.SCRAPE_TIMEOUT + 300))
+register(Job("reconcile_counters", reconcile_counters, parse_trigger(settings.RECONCILE_SCHEDULE)))
+
+
+# ---- CLI ----
+
+def main():
+    from .database import Base, SessionLocal, engine
+
+    parser = argparse.ArgumentParser(description="Background jobs")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("worker", help="poll the queue and run jobs until stopped")
+    run = sub.add_parser("run", help="run one job now, in this process")
+    run.add_argument("job", choices=sorted(JOBS))
+    queue = sub.add_parser("enqueue", help="queue one job to run as soon as a runner polls")
+    queue.add_argument("job", choices=sorted(JOBS))
+    sub.add_parser("list", help="jobs, schedules and last runs")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+    Base.metadata.create_all(bind=engine)
+
+    runner = JobRunner(SessionLocal, poll_interval=settings.JOBS_POLL_SECONDS)
+    if args.command == "worker":
+        runner.run_forever()
+    elif args.command == "run":
+        with SessionLocal() as db:
+            enqueue(db, args.job)
+        # through the queue, so it can't overlap a run elsewhere
+        runner.jobs = {args.job: JOBS[args.job]}
+        if not runner.tick():
+            raise SystemExit(f"{args.job} is already running elsewhere")
+    elif args.command == "enqueue":
+        with SessionLocal() as db:
+            print("queued" if enqueue(db, args.job) else "already pending; moved up to now")
+    else:
+        with SessionLocal() as db:
+            last = last_runs(db)
+            pending = {r.job: r for r in db.query(JobRun).filter(JobRun.status.in_(PENDING))}
+        for name, job in JOBS.items():
+            trigger = getattr(job.trigger, "expr", None) or (f"every {job.trigger.seconds:g}s" if job.trigger else "by hand")
+            done = last.get(name)
+            print(f"{name:20} {trigger:16} last: {f'{done.status} {done.finished_at} ({done.duration_seconds}s)' if done else '-'}"
+                  f"   next: {f'{pending[name].status} {pending[name].run_at}' if name in pending else '-'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+# app/jsonstream.py
+"""Incremental readers for large JSON inputs.
+
+iter_records() yields the objects of a top-level JSON array, or the lines of
+an NDJSON file, one at a time, so memory is bounded by the largest single
+record plus one read chunk rather than by the file size.
+"""
+import json
+from typing import IO, Iterator
+
+CHUNK_SIZE = 64 * 1024
+_decoder = json.JSONDecoder()
+_WHITESPACE = " \t\r\n"
+
+
+def iter_json_array(f: IO[str], chunk_size: int = CHUNK_SIZE) -> Iterator:
+    """Yield the elements of the JSON array in f without loading all of it"""
+    buf = ""
+    pos = 0
+    eof = False
+
+    def fill() -> bool:
+        nonlocal buf, pos, eof
+        chunk = f.read(chunk_size)
+        if not chunk:
+            eof = True
+            return False
+        buf = buf[pos:] + chunk
+        pos = 0
+        return True
+
+    def skip(chars: str):
+        nonlocal pos
+        while True:
+            while pos < len(buf) and buf[pos] in chars:
+                pos += 1
+            if pos < len(buf) or not fill():
+                return
+
+    skip(_WHITESPACE)
+    if pos >= len(buf) or buf[pos] != "[":
+        raise ValueError("expected a JSON array")
+    pos += 1
+    while True:
+        skip(_WHITESPACE + ",")
+        if pos >= len(buf):
+            raise ValueError("unterminated JSON array")
+        if buf[pos] == "]":
+            return
+        while True:
+            try:
+                item, end = _decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                # element continues past the buffer, unless the file is done
+                if eof or not fill():
+                    raise
+                continue
+            # the element must be followed by "," or "]": a number cut off by the
+            # chunk boundary ("1." of "1.5") decodes fine but isn't finished yet
+            after = end
+            while after < len(buf) and buf[after] in _WHITESPACE:
+                after += 1
+            if after == len(buf) or buf[after] not in ",]":
+                if not eof and fill():
+                    continue
+                raise ValueError("malformed JSON array: expected ',' or ']' after an element")
+            pos = end
+            yield item
+            break
+
+
+def iter_ndjson(f: IO[str]) -> Iterator:
+    for line in f:
+        line = line.strip()
+        if line:
+            yield json.loads(line)
+
+
+def iter_records(path: str) -> Iterator:
+    """Objects from an .ndjson/.jsonl file (one per line) or a .json array"""
+    with open(path, "r", encoding="utf-8") as f:
+        if path.endswith((".ndjson", ".jsonl")):
+            yield from iter_ndjson(f)
+        else:
+            yield from iter_json_array(f)
@@ -0,0 +1,228 @@
+# app/live.py
+"""Live updates: vote tallies, new comments and comment likes pushed to
+clients over Server-Sent Events (/api/live/stream) or a WebSocket
+(/api/live/ws).
+
+Topics are "project:<id>" and "post:<id>". Write routes call publish() after
+their commit; the event goes out on the shared-state pub/sub channel, so with
+SHARED_STATE_URL=redis://... a vote handled by one worker reaches clients
+connected to any worker. Each process keeps one subscription and fans out to
+its local clients on the event loop, serializing each event once however
+many clients receive it.
+
+Every client gets a bounded queue. A client that falls LIVE_QUEUE_SIZE
+events behind is sent an "overflow" event and disconnected rather than
+buffered without limit; it should refetch and reconnect (EventSource
+reconnects by itself).
+"""
+import asyncio
+import json
+import logging
+import re
+import threading
+from collections import Counter
+from typing import Any, Iterable, Optional
+
+from starlette.websockets import WebSocket, WebSocketDisconnect
+
+from .serialization import dumps
+from .settings import settings
+from .shared_state import MemoryState, RedisError, SharedState, shared_state
+
+log = logging.getLogger("stadsurr")
+
+LIVE_CHANNEL = "live"
+TOPIC_RE = re.compile(r"^(project|post):\d+$")
+
+
+class LiveEvent:
+    """One published event, formatted once for every transport"""
+
+    __slots__ = ("topic", "sse", "ws")
+
+    def __init__(self, topic: str, event: str, data: str):
+        self.topic = topic
+        self.sse = f"event: {event}\ndata: {data}\n\n".encode()
+        self.ws = f'{{"topic":"{topic}","event":"{event}","data":{data}}}'
+
+
+OVERFLOW = LiveEvent("", "overflow", "{}")
+
+
+class Subscription:
+    def __init__(self, broker: "LiveBroker", maxsize: int):
+        self.broker = broker
+        self.topics: set[str] = set()
+        self.queue: asyncio.Queue[LiveEvent] = asyncio.Queue(maxsize)
+        self.overflowed = False
+
+    def _put(self, event: LiveEvent):
+        if self.overflowed:
+            return
+        if self.queue.full():
+            self.overflowed = True
+            self.broker.stats["dropped"] += 1
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            event = OVERFLOW
+        self.queue.put_nowait(event)
+
+    def subscribe(self, topics: Iterable[str]):
+        for topic in topics:
+            if topic not in self.topics:
+                self.topics.add(topic)
+                self.broker._topics.setdefault(topic, set()).add(self)
+
+    def unsubscribe(self, topics: Iterable[str]):
+        for topic in topics:
+            self.topics.discard(topic)
+            subscribers = self.broker._topics.get(topic)
+            if subscribers is not None:
+                subscribers.discard(self)
+                if not subscribers:
+                    del self.broker._topics[topic]
+
+    async def get(self) -> LiveEvent:
+        return await self.queue.get()
+
+    def close(self):
+        self.unsubscribe(list(self.topics))
+        self.broker._connections.discard(self)
+
+
+class LiveBroker:
+    """Per-process fan-out of live events; cross-process delivery goes through
+    SharedState pub/sub. Subscriptions live on the event loop; publish() may be
+    called from any thread."""
+
+    def __init__(self, state: SharedState, max_connections: int = 1000, queue_size: int = 256):
+        self.state = state
+        self.max_connections = max_connections
+        self.queue_size = queue_size
+        self._topics: dict[str, set[Subscription]] = {}
+        self._connections: set[Subscription] = set()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._subscribed = False
+        self._lock = threading.Lock()
+        self.stats = Counter()
+
+    @property
+    def connections(self) -> int:
+        return len(self._connections)
+
+    def connect(self) -> Optional[Subscription]:
+        """New client on the running loop, or None when the process is at max_connections"""
+        if len(self._connections) >= self.max_connections:
+            self.stats["rejected"] += 1
+            return None
+        self._loop = asyncio.get_running_loop()
+        with self._lock:
+            if not self._subscribed:
+                self._subscribed = True
+                self.state.subscribe(LIVE_CHANNEL, self._receive)
+        subscription = Subscription(self, self.queue_size)
+        self._connections.add(subscription)
+        return subscription
+
+    def publish(self, topic: str, event: str, data: Any):
+        if not self._subscribed and isinstance(self.state, MemoryState):
+            return  # no client has connected to this process, and there are no others
+        message = f"{topic} {event} {dumps(data).decode()}"
+        self.stats["published"] += 1
+        try:
+            self.state.publish(LIVE_CHANNEL, message)
+        except (OSError, ConnectionError, RedisError) as e:
+            log.warning(f"⚠️ Could not broadcast live event {topic} {event}: {e}")
+            self._receive(message)  # local clients still get it
+
+    def _receive(self, message: str):
+        # pub/sub thread (Redis) or the publishing thread (memory)
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            return
+        topic, event, data = message.split(" ", 2)
+        if topic in self._topics:
+            loop.call_soon_threadsafe(self._fan_out, LiveEvent(topic, event, data))
+
+    def _fan_out(self, event: LiveEvent):
+        subscribers = self._topics.get(event.topic, ())
+        for subscription in list(subscribers):
+            subscription._put(event)
+        self.stats["delivered"] += len(subscribers)
+
+
+def parse_topics(raw: Iterable[str]) -> list[str]:
+    """Valid, de-duplicated topics; raises ValueError naming the first bad one"""
+    topics = []
+    for topic in raw:
+        topic = topic.strip()
+        if not TOPIC_RE.match(topic):
+            raise ValueError(topic)
+        if topic not in topics:
+            topics.append(topic)
+    return topics
+
+
+# ---- transports ----
+
+async def sse_stream(subscription: Subscription, heartbeat: float):
+    """Body of a text/event-stream response; closes the subscription when the client goes away"""
+    try:
+        # sent at once, so the headers go out before the first event
+        yield b"retry: 3000\n\n"
+        while True:
+            try:
+                event = await asyncio.wait_for(subscription.get(), heartbeat)
+            except asyncio.TimeoutError:
+                yield b": ping\n\n"  # keeps proxies from closing an idle connection
+                continue
+            yield event.sse
+            if event is OVERFLOW:
+                return
+    finally:
+        subscription.close()
+
+
+async def websocket_session(websocket: WebSocket, subscription: Subscription, max_topics: int):
+    """Pushes events until either side closes. The client may send
+    {"subscribe": [topics]} and {"unsubscribe": [topics]} at any time."""
+
+    async def read_commands():
+        while True:
+            try:
+                command = json.loads(await websocket.receive_text())
+                subscribe = parse_topics(command.get("subscribe", ()))
+                unsubscribe = parse_topics(command.get("unsubscribe", ()))
+            except (ValueError, AttributeError, TypeError) as e:
+                await websocket.send_text(dumps({"error": f"Ogiltigt meddelande: {e}"}).decode())
+                continue
+            subscription.unsubscribe(unsubscribe)
+            if len(subscription.topics | set(subscribe)) > max_topics:
+                await websocket.send_text(dumps({"error": f"Högst {max_topics} ämnen per anslutning"}).decode())
+                continue
+            subscription.subscribe(subscribe)
+
+    reader = asyncio.create_task(read_commands())
+    getter = asyncio.create_task(subscription.get())
+    try:
+        while True:
+            done, _ = await asyncio.wait({reader, getter}, return_when=asyncio.FIRST_COMPLETED)
+            if reader in done:
+                break
+            event = getter.result()
+            await websocket.send_text(event.ws)
+            if event is OVERFLOW:
+                await websocket.close(code=1013)
+                break
+            getter = asyncio.create_task(subscription.get())
+    except WebSocketDisconnect:
+        pass
+    finally:
+        if reader.done() and not reader.cancelled() and not isinstance(reader.exception(), WebSocketDisconnect):
+            log.error(f"❌ Live websocket reader failed: {reader.exception()}")
+        reader.cancel()
+        getter.cancel()
+        subscription.close()
+
+
+live = LiveBroker(shared_state, settings.LIVE_MAX_CONNECTIONS, settings.LIVE_QUEUE_SIZE)
@@ -1,226 +1,121 @@
 # app/main.py
-from fastapi import FastAPI, HTTPException, Depends, Cookie, Response, Request, status
+from fastapi import FastAPI, HTTPException, Depends, Cookie, Response, Request, Query, WebSocket, status
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from contextlib import asynccontextmanager
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, load_only, undefer
 from sqlalchemy import func
-from sqlalchemy.exc import OperationalError
+from sqlalchemy.exc import IntegrityError
 from pydantic import BaseModel, EmailStr
 import logging
-import json
-import os
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
+from urllib.parse import quote
 from typing import Optional, List
 from jose import jwt, JWTError
 
-from .database import Base, engine, SessionLocal
-from .models import User, Project, Comment, Vote, CommentLike, Consultation, Post, PostComment, PostCommentLike, PostVote, NewsArticle, UserFollow
-from .schemas import RegisterBody, LoginBody, UserPublic, CommentCreate, UserUpdate, VoteCreate, ConsultationCreate, ConsultationPublic, PostCreate, PostCommentCreate, PostVoteCreate, NewsArticleOut, NewsArticleCreate, FollowerPublic, PostPublic
+from .database import engine, SessionLocal
+from .models import normalize_name, url_hash, User, Project, Comment, Vote, CommentLike, Consultation, Post, PostComment, PostCommentLike, PostVote, NewsArticle, UserFollow
+from .schemas import RegisterBody, LoginBody, UserPublic, CommentCreate, UserUpdate, VoteCreate, ConsultationCreate, ConsultationBatch, ConsultationPublic, PostCreate, PostCommentCreate, PostVoteCreate, NewsArticleOut, NewsArticleCreate, NewsArticleBatch, FollowerPublic, PostPublic
 from .auth import hash_password, verify_password
+from .seed import needs_seed, prepare_database, seed_database, seed_in_background, seed_status
+from .social import social_graph
+from .shared_state import shared_state
+from .entity_cache import entity_cache
+from .comment_threads import PROJECT_THREAD, POST_THREAD, load_thread
+from .toggles import toggle_like, toggle_vote
+from .write_buffer import WriteBuffer
+from .jobs import JobRunner, last_runs
+from .live import live, parse_topics, sse_stream, websocket_session
+from .images import FORMATS, THUMBNAIL_WIDTH, ImageError, create_image_proxy, host_allowed, snap_width, thumbnail_url
+from .aggregates import count_by, vote_tallies, user_votes
+from .serialization import FastJSONResponse
+from .http_cache import CompressionMiddleware, NotModified, not_modified_handler, conditional_get
+from . import activity, consultations, metrics, news, tidplan
+from .metrics import MetricsMiddleware
+from .rate_limit import RateLimitMiddleware, SharedWindows, TokenBuckets
+from .profiling import ProfilingMiddleware, install_slow_query_log
+from .records import (
+    ProjectListItem, PostListItem, UserPostItem, FeedPost, FeedProject,
+    Feature, Point, ProjectFeatureProperties, PostFeatureProperties, feature_collection, lat_lng,
+)
 from .settings import settings
 
 
 logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
 log = logging.getLogger("stadsurr")
 
-# ---- Loaders----------
-
-def load_projects_from_json(db: Session):
-    json_path = os.path.join(os.path.dirname(__file__), "..", "data_scraped", "projects.json")
-
-    if not os.path.exists(json_path):
-        print(f"⚠️  projects.json not found at {json_path}")
-        return
-    
-    with open(json_path, "r", encoding="utf-8") as f:
-        projects_data = json.load(f)
-
-    for proj in projects_data:
-        new_project = Project(
-            title=proj["name"],
-            widget_text=proj.get("widget_text"),
-            preamble=proj.get("preamble"),
-            location=proj.get("location"),
-            phase=proj.get("current_stage"),
-            tidplan_html=proj.get("tidplan_html"),
-            coordinates=proj.get("coordinates"),
-            image_url=proj.get("image_url"),
-            url=proj.get("url"),
-            upvotes=proj.get("upvotes", 0),
-            downvotes=proj.get("downvotes",0)
-        )
-        db.add(new_project)
-    db.commit()
-    log.info(f"✅ Loaded {len(projects_data)} projects into the database.")
-
-
-def load_users_from_json(db: Session):
-    json_path = os.path.join(os.path.dirname(__file__), "..", "mock_data", "users.json")
-    if not os.path.exists(json_path):
-        log.warning(f"⚠️  users.json not found at {json_path}")
-        return
-
-    with open(json_path, "r", encoding="utf-8") as f:
-        users = json.load(f)
-
-    inserted = 0
-    for u in users:
-        existing = db.query(User).filter(User.email == u["email"]).first()
-        if not existing:
-            user = User(
-                name=u["name"],
-                email=u["email"],
-                password_hash=hash_password(u["email"]),  # mock
-            )
-            db.add(user)
-            inserted += 1
-
-    if inserted:
-        db.commit()
-        log.info(f"✅ Loaded {inserted} users from JSON")
-
-
-def load_comments_from_json(db: Session):
-    json_path = os.path.join(os.path.dirname(__file__), "..", "mock_data", "comments.json")
-    if not os.path.exists(json_path):
-        log.warning(f"⚠️  comments.json not found at {json_path}")
-        return
-
-    with open(json_path, "r", encoding="utf-8") as f:
-        comments = json.load(f)
-
-    for c in comments:
-        project = db.query(Project).filter(Project.title == c["project_title"]).first()
-        user = db.query(User).filter(User.email == c["user_email"]).first()
-        if not project or not user:
-            continue
-
-        exists = db.query(Comment).filter(
-            Comment.project_id == project.id,
-            Comment.user_id == user.id,
-            Comment.content == c["content"]
-        ).first()
-
-        if exists:
-            continue
-
-        comment = Comment(
-            project_id=project.id,
-            user_id=user.id,
-            content=c["content"],
-            created_at=c["created_at"],
-        )
-        db.add(comment)
-        db.flush()
-
-        if c.get("likes", 0) > 0:
-            users = db.query(User).all()
-            for i, u in enumerate(users[:c["likes"]]):
-                db.add(CommentLike(user_id=u.id, comment_id=comment.id))
-
-    
-    db.commit()
-    log.info(f"✅ Loaded {len(comments)} comments from JSON")
-
-
-def load_posts_from_json(db: Session):
-    json_path = os.path.join(os.path.dirname(__file__), "..", "mock_data", "posts.json")
-    if not os.path.exists(json_path):
-        log.warning(f"⚠️  posts.json not found at {json_path}")
-        return
-
-    with open(json_path, "r", encoding="utf-8") as f:
-        posts = json.load(f)
-
-    inserted = 0
-    for p in posts:
-        user = db.query(User).filter(User.email == p["user_email"]).first()
-        if not user:
-            log.warning(f"⚠️  User with email {p['user_email']} not found, skipping post")
-            continue
-
-        # Check if post already exists (by title and user)
-        existing = db.query(Post).filter(
-            Post.title == p["title"],
-            Post.user_id == user.id
-        ).first()
-        
-        if existing:
-            continue
-
-        post = Post(
-            title=p["title"],
-            content=p["content"],
-            user_id=user.id,
-            created_at=p["created_at"],
-            coordinates=p.get("coordinates"),
-            image_url=p.get("image_url"),
-            upvotes=0,
-            downvotes=0
-        )
-        db.add(post)
-        inserted += 1
-
-    if inserted:
-        db.commit()
-        log.info(f"✅ Loaded {inserted} posts from JSON")
-
-
-def load_news_from_json(db: Session):
-    path = os.path.join(os.path.dirname(__file__), "..", "mock_data", "news.json")
-    if not os.path.exists(path):
-        log.warning(f"news.json not found at {path}")
-        return
+# ----- Lifespan-------------------
 
-    with open(path, "r", encoding="utf-8") as f:
-        items = json.load(f)
-
-    for it in items:
-        db.add(NewsArticle(
-            project_id=it["project_id"],
-            title=it["title"].strip(),
-            url=it["url"],
-            source=it.get("source"),
-            date=it.get("date"),
-            summary=it.get("summary"),
-        ))
-    db.commit()
-    log.info(f"✅ Loaded {len(items)} news items from JSON")
+write_buffer = (
+    WriteBuffer(
+        engine,
+        settings.WRITE_BUFFER_JOURNAL,
+        flush_interval=settings.WRITE_BUFFER_FLUSH_INTERVAL,
+        max_batch=settings.WRITE_BUFFER_MAX_BATCH,
+    )
+    if settings.WRITE_BUFFER_ENABLED
+    else None
+)
+image_proxy = create_image_proxy(settings)
+job_runner = (
+    JobRunner(SessionLocal, poll_interval=settings.JOBS_POLL_SECONDS)
+    if settings.JOBS_MODE == "inprocess"
+    else None
+)
 
-# ----- Lifespan-------------------
+schema_ready = False
 
 @asynccontextmanager
 async def lifespann(app: FastAPI):
+    global schema_ready
+    # Schema setup is quick and must finish before traffic; the JSON import is
+    # not, so it runs in the background (or via `python -m app.seed`).
     try:
-        Base.metadata.create_all(bind=engine)
-        db = SessionLocal()
-        try:
-            has_projects = db.query(Project).first()
-            if has_projects:
-                log.info("ℹ️ Database already initialized — skipping JSON import.")
-            else:
-                log.info("🆕 No database found — initializing from JSON...")
-                load_projects_from_json(db)
-                load_users_from_json(db)
-                load_comments_from_json(db)
-                load_posts_from_json(db)
-                load_news_from_json(db)
-        except OperationalError as e:
-            log.error(f"⚠️ Database error: {e}. Recreating DB...")
-            Base.metadata.create_all(bind=engine)
-            load_projects_from_json(db)
-            load_users_from_json(db)
-            load_comments_from_json(db)
-            load_posts_from_json(db)
-            load_news_from_json(db)
-        finally:
-            db.close()  
+        if settings.SCHEMA_ON_STARTUP:
+            prepare_database(engine, SessionLocal)
+        with SessionLocal() as db:
+            empty = needs_seed(db)
+        schema_ready = True
+        if not empty:
+            seed_status.state = "skipped"
+            log.info("ℹ️ Database already initialized — skipping JSON import.")
+        elif settings.SEED_ON_STARTUP == "background":
+            log.info("🆕 Empty database — importing JSON in the background...")
+            seed_in_background(SessionLocal)
+        elif settings.SEED_ON_STARTUP == "blocking":
+            log.info("🆕 Empty database — importing JSON before startup...")
+            seed_database(SessionLocal)
+        else:
+            seed_status.state = "skipped"
+            log.info("ℹ️ Empty database and SEED_ON_STARTUP=off — run `python -m app.seed` to import.")
     except Exception as e:
         log.error(f"❌ Critical startup error: {e}")
+    if write_buffer:
+        write_buffer.start()
+    if job_runner and schema_ready:
+        job_runner.start()
     yield
+    if job_runner:
+        await job_runner.stop()
+    if write_buffer:
+        write_buffer.stop()
+    shared_state.close()
 
 # ---- APP---------
-app = FastAPI(title="StadsSurr API", lifespan=lifespann)
+app = FastAPI(title="StadsSurr API", lifespan=lifespann, default_response_class=FastJSONResponse)
+
+# innermost, so throttled responses still get CORS headers and are counted in the metrics
+if settings.RATE_LIMIT_ENABLED:
+    rate_limit_store = SharedWindows(shared_state) if settings.RATE_LIMIT_SHARED else TokenBuckets()
+    app.add_middleware(
+        RateLimitMiddleware,
+        rules=settings.RATE_LIMITS,
+        verify_token=lambda token: verify_access_token(token),  # defined with the auth helpers below
+        store=rate_limit_store,
+    )
+    metrics.register(metrics.Gauge(
+        "stadssurr_rate_limit_buckets", "Token buckets held in this process", lambda: len(rate_limit_store),
+    ))
 
 #CORS Configuration
 app.add_middleware(
@@ -234,6 +129,54 @@ app.add_middleware(
     allow_headers=["*"],
     expose_headers=["*"],
 )
+app.add_middleware(CompressionMiddleware, minimum_size=1024)
+if settings.PROFILE_ROUTES:
+    app.add_middleware(
+        ProfilingMiddleware,
+        routes=settings.PROFILE_ROUTES,
+        every=settings.PROFILE_EVERY,
+        interval_ms=settings.PROFILE_INTERVAL_MS,
+        out_dir=settings.PROFILE_DIR,
+    )
+install_slow_query_log(engine, settings.SLOW_QUERY_MS)
+# outermost, so it times the whole stack and sees compressed sizes
+app.add_middleware(MetricsMiddleware, server_timing=settings.METRICS_SERVER_TIMING)
+metrics.register(metrics.Gauge(
+    "stadssurr_entity_cache_lookups_total", "Entity cache lookups by result",
+    lambda: {k: v for k, v in entity_cache.metrics().items() if k in ("request_hits", "process_hits", "misses")},
+    label="result", kind="counter",
+))
+if write_buffer:
+    metrics.register(metrics.Gauge(
+        "stadssurr_write_buffer_total", "Write-behind buffer activity",
+        lambda: dict(write_buffer.stats), label="event", kind="counter",
+    ))
+
+def _last_job_durations() -> dict:
+    # from job_runs, so it covers runs in any process, including a separate worker
+    with SessionLocal() as db:
+        return {name: run.duration_seconds for name, run in last_runs(db).items()}
+
+metrics.register(metrics.Gauge(
+    "stadssurr_live_connections", "Open SSE and WebSocket clients in this process", lambda: live.connections,
+))
+metrics.register(metrics.Gauge(
+    "stadssurr_live_events_total", "Live events published, delivered to clients, dropped and rejected connections",
+    lambda: dict(live.stats), label="event", kind="counter",
+))
+if image_proxy:
+    metrics.register(metrics.Gauge(
+        "stadssurr_image_proxy_total", "Image proxy cache hits, source fetches, resizes and failures",
+        lambda: dict(image_proxy.stats), label="event", kind="counter",
+    ))
+    metrics.register(metrics.Gauge(
+        "stadssurr_image_cache_bytes", "Size of the image disk cache as seen by this process", lambda: image_proxy.cache.size,
+    ))
+metrics.register(metrics.Gauge(
+    "stadssurr_job_last_duration_seconds", "Duration of the latest finished run per background job",
+    _last_job_durations, label="job",
+))
+app.add_exception_handler(NotModified, not_modified_handler)
 # --------DB ----------
 def get_db():
     db = SessionLocal()
@@ -243,6 +186,15 @@ def get_db():
         db.close()
 
 
+# Column projections ---------
+# List and map routes load only what they render; tidplan_html/preamble/widget_text
+# can be large, and tidplan_html is deferred on the model and only loaded by get_project.
+PROJECT_IMAGE_COLUMNS = (Project.image_url, Project.image_width, Project.image_height, Project.image_placeholder)
+PROJECT_LIST_COLUMNS = load_only(Project.id, Project.title, Project.preamble, Project.location, Project.phase, Project.coordinates, *PROJECT_IMAGE_COLUMNS)
+PROJECT_MAP_COLUMNS = load_only(Project.id, Project.title, Project.phase, Project.location, Project.widget_text, Project.coordinates, *PROJECT_IMAGE_COLUMNS)
+PROJECT_FEED_COLUMNS = load_only(Project.id, Project.title, Project.preamble, Project.widget_text, Project.location, Project.phase)
+POST_MAP_COLUMNS = load_only(Post.id, Post.title, Post.created_at, Post.image_url, Post.coordinates, Post.user_id)
+
 # Helper Function ---------
 # Get current user from session (simple version without JWT for now)
 # def get_current_user_id(user_id: Optional[str] = Cookie(None)) -> Optional[int]:
@@ -302,11 +254,75 @@ def get_current_user_id(request: Request, user_id_cookie: Optional[str] = Cookie
     log.warning("⚠️ No user_id found in JWT or cookie")
     return None
 
+def if_modified(*tables: str, per_user: bool = False, include: Optional[dict] = None):
+    """Route dependency: 304 for If-None-Match hits, ETag derived from the given tables' versions"""
+    return conditional_get(get_db, tables, viewer=get_current_user_id if per_user else None, include_tables=include)
+
+def parse_include(include: Optional[str], allowed) -> list[str]:
+    """?include=a,b for routes that can embed related lists, saving the client a round trip per list"""
+    names = [name.strip() for name in (include or "").split(",") if name.strip()]
+    unknown = [name for name in names if name not in allowed]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Okänd include: {', '.join(unknown)}")
+    return names
+
 #-------------- Routes---------------------------
 
 @app.get("/api/health")
 def health():
-    return {"ok": True}
+    """Liveness: the process is up and serving"""
+    return {"ok": True, "ready": schema_ready and seed_status.ready, "seed": seed_status.state}
+
+@app.get("/api/health/ready")
+def readiness():
+    """Readiness: schema in place and the initial import done; 503 until then, or with the error if it failed"""
+    ready = schema_ready and seed_status.ready
+    body = {"ready": ready, "schema": schema_ready, "seed": seed_status.as_dict()}
+    return FastJSONResponse(body, status_code=200 if ready else 503)
+
+@app.get("/metrics", include_in_schema=False)
+def prometheus_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/api/cache/stats")
+def cache_stats():
+    return {"entities": entity_cache.metrics()}
+
+# ---- live updates ----
+
+@app.get("/api/live/stream")
+async def live_stream(topics: str = Query(..., description="comma separated, e.g. project:12,post:3")):
+    """Server-Sent Events for the given topics: vote, comment and comment_like"""
+    try:
+        wanted = parse_topics(topics.split(","))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Ogiltigt ämne: {e}")
+    if len(wanted) > settings.LIVE_MAX_TOPICS:
+        raise HTTPException(status_code=400, detail=f"Högst {settings.LIVE_MAX_TOPICS} ämnen per anslutning")
+    subscription = live.connect()
+    if subscription is None:
+        raise HTTPException(status_code=503, detail="För många anslutningar, försök igen senare", headers={"Retry-After": "5"})
+    subscription.subscribe(wanted)
+    return StreamingResponse(
+        sse_stream(subscription, settings.LIVE_HEARTBEAT_SECONDS),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.websocket("/api/live/ws")
+async def live_websocket(websocket: WebSocket, topics: str = ""):
+    """Same events as /api/live/stream; topics can also be changed by sending {"subscribe": [...]} / {"unsubscribe": [...]}"""
+    try:
+        wanted = parse_topics(t for t in topics.split(",") if t)
+    except ValueError:
+        wanted = None
+    subscription = live.connect() if wanted is not None and len(wanted) <= settings.LIVE_MAX_TOPICS else None
+    if subscription is None:
+        await websocket.close(code=1013 if wanted is not None else 1008)
+        return
+    subscription.subscribe(wanted)
+    await websocket.accept()
+    await websocket_session(websocket, subscription, settings.LIVE_MAX_TOPICS)
 
 @app.post("/api/auth/register", response_model=UserPublic)
 def register(body: RegisterBody, request: Request, response: Response, db: Session = Depends(get_db)):
@@ -324,6 +340,8 @@ def register(body: RegisterBody, request: Request, response: Response, db: Sessi
     )
     db.add(user)
     db.commit()
+    # SQLite may hand out the id of a deleted row again
+    entity_cache.invalidate_user(user.id, db)
     db.refresh(user)
 
     # Auto-login: Set user_id cookie with origin-aware security settings
@@ -411,47 +429,68 @@ def logout(request: Request, response: Response):
     return {"ok": True}
 
 # GeoJSON endpoint
-@app.get("/api/projects/geojson")
-def projects_geojson(phase: Optional[str] = None, db: Session = Depends(get_db)):
-    query = db.query(Project)
+def thumbnail(request: Request, src: Optional[str]) -> Optional[str]:
+    if not settings.IMG_THUMBNAILS or not host_allowed(src or "", settings.IMG_ALLOWED_HOSTS):
+        return src or None
+    return thumbnail_url(src, settings.PUBLIC_BASE_URL or str(request.base_url).rstrip("/"))
+
+@app.get("/api/projects/geojson", dependencies=[if_modified("projects")])
+def projects_geojson(request: Request, phase: Optional[str] = None, db: Session = Depends(get_db)):
+    query = db.query(Project).options(PROJECT_MAP_COLUMNS)
     
     # Filter by phase if provided
     if phase:
         query = query.filter(Project.phase == phase)
     
-    projects = query.all()
     features = []
-    for project in projects:
-        if not project.coordinates:
-            continue
-        lng = project.coordinates.get('longitude')
-        lat = project.coordinates.get('latitude')
-        
+    for project in query.all():
+        lat, lng = lat_lng(project.coordinates)
         if lng is None or lat is None:
             continue
     
-        feature = {
-            "type": "Feature",
-            "geometry": {
-                "type": "Point",
-                "coordinates": [lng, lat]
-            },
-            "properties": {
-                "id": project.id,
-                "title": project.title,
-                "phase": project.phase,
-                "location": project.location,
-                "widget_text": project.widget_text,
-                "thumbnail": project.image_url if project.image_url else None
-            }
-        }
-        features.append(feature)
+        features.append(Feature(
+            geometry=Point(coordinates=(lng, lat)),
+            properties=ProjectFeatureProperties(
+                id=project.id,
+                title=project.title,
+                phase=project.phase,
+                location=project.location,
+                widget_text=project.widget_text,
+                thumbnail=thumbnail(request, project.image_url),
+                image_width=project.image_width,
+                image_height=project.image_height,
+                image_placeholder=project.image_placeholder,
+            ),
+        ))
 
-    return {
-        "type": "FeatureCollection",
-        "features": features
-    }
+    return FastJSONResponse(feature_collection(features))
+
+
+# Resized project/post images, cached on disk
+@app.get("/api/img")
+async def get_image(
+    request: Request,
+    url: str,
+    w: int = Query(THUMBNAIL_WIDTH, ge=1, le=4000, description="snapped up to 160, 320, 640 or 1280"),
+    fmt: Optional[str] = Query(None, pattern="^(webp|jpeg)$", description="default: webp if the client accepts it"),
+):
+    if image_proxy is None:
+        # thumbnail_url() links the originals then; no redirect, or this would be an open one
+        raise HTTPException(status_code=501, detail="Bildskalning är inte tillgänglig")
+    negotiated = fmt is None
+    if negotiated:
+        fmt = "webp" if "image/webp" in request.headers.get("accept", "") else "jpeg"
+    try:
+        data, etag = await image_proxy.variant(url, snap_width(w), fmt)
+    except ImageError as e:
+        raise HTTPException(status_code=e.status, detail=e.detail)
 
+    headers = {"Cache-Control": f"public, max-age={settings.IMG_MAX_AGE}, immutable", "ETag": etag}
+    if negotiated:
+        headers["Vary"] = "Accept"
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    return Response(data, media_type=FORMATS[fmt], headers=headers)
 
 #likes endopoint
 @app.post("/api/comments/{comment_id}/like")
@@ -459,7 +498,7 @@ def toggle_comment_like(comment_id: int, db: Session = Depends(get_db), current_
     if not current_user:
         raise HTTPException(status_code=401, detail="Du måste vara inloggad för att gilla en kommentar")
 
-    comment = db.query(Comment).filter(Comment.id == comment_id).first()
+    comment = db.query(Comment.user_id, Comment.project_id).filter(Comment.id == comment_id).first()
     if not comment:
         raise HTTPException(status_code=404, detail="Comment not found")
 
@@ -467,68 +506,59 @@ def toggle_comment_like(comment_id: int, db: Session = Depends(get_db), current_
     if comment.user_id == current_user:
         raise HTTPException(status_code=400, detail="Du kan inte gilla din egen kommentar")
 
-    existing_like = (
-        db.query(CommentLike)
-        .filter(CommentLike.comment_id == comment_id, CommentLike.user_id == current_user)
-        .first()
-    )
-
-    if existing_like:
-        # Unlike (remove)
-        db.delete(existing_like)
-        db.commit()
-        like_count = db.query(CommentLike).filter(CommentLike.comment_id == comment_id).count()
-        return {"liked": False, "likes": like_count}
+    if write_buffer:
+        liked, like_count = write_buffer.toggle_like(db, "comment_like", comment_id, current_user)
     else:
-        # Add new like
-        new_like = CommentLike(user_id=current_user, comment_id=comment_id)
-        db.add(new_like)
-        db.commit()
-        like_count = db.query(CommentLike).filter(CommentLike.comment_id == comment_id).count()
-        return {"liked": True, "likes": like_count}
+        liked, like_count = toggle_like(db, CommentLike, current_user, comment_id)
+    live.publish(f"project:{comment.project_id}", "comment_like", {"comment_id": comment_id, "likes": like_count})
+    return {"liked": liked, "likes": like_count}
 
 # Projects endpoints
-@app.get("/api/projects")
+@app.get("/api/projects", dependencies=[if_modified("projects", "comments", "votes", per_user=True)])
 def get_projects(db: Session = Depends(get_db), user_id: Optional[int] = Depends(get_current_user_id)):
-    projects = db.query(Project).all()
+    projects = db.query(Project).options(PROJECT_LIST_COLUMNS).all()
+    comments = count_by(db, Comment, "project_id")
+    tallies = vote_tallies(db, Vote, "project_id")
+    my_votes = user_votes(db, Vote, "project_id", user_id)
+
     result = []
     for project in projects:
-        comments_count = db.query(Comment).filter(Comment.project_id == project.id).count()
-        upvotes = db.query(Vote).filter(Vote.project_id == project.id, Vote.vote_type == "upvote").count()
-        downvotes = db.query(Vote).filter(Vote.project_id == project.id, Vote.vote_type == "downvote").count()
-        
-        user_vote = None
-        if user_id:
-            vote = db.query(Vote).filter(Vote.project_id == project.id, Vote.user_id == user_id).first()
-            if vote:
-                user_vote = vote.vote_type
-        
         # Safely extract coordinates (may be None)
-        lng = None
-        lat = None
-        if project.coordinates:
-            lng = project.coordinates.get('longitude')
-            lat = project.coordinates.get('latitude')
-
-        result.append({
-            "id": project.id,
-            "title": project.title,
-            "description": project.preamble,
-            "location": project.location,
-            "phase": project.phase,
-            "comments_count": comments_count,
-            "upvotes": upvotes,
-            "downvotes": downvotes,
-            "user_vote": user_vote,
-            "latitude": lat,
-            "longitude": lng,
-            "images": project.image_url,
-        })
-    return result
+        lat, lng = lat_lng(project.coordinates)
+        upvotes, downvotes = tallies.get(project.id, (0, 0))
+
+        result.append(ProjectListItem(
+            id=project.id,
+            title=project.title,
+            description=project.preamble,
+            location=project.location,
+            phase=project.phase,
+            comments_count=comments.get(project.id, 0),
+            upvotes=upvotes,
+            downvotes=downvotes,
+            user_vote=my_votes.get(project.id),
+            latitude=lat,
+            longitude=lng,
+            images=project.image_url,
+            image_width=project.image_width,
+            image_height=project.image_height,
+            image_placeholder=project.image_placeholder,
+        ))
+    return FastJSONResponse(result)
 
-@app.get("/api/projects/{project_id}")
-def get_project(project_id: int, db: Session = Depends(get_db), user_id: Optional[int] = Depends(get_current_user_id)):
-    project = db.query(Project).filter(Project.id == project_id).first()
+# ?include= name -> tables it reads, for the ETag
+PROJECT_INCLUDES = {"comments": ("users", "comment_likes"), "news": ("news_articles",), "milestones": ("project_milestones",)}
+
+@app.get("/api/projects/{project_id}", dependencies=[if_modified("projects", "comments", "votes", per_user=True, include=PROJECT_INCLUDES)])
+def get_project(
+    project_id: int,
+    include: Optional[str] = Query(None, description="comma separated: comments, news, milestones"),
+    include_limit: Optional[int] = Query(None, ge=1, le=100, description="page size for included lists; cursors go in next_cursors"),
+    db: Session = Depends(get_db),
+    user_id: Optional[int] = Depends(get_current_user_id),
+):
+    includes = parse_include(include, PROJECT_INCLUDES)
+    project = db.query(Project).options(undefer(Project.tidplan_html)).filter(Project.id == project_id).first()
     if not project:
         raise HTTPException(status_code=404, detail="Project not found")
     
@@ -549,7 +579,7 @@ def get_project(project_id: int, db: Session = Depends(get_db), user_id: Optiona
         lng = project.coordinates.get('longitude')
         lat = project.coordinates.get('latitude')
     
-    return {
+    body = {
         "id": project.id,
         "title": project.title,
         "location": project.location,
@@ -562,48 +592,51 @@ def get_project(project_id: int, db: Session = Depends(get_db), user_id: Optiona
         "latitude": lat,
         "longitude": lng,
         "images": project.image_url,
+        "image_width": project.image_width,
+        "image_height": project.image_height,
+        "image_placeholder": project.image_placeholder,
         "tidplan_html": project.tidplan_html,
         "url": project.url
 
     }
+    # same session and viewer as the project itself; same bodies as the list routes
+    if includes:
+        next_cursors = {}
+        if "comments" in includes:
+            body["comments"], next_cursors["comments"] = load_thread(db, PROJECT_THREAD, project.id, user_id, limit=include_limit)
+        if "news" in includes:
+            articles, next_cursors["news"] = news.load_news_page(db, project.id, limit=include_limit)
+            body["news"] = [NewsArticleOut.model_validate(a).model_dump(mode="json") for a in articles]
+        if "milestones" in includes:
+            body["milestones"] = tidplan.load_timeline(db, project.id)
+        body["next_cursors"] = next_cursors
+    return body
 
 @app.get("/api/projects/{project_id}/comments")
-def get_comments(project_id: int, db: Session = Depends(get_db), current_user: Optional[int]=Depends(get_current_user_id)):
-    comments = db.query(Comment).filter(Comment.project_id == project_id).order_by(Comment.created_at.desc()).all()
-    result = []
-    for comment in comments:
-        user = db.query(User).filter(User.id == comment.user_id).first()
+def get_comments(
+    project_id: int,
+    limit: Optional[int] = Query(None, ge=1, le=100),
+    before: Optional[str] = None,
+    db: Session = Depends(get_db),
+    current_user: Optional[int] = Depends(get_current_user_id),
+):
+    return _comment_thread_page(db, PROJECT_THREAD, project_id, current_user, limit, before)
 
-        like_count = db.query(CommentLike).filter(CommentLike.comment_id == comment.id).count()
-        
-        liked_by_user = False
-        if current_user:
-            liked_by_user = (
-                db.query(CommentLike)
-                .filter(CommentLike.comment_id == comment.id, CommentLike.user_id == current_user)
-                .first()
-                is not None
-            )
-
-        result.append({
-            "id": comment.id,
-            "project_id": comment.project_id,
-            "user_id": comment.user_id,
-            "user_name": user.name if user else "Unknown",
-            "content": comment.content,
-            "created_at": comment.created_at,
-            "likes": like_count,
-            "liked_by_user": liked_by_user
-        })
-    return result
+def _comment_thread_page(db: Session, spec, parent_id: int, viewer_id: Optional[int], limit: Optional[int], before: Optional[str]):
+    """Shared body of the project/post comment list routes; next page cursor goes in X-Next-Cursor"""
+    try:
+        comments, next_cursor = load_thread(db, spec, parent_id, viewer_id, limit=limit, before=before)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    headers = {"X-Next-Cursor": next_cursor} if next_cursor else None
+    return FastJSONResponse(comments, headers=headers)
 
 @app.post("/api/comments")
 def create_comment(body: CommentCreate, db: Session = Depends(get_db), user_id: Optional[int] = Depends(get_current_user_id)):
     if not user_id:
         raise HTTPException(status_code=401, detail="Du måste vara inloggad för att kommentera")
     
-    project = db.query(Project).filter(Project.id == body.project_id).first()
-    if not project:
+    if not entity_cache.project(db, body.project_id):
         raise HTTPException(status_code=404, detail="Project not found")
     
     comment = Comment(
@@ -613,11 +646,12 @@ def create_comment(body: CommentCreate, db: Session = Depends(get_db), user_id:
         created_at=datetime.now().isoformat(),
     )
     db.add(comment)
+    activity.record_comment(db, user_id, body.project_id, comment.created_at)
     db.commit()
     db.refresh(comment)
     
-    user = db.query(User).filter(User.id == user_id).first()
-    return {
+    user = entity_cache.user(db, user_id)
+    created = {
         "id": comment.id,
         "project_id": comment.project_id,
         "user_id": comment.user_id,
@@ -625,6 +659,8 @@ def create_comment(body: CommentCreate, db: Session = Depends(get_db), user_id:
         "content": comment.content,
         "created_at": comment.created_at,
     }
+    live.publish(f"project:{comment.project_id}", "comment", created)
+    return created
 
 @app.post("/api/votes")
 def create_vote(body: VoteCreate, db: Session = Depends(get_db), user_id: Optional[int] = Depends(get_current_user_id)):
@@ -634,102 +670,62 @@ def create_vote(body: VoteCreate, db: Session = Depends(get_db), user_id: Option
     if body.vote_type not in ["upvote", "downvote"]:
         raise HTTPException(status_code=400, detail="Invalid vote type")
     
-    project = db.query(Project).filter(Project.id == body.project_id).first()
-    if not project:
+    if not entity_cache.project(db, body.project_id):
         raise HTTPException(status_code=404, detail="Project not found")
     
-    # Check if user already voted
-    existing_vote = db.query(Vote).filter(Vote.project_id == body.project_id, Vote.user_id == user_id).first()
-    
-    if existing_vote:
-        if existing_vote.vote_type == body.vote_type:
-            # Remove vote if clicking same button
-            db.delete(existing_vote)
-            db.commit()
-            return {"ok": True, "action": "removed"}
-        else:
-            # Change vote
-            existing_vote.vote_type = body.vote_type
-            db.commit()
-            return {"ok": True, "action": "changed"}
+    # Clicking the same button removes the vote, the other one changes it
+    if write_buffer:
+        result = write_buffer.toggle_vote(db, "project_vote", body.project_id, user_id, body.vote_type)
     else:
-        # New vote
-        vote = Vote(
-            project_id=body.project_id,
-            user_id=user_id,
-            vote_type=body.vote_type,
-        )
-        db.add(vote)
+        result = toggle_vote(db, Vote, "project_id", body.project_id, user_id, body.vote_type, commit=False)
+        activity.record_vote(db, user_id, body.project_id, result["user_vote"])
         db.commit()
-        return {"ok": True, "action": "created"}
+    live.publish(f"project:{body.project_id}", "vote",
+                 {"project_id": body.project_id, "upvotes": result["upvotes"], "downvotes": result["downvotes"]})
+    return {"ok": True, **result}
 
 
+USER_INCLUDES = ("posts", "followers", "following")
+
 @app.get("/api/users/{user_id}/activity")
-def get_user_activity(user_id: int, db: Session = Depends(get_db)):
-    """Get all projects a user has commented on or voted for"""
+def get_user_activity(
+    user_id: int,
+    limit: Optional[int] = Query(None, ge=1, le=100),
+    before: Optional[str] = None,
+    include: Optional[str] = Query(None, description="comma separated: posts, followers, following"),
+    db: Session = Depends(get_db),
+    current_user_id: Optional[int] = Depends(get_current_user_id),
+):
+    """Projects a user has commented on or voted for, most recent first; next page cursor goes in X-Next-Cursor"""
+    includes = parse_include(include, USER_INCLUDES)
     user = db.query(User).filter(User.id == user_id).first()
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
-    
-    # Get projects with comments
-    commented_project_ids = db.query(Comment.project_id).filter(Comment.user_id == user_id).distinct().all()
-    commented_ids = [pid[0] for pid in commented_project_ids]
-    
-    # Get projects with votes
-    voted_project_ids = db.query(Vote.project_id).filter(Vote.user_id == user_id).distinct().all()
-    voted_ids = [pid[0] for pid in voted_project_ids]
-    
-    # Combine unique project IDs
-    all_project_ids = list(set(commented_ids + voted_ids))
-    
-    # Fetch full project details
-    projects = db.query(Project).filter(Project.id.in_(all_project_ids)).all()
-    
-    result = []
-    for project in projects:
-        comments_count = db.query(Comment).filter(Comment.project_id == project.id).count()
-        upvotes = db.query(Vote).filter(Vote.project_id == project.id, Vote.vote_type == "upvote").count()
-        downvotes = db.query(Vote).filter(Vote.project_id == project.id, Vote.vote_type == "downvote").count()
-        
-        user_vote = None
-        vote = db.query(Vote).filter(Vote.project_id == project.id, Vote.user_id == user_id).first()
-        if vote:
-            user_vote = vote.vote_type
-        
-        user_comment_count = db.query(Comment).filter(Comment.project_id == project.id, Comment.user_id == user_id).count()
-        
-        lng = project.coordinates.get('longitude') if project.coordinates else None
-        lat = project.coordinates.get('latitude') if project.coordinates else None
-        
-        result.append({
-            "id": project.id,
-            "title": project.title,
-            "description": project.preamble,
-            "location": project.location,
-            "phase": project.phase,
-            "comments_count": comments_count,
-            "upvotes": upvotes,
-            "downvotes": downvotes,
-            "user_vote": user_vote,
-            "user_comment_count": user_comment_count,
-            "latitude": lat,
-            "longitude": lng,
-            "images": project.image_url,
-        })
-    
-    # Count followers
-    followers_count = db.query(UserFollow).filter(UserFollow.followed_id == user_id).count()
-    
-    return {
+
+    try:
+        projects, next_cursor = activity.load_activity(db, user_id, limit=limit, before=before)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    follow_counts = social_graph.counts(db, [user.id])[user.id]
+    headers = {"X-Next-Cursor": next_cursor} if next_cursor else None
+    body = {
         "user": {
             "id": user.id,
             "name": user.name,
             "email": user.email,
             "bio": user.bio,
-            "followers_count": followers_count
+            **follow_counts
         },
-        "projects": result
+        "projects": projects
     }
+    if "posts" in includes:
+        body["posts"] = user_posts(db, user.id)
+    if "followers" in includes:
+        body["followers"] = follow_list(db, user.id, current_user_id, followers=True)
+    if "following" in includes:
+        body["following"] = follow_list(db, user.id, current_user_id, followers=False)
+    return FastJSONResponse(body, headers=headers)
 
 
 @app.post("/api/users/{user_id}/bio", response_model=UserPublic)
@@ -747,6 +743,7 @@ def update_user_bio(user_id: int, data: UserUpdate, db: Session = Depends(get_db
 
     user.bio = data.bio
     db.commit()
+    entity_cache.invalidate_user(user_id, db)
     db.refresh(user)
     return user
 
@@ -764,8 +761,7 @@ def create_consultation(
     if body.project_id != project_id:
         raise HTTPException(status_code=400, detail="project_id i body måste matcha :project_id i URL")
 
-    project = db.query(Project).filter(Project.id == project_id).first()
-    if not project:
+    if not entity_cache.project(db, project_id):
         raise HTTPException(status_code=404, detail="Project not found")
 
     content = body.content.strip()
@@ -788,119 +784,174 @@ def create_consultation(
 
     return c
 
-@app.get("/api/projects/{project_id}/news", response_model=List[NewsArticleOut])
-def list_project_news(project_id: int, db: Session = Depends(get_db)):
-    project = db.query(Project).filter(Project.id == project_id).first()
-    if not project:
+@app.post("/api/projects/{project_id}/consultations/batch")
+def create_consultations_batch(
+    project_id: int,
+    body: ConsultationBatch,
+    db: Session = Depends(get_db),
+    user_id: Optional[int] = Depends(get_current_user_id),
+):
+    """Submit many consultations at once; each item is validated on its own and gets its own result"""
+    if not user_id:
+        raise HTTPException(status_code=401, detail="Du måste vara inloggad för att lämna synpunkter")
+
+    if not entity_cache.project(db, project_id):
         raise HTTPException(status_code=404, detail="Project not found")
 
-    items = (
-        db.query(NewsArticle)
-        .filter(NewsArticle.project_id == project_id)
-        .order_by(NewsArticle.date.desc().nullslast(), NewsArticle.id.desc())
-        .all()
-    )
+    rows, results = consultations.validate_batch(body.items, project_id, user_id)
+    ids = iter(consultations.insert_batch(db, rows)) if rows else iter(())
+    for result in results:
+        if result["ok"]:
+            result["id"] = next(ids)
+    return {"accepted": len(rows), "rejected": len(results) - len(rows), "results": results}
+
+@app.get("/api/projects/{project_id}/consultations/export")
+def export_consultations(
+    project_id: int,
+    format: str = Query("csv", pattern="^(csv|ndjson)$"),
+    phase: Optional[str] = None,
+    db: Session = Depends(get_db),
+    user_id: Optional[int] = Depends(get_current_user_id),
+):
+    """Every consultation for a project (optionally one phase), streamed as CSV or NDJSON"""
+    if not user_id:
+        raise HTTPException(status_code=401, detail="Du måste vara inloggad")
+    if user_id not in settings.CONSULTATION_EXPORT_USER_IDS:
+        raise HTTPException(status_code=403, detail="Du har inte behörighet att exportera synpunkter")
+
+    if not entity_cache.project(db, project_id):
+        raise HTTPException(status_code=404, detail="Project not found")
+
+    filename = f"consultations-project-{project_id}" + (f"-{phase}" if phase else "")
+    headers = {"Content-Disposition": f'attachment; filename="{quote(filename)}.{format}"'}
+    if format == "ndjson":
+        return StreamingResponse(consultations.export_ndjson(db, project_id, phase), media_type="application/x-ndjson", headers=headers)
+    return StreamingResponse(consultations.export_csv(db, project_id, phase), media_type="text/csv; charset=utf-8", headers=headers)
+
+@app.get("/api/projects/{project_id}/news", response_model=List[NewsArticleOut], dependencies=[if_modified("projects", "news_articles")])
+def list_project_news(
+    project_id: int,
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=100),
+    before: Optional[str] = None,
+    db: Session = Depends(get_db),
+):
+    """Newest first; next page cursor goes in X-Next-Cursor"""
+    if not entity_cache.project(db, project_id):
+        raise HTTPException(status_code=404, detail="Project not found")
+
+    try:
+        items, next_cursor = news.load_news_page(db, project_id, limit=limit, before=before)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
     return items
 
+@app.get("/api/projects/{project_id}/milestones", dependencies=[if_modified("projects", "project_milestones")])
+def list_project_milestones(project_id: int, db: Session = Depends(get_db)):
+    """The project's tidplan as dated milestones, earliest first"""
+    if not entity_cache.project(db, project_id):
+        raise HTTPException(status_code=404, detail="Project not found")
+    return FastJSONResponse(tidplan.load_timeline(db, project_id))
+
+# no conditional GET: what counts as upcoming changes with the date
+@app.get("/api/milestones/upcoming")
+def upcoming_milestones(
+    limit: int = Query(20, ge=1, le=100),
+    after: Optional[str] = None,
+    on: Optional[date] = Query(None, description="ISO date; default today"),
+    db: Session = Depends(get_db),
+):
+    """Milestones of all projects that have not ended yet, soonest ending first; next page cursor goes in X-Next-Cursor"""
+    try:
+        items, next_cursor = tidplan.load_upcoming(db, (on or date.today()).isoformat(), limit, after)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    headers = {"X-Next-Cursor": next_cursor} if next_cursor else None
+    return FastJSONResponse(items, headers=headers)
+
 # admin/seed endpoint for dev
 @app.post("/api/projects/{project_id}/news", response_model=NewsArticleOut)
 def create_project_news(project_id: int, body: NewsArticleCreate, db: Session = Depends(get_db)):
-    project = db.query(Project).filter(Project.id == project_id).first()
-    if not project:
+    if not entity_cache.project(db, project_id):
         raise HTTPException(status_code=404, detail="Project not found")
 
-    item = NewsArticle(
-        project_id=project_id,
-        title=body.title.strip(),
-        url=str(body.url),
-        source=(body.source or None),
-        date=(body.date or None),
-        summary=(body.summary or None),
+    # same URL again refreshes the existing article instead of duplicating it
+    news.upsert_news(db, [{"project_id": project_id, **body.model_dump(), "url": str(body.url)}])
+    return (
+        db.query(NewsArticle)
+        .filter(NewsArticle.project_id == project_id, NewsArticle.url_hash == url_hash(str(body.url)))
+        .one()
     )
-    db.add(item)
-    db.commit()
-    db.refresh(item)
-    return item
+
+# crawler endpoint: many articles per request, deduplicated on the normalized URL
+@app.post("/api/projects/{project_id}/news/batch")
+def create_project_news_batch(project_id: int, body: NewsArticleBatch, db: Session = Depends(get_db)):
+    if not entity_cache.project(db, project_id):
+        raise HTTPException(status_code=404, detail="Project not found")
+
+    return news.upsert_news(db, ({"project_id": project_id, **item.model_dump(), "url": str(item.url)} for item in body.items))
 
 # ============= POSTS ENDPOINTS =============
 
-@app.get("/api/posts")
+@app.get("/api/posts", dependencies=[if_modified("posts", "users", "post_comments", "post_votes", per_user=True)])
 def get_posts(db: Session = Depends(get_db), user_id: Optional[int] = Depends(get_current_user_id)):
-    posts = db.query(Post).order_by(Post.created_at.desc()).all()
+    posts = (
+        db.query(Post, User.name)
+        .outerjoin(User, User.id == Post.user_id)
+        .order_by(Post.created_at.desc())
+        .all()
+    )
+    comments = count_by(db, PostComment, "post_id")
+    tallies = vote_tallies(db, PostVote, "post_id")
+    my_votes = user_votes(db, PostVote, "post_id", user_id)
+
     result = []
+    for post, author_name in posts:
+        lat, lng = lat_lng(post.coordinates)
+        upvotes, downvotes = tallies.get(post.id, (0, 0))
+
+        result.append(PostListItem(
+            id=post.id,
+            title=post.title,
+            content=post.content,
+            image_url=post.image_url,
+            created_at=post.created_at,
+            author_id=post.user_id,
+            author_name=author_name or "Unknown",
+            comments_count=comments.get(post.id, 0),
+            upvotes=upvotes,
+            downvotes=downvotes,
+            user_vote=my_votes.get(post.id),
+            latitude=lat,
+            longitude=lng,
+        ))
     
-    for post in posts:
-        author = db.query(User).filter(User.id == post.user_id).first()
-        comments_count = db.query(PostComment).filter(PostComment.post_id == post.id).count()
-        upvotes = db.query(PostVote).filter(PostVote.post_id == post.id, PostVote.vote_type == "upvote").count()
-        downvotes = db.query(PostVote).filter(PostVote.post_id == post.id, PostVote.vote_type == "downvote").count()
-        
-        user_vote = None
-        if user_id:
-            vote = db.query(PostVote).filter(PostVote.post_id == post.id, PostVote.user_id == user_id).first()
-            if vote:
-                user_vote = vote.vote_type
-        
-        lng = None
-        lat = None
-        if post.coordinates:
-            lng = post.coordinates.get('longitude')
-            lat = post.coordinates.get('latitude')
-        
-        result.append({
-            "id": post.id,
-            "title": post.title,
-            "content": post.content,
-            "image_url": post.image_url,
-            "created_at": post.created_at,
-            "author_id": post.user_id,
-            "author_name": author.name if author else "Unknown",
-            "comments_count": comments_count,
-            "upvotes": upvotes,
-            "downvotes": downvotes,
-            "user_vote": user_vote,
-            "latitude": lat,
-            "longitude": lng,
-        })
-    
-    return result
+    return FastJSONResponse(result)
 
-@app.get("/api/posts/geojson")
-def posts_geojson(db: Session = Depends(get_db)):
-    posts = db.query(Post).all()
+@app.get("/api/posts/geojson", dependencies=[if_modified("posts", "users")])
+def posts_geojson(request: Request, db: Session = Depends(get_db)):
+    posts = db.query(Post, User.name).options(POST_MAP_COLUMNS).outerjoin(User, User.id == Post.user_id).all()
     features = []
     
-    for post in posts:
-        if not post.coordinates:
-            continue
-        lng = post.coordinates.get('longitude')
-        lat = post.coordinates.get('latitude')
-        
+    for post, author_name in posts:
+        lat, lng = lat_lng(post.coordinates)
         if lng is None or lat is None:
             continue
         
-        author = db.query(User).filter(User.id == post.user_id).first()
-        
-        feature = {
-            "type": "Feature",
-            "geometry": {
-                "type": "Point",
-                "coordinates": [lng, lat]
-            },
-            "properties": {
-                "id": post.id,
-                "title": post.title,
-                "author_name": author.name if author else "Unknown",
-                "created_at": post.created_at,
-                "thumbnail": post.image_url if post.image_url else None
-            }
-        }
-        features.append(feature)
+        features.append(Feature(
+            geometry=Point(coordinates=(lng, lat)),
+            properties=PostFeatureProperties(
+                id=post.id,
+                title=post.title,
+                author_name=author_name or "Unknown",
+                created_at=post.created_at,
+                thumbnail=thumbnail(request, post.image_url),
+            ),
+        ))
     
-    return {
-        "type": "FeatureCollection",
-        "features": features
-    }
+    return FastJSONResponse(feature_collection(features))
 
 @app.get("/api/posts/{post_id}")
 def get_post(post_id: int, db: Session = Depends(get_db), user_id: Optional[int] = Depends(get_current_user_id)):
@@ -908,7 +959,7 @@ def get_post(post_id: int, db: Session = Depends(get_db), user_id: Optional[int]
     if not post:
         raise HTTPException(status_code=404, detail="Post not found")
     
-    author = db.query(User).filter(User.id == post.user_id).first()
+    author = entity_cache.user(db, post.user_id)
     comments_count = db.query(PostComment).filter(PostComment.post_id == post.id).count()
     upvotes = db.query(PostVote).filter(PostVote.post_id == post.id, PostVote.vote_type == "upvote").count()
     downvotes = db.query(PostVote).filter(PostVote.post_id == post.id, PostVote.vote_type == "downvote").count()
@@ -962,7 +1013,7 @@ def create_post(body: PostCreate, db: Session = Depends(get_db), user_id: Option
     db.commit()
     db.refresh(post)
     
-    author = db.query(User).filter(User.id == user_id).first()
+    author = entity_cache.user(db, user_id)
     
     return {
         "id": post.id,
@@ -975,42 +1026,21 @@ def create_post(body: PostCreate, db: Session = Depends(get_db), user_id: Option
     }
 
 @app.get("/api/posts/{post_id}/comments")
-def get_post_comments(post_id: int, db: Session = Depends(get_db), current_user: Optional[int] = Depends(get_current_user_id)):
-    comments = db.query(PostComment).filter(PostComment.post_id == post_id).order_by(PostComment.created_at.desc()).all()
-    result = []
-    
-    for comment in comments:
-        user = db.query(User).filter(User.id == comment.user_id).first()
-        like_count = db.query(PostCommentLike).filter(PostCommentLike.comment_id == comment.id).count()
-        
-        liked_by_user = False
-        if current_user:
-            liked_by_user = (
-                db.query(PostCommentLike)
-                .filter(PostCommentLike.comment_id == comment.id, PostCommentLike.user_id == current_user)
-                .first()
-                is not None
-            )
-        
-        result.append({
-            "id": comment.id,
-            "post_id": comment.post_id,
-            "user_id": comment.user_id,
-            "user_name": user.name if user else "Unknown",
-            "content": comment.content,
-            "created_at": comment.created_at,
-            "likes": like_count,
-            "liked_by_user": liked_by_user
-        })
-    
-    return result
+def get_post_comments(
+    post_id: int,
+    limit: Optional[int] = Query(None, ge=1, le=100),
+    before: Optional[str] = None,
+    db: Session = Depends(get_db),
+    current_user: Optional[int] = Depends(get_current_user_id),
+):
+    return _comment_thread_page(db, POST_THREAD, post_id, current_user, limit, before)
 
 @app.post("/api/posts/{post_id}/comments")
 def create_post_comment(post_id: int, body: PostCommentCreate, db: Session = Depends(get_db), user_id: Optional[int] = Depends(get_current_user_id)):
     if not user_id:
         raise HTTPException(status_code=401, detail="Du måste vara inloggad för att kommentera")
     
-    post = db.query(Post).filter(Post.id == post_id).first()
+    post = db.query(Post.id).filter(Post.id == post_id).first()
     if not post:
         raise HTTPException(status_code=404, detail="Post not found")
     
@@ -1024,8 +1054,8 @@ def create_post_comment(post_id: int, body: PostCommentCreate, db: Session = Dep
     db.commit()
     db.refresh(comment)
     
-    user = db.query(User).filter(User.id == user_id).first()
-    return {
+    user = entity_cache.user(db, user_id)
+    created = {
         "id": comment.id,
         "post_id": comment.post_id,
         "user_id": comment.user_id,
@@ -1033,36 +1063,27 @@ def create_post_comment(post_id: int, body: PostCommentCreate, db: Session = Dep
         "content": comment.content,
         "created_at": comment.created_at,
     }
+    live.publish(f"post:{comment.post_id}", "comment", created)
+    return created
 
 @app.post("/api/post-comments/{comment_id}/like")
 def toggle_post_comment_like(comment_id: int, db: Session = Depends(get_db), current_user: Optional[int] = Depends(get_current_user_id)):
     if not current_user:
         raise HTTPException(status_code=401, detail="Du måste vara inloggad för att gilla en kommentar")
     
-    comment = db.query(PostComment).filter(PostComment.id == comment_id).first()
+    comment = db.query(PostComment.user_id, PostComment.post_id).filter(PostComment.id == comment_id).first()
     if not comment:
         raise HTTPException(status_code=404, detail="Comment not found")
     
     if comment.user_id == current_user:
         raise HTTPException(status_code=400, detail="Du kan inte gilla din egen kommentar")
     
-    existing_like = (
-        db.query(PostCommentLike)
-        .filter(PostCommentLike.comment_id == comment_id, PostCommentLike.user_id == current_user)
-        .first()
-    )
-    
-    if existing_like:
-        db.delete(existing_like)
-        db.commit()
-        like_count = db.query(PostCommentLike).filter(PostCommentLike.comment_id == comment_id).count()
-        return {"liked": False, "likes": like_count}
+    if write_buffer:
+        liked, like_count = write_buffer.toggle_like(db, "post_comment_like", comment_id, current_user)
     else:
-        new_like = PostCommentLike(user_id=current_user, comment_id=comment_id)
-        db.add(new_like)
-        db.commit()
-        like_count = db.query(PostCommentLike).filter(PostCommentLike.comment_id == comment_id).count()
-        return {"liked": True, "likes": like_count}
+        liked, like_count = toggle_like(db, PostCommentLike, current_user, comment_id)
+    live.publish(f"post:{comment.post_id}", "comment_like", {"comment_id": comment_id, "likes": like_count})
+    return {"liked": liked, "likes": like_count}
 
 @app.post("/api/posts/{post_id}/vote")
 def vote_on_post(post_id: int, body: PostVoteCreate, db: Session = Depends(get_db), user_id: Optional[int] = Depends(get_current_user_id)):
@@ -1072,56 +1093,42 @@ def vote_on_post(post_id: int, body: PostVoteCreate, db: Session = Depends(get_d
     if body.vote_type not in ["upvote", "downvote"]:
         raise HTTPException(status_code=400, detail="Invalid vote type")
     
-    post = db.query(Post).filter(Post.id == post_id).first()
+    post = db.query(Post.id).filter(Post.id == post_id).first()
     if not post:
         raise HTTPException(status_code=404, detail="Post not found")
     
-    existing_vote = db.query(PostVote).filter(PostVote.post_id == post_id, PostVote.user_id == user_id).first()
-    
-    if existing_vote:
-        if existing_vote.vote_type == body.vote_type:
-            db.delete(existing_vote)
-            db.commit()
-            return {"ok": True, "action": "removed"}
-        else:
-            existing_vote.vote_type = body.vote_type
-            db.commit()
-            return {"ok": True, "action": "changed"}
+    if write_buffer:
+        result = write_buffer.toggle_vote(db, "post_vote", post_id, user_id, body.vote_type)
     else:
-        vote = PostVote(
-            post_id=post_id,
-            user_id=user_id,
-            vote_type=body.vote_type,
-        )
-        db.add(vote)
-        db.commit()
-        return {"ok": True, "action": "created"}
+        result = toggle_vote(db, PostVote, "post_id", post_id, user_id, body.vote_type)
+    live.publish(f"post:{post_id}", "vote", {"post_id": post_id, "upvotes": result["upvotes"], "downvotes": result["downvotes"]})
+    return {"ok": True, **result}
 
 @app.get("/api/users/{user_id}/posts")
 def get_user_posts(user_id: int, db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.id == user_id).first()
-    if not user:
+    if not entity_cache.user(db, user_id):
         raise HTTPException(status_code=404, detail="User not found")
-    
+    return FastJSONResponse(user_posts(db, user_id))
+
+def user_posts(db: Session, user_id: int) -> list[UserPostItem]:
     posts = db.query(Post).filter(Post.user_id == user_id).order_by(Post.created_at.desc()).all()
-    result = []
+    post_ids = [post.id for post in posts]
+    comments = count_by(db, PostComment, "post_id", post_ids)
+    tallies = vote_tallies(db, PostVote, "post_id", post_ids)
     
+    result = []
     for post in posts:
-        comments_count = db.query(PostComment).filter(PostComment.post_id == post.id).count()
-        upvotes = db.query(PostVote).filter(PostVote.post_id == post.id, PostVote.vote_type == "upvote").count()
-        downvotes = db.query(PostVote).filter(PostVote.post_id == post.id, PostVote.vote_type == "downvote").count()
-        
-        result.append({
-            "id": post.id,
-            "title": post.title,
-            "content": post.content,
-            "image_url": post.image_url,
-            "created_at": post.created_at,
-            "comments_count": comments_count,
-            "upvotes": upvotes,
-            "downvotes": downvotes,
-        })
-    
+        upvotes, downvotes = tallies.get(post.id, (0, 0))
+        result.append(UserPostItem(
+            id=post.id,
+            title=post.title,
+            content=post.content,
+            image_url=post.image_url,
+            created_at=post.created_at,
+            comments_count=comments.get(post.id, 0),
+            upvotes=upvotes,
+            downvotes=downvotes,
+        ))
     return result
 
 # ============= FOLLOW ENDPOINTS =============
@@ -1134,16 +1141,10 @@ def api_follow_user(user_id: int, db: Session = Depends(get_db), current_user_id
     if current_user_id == user_id:
         raise HTTPException(status_code=400, detail="Du kan inte följa dig själv")
     
-    target_user = db.query(User).filter(User.id == user_id).first()
-    if not target_user:
+    if not entity_cache.user(db, user_id):
         raise HTTPException(status_code=404, detail="Användare hittades inte")
     
-    existing_follow = db.query(UserFollow).filter(
-        UserFollow.follower_id == current_user_id,
-        UserFollow.followed_id == user_id
-    ).first()
-    
-    if existing_follow:
+    if social_graph.is_following(db, current_user_id, user_id):
         raise HTTPException(status_code=400, detail="Du följer redan denna användare")
     
     follow = UserFollow(
@@ -1152,7 +1153,17 @@ def api_follow_user(user_id: int, db: Session = Depends(get_db), current_user_id
         created_at=datetime.now().isoformat()
     )
     db.add(follow)
-    db.commit()
+    db.query(User).filter(User.id == user_id).update(
+        {User.followers_count: User.followers_count + 1}, synchronize_session=False
+    )
+    try:
+        db.commit()
+    except IntegrityError:
+        # Stale cache or a concurrent request already created the follow
+        db.rollback()
+        raise HTTPException(status_code=400, detail="Du följer redan denna användare")
+    finally:
+        social_graph.invalidate(current_user_id)
     
     return {"ok": True, "message": "Följer nu användaren"}
 
@@ -1161,76 +1172,54 @@ def api_unfollow_user(user_id: int, db: Session = Depends(get_db), current_user_
     if not current_user_id:
         raise HTTPException(status_code=401, detail="Du måste vara inloggad")
     
-    follow = db.query(UserFollow).filter(
+    deleted = db.query(UserFollow).filter(
         UserFollow.follower_id == current_user_id,
         UserFollow.followed_id == user_id
-    ).first()
+    ).delete(synchronize_session=False)
     
-    if not follow:
+    if not deleted:
+        db.rollback()
         raise HTTPException(status_code=400, detail="Du följer inte denna användare")
     
-    db.delete(follow)
+    db.query(User).filter(User.id == user_id).update(
+        {User.followers_count: User.followers_count - 1}, synchronize_session=False
+    )
     db.commit()
+    social_graph.invalidate(current_user_id)
     
     return {"ok": True, "message": "Slutade följa användaren"}
 
 @app.get("/api/users/{user_id}/followers")
 def api_get_user_followers(user_id: int, db: Session = Depends(get_db), current_user_id: Optional[int] = Depends(get_current_user_id)):
-    user = db.query(User).filter(User.id == user_id).first()
-    if not user:
+    if not entity_cache.user(db, user_id):
         raise HTTPException(status_code=404, detail="Användare hittades inte")
-    
-    followers = db.query(User).join(
-        UserFollow, UserFollow.follower_id == User.id
-    ).filter(UserFollow.followed_id == user_id).all()
-    
-    result = []
-    for follower in followers:
-        is_following = False
-        if current_user_id:
-            is_following = db.query(UserFollow).filter(
-                UserFollow.follower_id == current_user_id,
-                UserFollow.followed_id == follower.id
-            ).first() is not None
-        
-        result.append({
-            "id": follower.id,
-            "name": follower.name,
-            "email": follower.email,
-            "bio": follower.bio,
-            "is_following": is_following
-        })
-    
-    return result
+    return follow_list(db, user_id, current_user_id, followers=True)
 
 @app.get("/api/users/{user_id}/following")
 def api_get_user_following(user_id: int, db: Session = Depends(get_db), current_user_id: Optional[int] = Depends(get_current_user_id)):
-    user = db.query(User).filter(User.id == user_id).first()
-    if not user:
+    if not entity_cache.user(db, user_id):
         raise HTTPException(status_code=404, detail="Användare hittades inte")
-    
-    following = db.query(User).join(
-        UserFollow, UserFollow.followed_id == User.id
-    ).filter(UserFollow.follower_id == user_id).all()
-    
-    result = []
-    for followed in following:
-        is_following = False
-        if current_user_id:
-            is_following = db.query(UserFollow).filter(
-                UserFollow.follower_id == current_user_id,
-                UserFollow.followed_id == followed.id
-            ).first() is not None
-        
-        result.append({
-            "id": followed.id,
-            "name": followed.name,
-            "email": followed.email,
-            "bio": followed.bio,
-            "is_following": is_following
-        })
-    
-    return result
+    return follow_list(db, user_id, current_user_id, followers=False)
+
+def follow_list(db: Session, user_id: int, viewer_id: Optional[int], followers: bool) -> list[dict]:
+    """The user's followers (or the users they follow), each with whether the viewer follows them"""
+    if followers:
+        users = db.query(User).join(UserFollow, UserFollow.follower_id == User.id).filter(UserFollow.followed_id == user_id).all()
+    else:
+        users = db.query(User).join(UserFollow, UserFollow.followed_id == User.id).filter(UserFollow.follower_id == user_id).all()
+
+    followed_ids = social_graph.followed_among(db, viewer_id, [u.id for u in users])
+
+    return [
+        {
+            "id": u.id,
+            "name": u.name,
+            "email": u.email,
+            "bio": u.bio,
+            "is_following": u.id in followed_ids
+        }
+        for u in users
+    ]
 
 @app.get("/api/users/{user_id}/is-following")
 def api_check_is_following(user_id: int, db: Session = Depends(get_db), current_user_id: Optional[int] = Depends(get_current_user_id)):
@@ -1238,43 +1227,40 @@ def api_check_is_following(user_id: int, db: Session = Depends(get_db), current_
     if not current_user_id:
         raise HTTPException(status_code=401, detail="Du måste vara inloggad")
     
-    target_user = db.query(User).filter(User.id == user_id).first()
-    if not target_user:
+    if not entity_cache.user(db, user_id):
         raise HTTPException(status_code=404, detail="Användare hittades inte")
     
-    is_following = db.query(UserFollow).filter(
-        UserFollow.follower_id == current_user_id,
-        UserFollow.followed_id == user_id
-    ).first() is not None
-    
-    return {"is_following": is_following}
+    return {"is_following": social_graph.is_following(db, current_user_id, user_id)}
 
 @app.get("/api/users")
-def api_get_all_users(db: Session = Depends(get_db), current_user_id: Optional[int] = Depends(get_current_user_id)):
-    users = db.query(User).all()
-    
-    result = []
-    for user in users:
-        is_following = False
-        if current_user_id:
-            is_following = db.query(UserFollow).filter(
-                UserFollow.follower_id == current_user_id,
-                UserFollow.followed_id == user.id
-            ).first() is not None
-        
-        # Count followers for each user
-        followers_count = db.query(UserFollow).filter(UserFollow.followed_id == user.id).count()
-        
-        result.append({
+def api_get_all_users(
+    q: Optional[str] = Query(None, max_length=100),
+    limit: int = Query(20, ge=1, le=50),
+    db: Session = Depends(get_db),
+    current_user_id: Optional[int] = Depends(get_current_user_id),
+):
+    """Prefix search over user names, served from the users.name_search index"""
+    query = db.query(User.id, User.name, User.bio, User.followers_count)
+
+    prefix = normalize_name(q) if q else None
+    if prefix:
+        # Range scan instead of LIKE so the index is used regardless of collation
+        query = query.filter(User.name_search >= prefix, User.name_search < prefix + "\uffff")
+
+    users = query.order_by(User.name_search, User.id).limit(limit).all()
+
+    followed_ids = social_graph.followed_among(db, current_user_id, [u.id for u in users])
+
+    return [
+        {
             "id": user.id,
             "name": user.name,
-            "email": user.email,
             "bio": user.bio,
-            "is_following": is_following,
-            "followers_count": followers_count
-        })
-    
-    return result
+            "is_following": user.id in followed_ids,
+            "followers_count": user.followers_count,
+        }
+        for user in users
+    ]
 
 @app.get("/api/for_you")
 def api_get_for_you_feed(request: Request, db: Session = Depends(get_db), current_user_id: Optional[int] = Depends(get_current_user_id)):
@@ -1284,89 +1270,70 @@ def api_get_for_you_feed(request: Request, db: Session = Depends(get_db), curren
         raise HTTPException(status_code=401, detail="Du måste vara inloggad")
     
     # Get users that current user follows
-    following_ids = db.query(UserFollow.followed_id).filter(
-        UserFollow.follower_id == current_user_id
-    ).all()
-    following_ids = [f[0] for f in following_ids]
+    following_ids = list(social_graph.following_ids(db, current_user_id))
     
     feed_items = []
     
     if following_ids:
         # Get posts from followed users
-        posts = db.query(Post).filter(Post.user_id.in_(following_ids)).order_by(Post.created_at.desc()).limit(20).all()
+        posts = (
+            db.query(Post, User.name)
+            .outerjoin(User, User.id == Post.user_id)
+            .filter(Post.user_id.in_(following_ids))
+            .order_by(Post.created_at.desc())
+            .limit(20)
+            .all()
+        )
+        post_ids = [post.id for post, _ in posts]
+        comments = count_by(db, PostComment, "post_id", post_ids)
+        tallies = vote_tallies(db, PostVote, "post_id", post_ids)
         
-        for post in posts:
-            user = db.query(User).filter(User.id == post.user_id).first()
-            comments_count = db.query(PostComment).filter(PostComment.post_id == post.id).count()
-            upvotes = db.query(PostVote).filter(PostVote.post_id == post.id, PostVote.vote_type == "upvote").count()
-            downvotes = db.query(PostVote).filter(PostVote.post_id == post.id, PostVote.vote_type == "downvote").count()
-            
-            feed_items.append({
-                "type": "post",
-                "id": post.id,
-                "title": post.title,
-                "content": post.content,
-                "comments_count": comments_count,
-                "upvotes": upvotes,
-                "downvotes": downvotes,
-                "created_at": post.created_at,
-                "user_id": post.user_id,
-                "user_name": user.name if user else "Unknown"
-            })
+        for post, user_name in posts:
+            upvotes, downvotes = tallies.get(post.id, (0, 0))
+            feed_items.append(FeedPost(
+                id=post.id,
+                title=post.title,
+                content=post.content,
+                comments_count=comments.get(post.id, 0),
+                upvotes=upvotes,
+                downvotes=downvotes,
+                created_at=post.created_at,
+                user_id=post.user_id,
+                user_name=user_name or "Unknown",
+            ))
         
         # Get projects where followed users have commented or voted
-        project_ids = set()
-        
-        # Projects with comments from followed users
-        comments = db.query(Comment).filter(Comment.user_id.in_(following_ids)).all()
-        for comment in comments:
-            project_ids.add(comment.project_id)
-        
-        # Projects with votes from followed users
-        votes = db.query(Vote).filter(Vote.user_id.in_(following_ids)).all()
-        for vote in votes:
-            project_ids.add(vote.project_id)
+        commented = db.query(Comment.project_id).filter(Comment.user_id.in_(following_ids))
+        voted = db.query(Vote.project_id).filter(Vote.user_id.in_(following_ids))
+        project_ids = [row[0] for row in commented.union(voted)]
         
         # Get project details
         if project_ids:
-            projects = db.query(Project).filter(Project.id.in_(project_ids)).limit(10).all()
-            
-            for project in projects:
-                comments_count = db.query(Comment).filter(Comment.project_id == project.id).count()
-                upvotes = db.query(Vote).filter(Vote.project_id == project.id, Vote.vote_type == "upvote").count()
-                downvotes = db.query(Vote).filter(Vote.project_id == project.id, Vote.vote_type == "downvote").count()
-                
-                feed_items.append({
-                    "type": "project",
-                    "id": project.id,
-                    "title": project.title,
-                    "description": project.preamble or project.widget_text or "",
-                    "location": project.location,
-                    "phase": project.phase,
-                    "comments_count": comments_count,
-                    "upvotes": upvotes,
-                    "downvotes": downvotes
-                })
+            projects = db.query(Project).options(PROJECT_FEED_COLUMNS).filter(Project.id.in_(project_ids)).limit(10).all()
+            feed_items.extend(_feed_projects(db, projects))
     
     # If feed is empty, return recommended projects (most active)
     if not feed_items:
-        projects = db.query(Project).order_by(Project.upvotes.desc()).limit(10).all()
-        
-        for project in projects:
-            comments_count = db.query(Comment).filter(Comment.project_id == project.id).count()
-            upvotes = db.query(Vote).filter(Vote.project_id == project.id, Vote.vote_type == "upvote").count()
-            downvotes = db.query(Vote).filter(Vote.project_id == project.id, Vote.vote_type == "downvote").count()
-            
-            feed_items.append({
-                "type": "project",
-                "id": project.id,
-                "title": project.title,
-                "description": project.preamble or project.widget_text or "",
-                "location": project.location,
-                "phase": project.phase,
-                "comments_count": comments_count,
-                "upvotes": upvotes,
-                "downvotes": downvotes
-            })
+        projects = db.query(Project).options(PROJECT_FEED_COLUMNS).order_by(Project.upvotes.desc()).limit(10).all()
+        feed_items.extend(_feed_projects(db, projects))
     
-    return feed_items
\ No newline at end of file
+    return FastJSONResponse(feed_items)
+
+def _feed_projects(db: Session, projects: list[Project]) -> list[FeedProject]:
+    project_ids = [project.id for project in projects]
+    comments = count_by(db, Comment, "project_id", project_ids)
+    tallies = vote_tallies(db, Vote, "project_id", project_ids)
+    items = []
+    for project in projects:
+        upvotes, downvotes = tallies.get(project.id, (0, 0))
+        items.append(FeedProject(
+            id=project.id,
+            title=project.title,
+            description=project.preamble or project.widget_text or "",
+            location=project.location,
+            phase=project.phase,
+            comments_count=comments.get(project.id, 0),
+            upvotes=upvotes,
+            downvotes=downvotes,
+        ))
+    return items
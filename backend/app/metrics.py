@@ -0,0 +1,211 @@
+# app/metrics.py
+"""Per-route request metrics in Prometheus text format.
+
+MetricsMiddleware times every HTTP request and records its response size; the
+engine event hooks below count SQL statements and DB time for the request
+that is currently running (tracked in a ContextVar, which Starlette copies
+into the threadpool that runs sync routes). render() produces the /metrics
+body. Routes are labelled by their path template, e.g. /api/projects/{project_id}.
+"""
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from threading import Lock
+from typing import Callable, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.datastructures import MutableHeaders
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 250)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+
+@dataclass(slots=True)
+class RequestStats:
+    scope: dict
+    started: float = field(default_factory=time.perf_counter)
+    queries: int = 0
+    db_seconds: float = 0.0
+
+    @property
+    def route(self) -> str:
+        return route_label(self.scope)
+
+
+current_request: ContextVar[Optional[RequestStats]] = ContextVar("current_request", default=None)
+
+
+def route_label(scope: dict) -> str:
+    route = scope.get("route")
+    # unmatched paths share one label so 404 scans can't blow up the series count
+    return getattr(route, "path", None) or "unmatched"
+
+
+# ---- metric types ----
+
+def _labels(names: tuple[str, ...], values: tuple, extra: str = "") -> str:
+    pairs = [f'{n}="{str(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = ()):
+        self.name, self.help, self.labels = name, help, labels
+        self._values: dict[tuple, float] = {}
+        self._lock = Lock()
+
+    def inc(self, labels: tuple = (), value: float = 1.0):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + value
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_labels(self.labels, labels)} {value:g}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, buckets: tuple, labels: tuple[str, ...] = ()):
+        self.name, self.help, self.labels, self.buckets = name, help, labels, buckets
+        self._series: dict[tuple, list] = {}  # labels -> [bucket counts..., sum, count]
+        self._lock = Lock()
+
+    def observe(self, labels: tuple, value: float):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for labels, series in sorted(self._series.items()):
+                for bound, n in zip(self.buckets, series):
+                    le = 'le="%g"' % bound
+                    lines.append(f"{self.name}_bucket{_labels(self.labels, labels, le)} {n}")
+                le = 'le="+Inf"'
+                lines.append(f"{self.name}_bucket{_labels(self.labels, labels, le)} {series[-1]}")
+                lines.append(f"{self.name}_sum{_labels(self.labels, labels)} {series[-2]:g}")
+                lines.append(f"{self.name}_count{_labels(self.labels, labels)} {series[-1]}")
+        return lines
+
+
+class Gauge:
+    """Read at scrape time; fn returns a number or {label value: number}"""
+
+    def __init__(self, name: str, help: str, fn: Callable, label: Optional[str] = None, kind: str = "gauge"):
+        self.name, self.help, self.fn, self.label, self.kind = name, help, fn, label, kind
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        value = self.fn()
+        if isinstance(value, dict):
+            for key, v in sorted(value.items()):
+                lines.append(f'{self.name}{{{self.label}="{key}"}} {v or 0:g}')
+        else:
+            lines.append(f"{self.name} {value or 0:g}")
+        return lines
+
+
+REQUEST_LATENCY = Histogram("stadssurr_http_request_duration_seconds", "Request latency", LATENCY_BUCKETS, ("method", "route"))
+REQUESTS = Counter("stadssurr_http_requests_total", "Requests by status", ("method", "route", "status"))
+REQUEST_QUERIES = Histogram("stadssurr_http_request_sql_queries", "SQL statements per request", QUERY_BUCKETS, ("method", "route"))
+REQUEST_DB_SECONDS = Counter("stadssurr_http_request_db_seconds_total", "Time spent in SQL statements", ("method", "route"))
+RESPONSE_SIZE = Histogram("stadssurr_http_response_size_bytes", "Response body size as sent", SIZE_BUCKETS, ("method", "route"))
+
+registry: list = [REQUEST_LATENCY, REQUESTS, REQUEST_QUERIES, REQUEST_DB_SECONDS, RESPONSE_SIZE]
+
+
+def register(metric):
+    registry.append(metric)
+    return metric
+
+
+def render() -> str:
+    lines = []
+    for metric in registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# ---- SQL hooks, on every engine (benchmarks create their own) ----
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_started"].pop()
+    stats = current_request.get()
+    if stats is not None:
+        stats.queries += 1
+        stats.db_seconds += elapsed
+
+
+@event.listens_for(Engine, "handle_error")
+def _handle_error(exception_context):
+    conn = exception_context.connection
+    if conn is not None and conn.info.get("query_started"):
+        conn.info["query_started"].pop()
+
+
+# ---- middleware ----
+
+class MetricsMiddleware:
+    """Records the metrics above per request; optionally adds a Server-Timing header.
+
+    Add it last so it is the outermost middleware and sees the compressed size.
+    """
+
+    def __init__(self, app, server_timing: bool = False):
+        self.app = app
+        self.server_timing = server_timing
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats(scope=scope)
+        token = current_request.set(stats)
+        status = 500
+        size = 0
+
+        async def send_wrapper(message):
+            nonlocal status, size
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if self.server_timing:
+                    headers = MutableHeaders(raw=message["headers"])
+                    total_ms = (time.perf_counter() - stats.started) * 1000
+                    headers.append(
+                        "Server-Timing",
+                        f'app;dur={total_ms:.1f}, db;dur={stats.db_seconds * 1000:.1f};desc="{stats.queries} queries"',
+                    )
+            elif message["type"] == "http.response.body":
+                size += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            current_request.reset(token)
+            labels = (scope["method"], stats.route)
+            REQUEST_LATENCY.observe(labels, time.perf_counter() - stats.started)
+            REQUESTS.inc((*labels, status))
+            REQUEST_QUERIES.observe(labels, stats.queries)
+            REQUEST_DB_SECONDS.inc(labels, stats.db_seconds)
+            RESPONSE_SIZE.observe(labels, size)
@@ -1,8 +1,10 @@
 # app/models.py
-from sqlalchemy import Column, Integer, String, Text, UniqueConstraint, ForeignKey, JSON
-from sqlalchemy.orm import relationship, backref
+from sqlalchemy import Column, Integer, Float, String, Text, UniqueConstraint, ForeignKey, JSON, Index, text
+from sqlalchemy.orm import relationship, backref, validates, deferred
 from .database import Base
 from datetime import datetime
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+import hashlib
 
 class User(Base):
     __tablename__ = "users"
@@ -12,6 +14,22 @@ class User(Base):
     name = Column(String, nullable=False)
     password_hash = Column(String, nullable=False)
     bio = Column(Text, nullable=True)
+    # casefolded copy of name, used for indexed prefix search in /api/users
+    name_search = Column(String, index=True, nullable=True)
+    # maintained by follow/unfollow instead of counting user_follows on read
+    followers_count = Column(Integer, default=0, nullable=False, server_default="0")
+
+    @validates("name")
+    def _sync_name_search(self, key, value):
+        self.name_search = normalize_name(value)
+        return value
+
+
+def normalize_name(name: str | None) -> str | None:
+    """Search key for User.name (casefold handles å/ä/ö, which SQLite lower() does not)."""
+    if name is None:
+        return None
+    return " ".join(name.split()).casefold()
 
 class Project(Base):
     __tablename__ = "projects"
@@ -21,16 +39,21 @@ class Project(Base):
     widget_text = Column(String, nullable=True)
     preamble = Column(String, nullable=True)
     location = Column(String, nullable=True)
-    tidplan_html = Column(String, nullable=True) # static name
+    tidplan_html = deferred(Column(String, nullable=True)) # static name; large, only loaded by get_project
     phase = Column(String, nullable=True) # maps to current stage
     coordinates = Column(JSON, nullable=False)
     image_url = Column(String, nullable=True) # image url to Stockholm.växer
+    image_hash = Column(String, nullable=True) # sha256 of the image in the image cache, set by scrape.py --images
+    image_width = Column(Integer, nullable=True)
+    image_height = Column(Integer, nullable=True)
+    image_placeholder = Column(String, nullable=True) # tiny data: URI shown blurred while the image loads
     url = Column(String, nullable=True) # URL to stockholm.växer
     upvotes = Column(Integer, default=0)
     downvotes = Column(Integer, default=0)
 
 class Comment(Base):
     __tablename__ = "comments"
+    __table_args__ = (Index("ix_comments_project_created", "project_id", "created_at"),)
     id = Column(Integer, primary_key=True, index=True)
     project_id = Column(Integer, ForeignKey("projects.id", ondelete="CASCADE"), nullable=False)
     user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
@@ -44,7 +67,7 @@ class CommentLike(Base):
     __tablename__ = "comment_likes"
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
-    comment_id = Column(Integer, ForeignKey("comments.id", ondelete="CASCADE"), nullable=False)
+    comment_id = Column(Integer, ForeignKey("comments.id", ondelete="CASCADE"), index=True, nullable=False)
 
     __table_args__ = (UniqueConstraint("user_id", "comment_id", name="unique_user_comment_like"),)
 
@@ -59,6 +82,33 @@ class Vote(Base):
     user = relationship("User")
     project = relationship("Project")
 
+class UserProjectActivity(Base):
+    """One row per (user, project) the user has commented on or voted for, maintained by app/activity.py"""
+    __tablename__ = "user_project_activity"
+    __table_args__ = (Index("ix_user_activity_recent", "user_id", "last_activity_at", "project_id"),)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    project_id = Column(Integer, ForeignKey("projects.id", ondelete="CASCADE"), primary_key=True)
+    vote_type = Column(String, nullable=True)  # the user's current vote, None if they only commented
+    comment_count = Column(Integer, nullable=False, default=0, server_default="0")
+    last_activity_at = Column(String, nullable=False)
+
+class ProjectMilestone(Base):
+    """Dated entries read from a project's tidplan at import, maintained by app/tidplan.py"""
+    __tablename__ = "project_milestones"
+    __table_args__ = (
+        Index("ix_project_milestones_timeline", "project_id", "starts_on", "position"),
+        Index("ix_project_milestones_ends_on", "ends_on", "id"),
+    )
+    id = Column(Integer, primary_key=True)
+    project_id = Column(Integer, ForeignKey("projects.id", ondelete="CASCADE"), nullable=False)
+    position = Column(Integer, nullable=False) # order in the tidplan text
+    section = Column(String, nullable=True) # heading it was under, e.g. "Genomförd planprocess"
+    label = Column(String, nullable=False)
+    date_text = Column(String, nullable=False) # the date as written, e.g. "våren 2026"
+    starts_on = Column(String, nullable=False) # ISO date
+    ends_on = Column(String, nullable=False)
+    precision = Column(String, nullable=False) # day, month, quarter, season, half or year
+
 class Consultation(Base):
     __tablename__ = "consultations"
 
@@ -93,6 +143,7 @@ class Post(Base):
 
 class PostComment(Base):
     __tablename__ = "post_comments"
+    __table_args__ = (Index("ix_post_comments_post_created", "post_id", "created_at"),)
     
     id = Column(Integer, primary_key=True, index=True)
     post_id = Column(Integer, ForeignKey("posts.id", ondelete="CASCADE"), nullable=False)
@@ -108,7 +159,7 @@ class PostCommentLike(Base):
     
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
-    comment_id = Column(Integer, ForeignKey("post_comments.id", ondelete="CASCADE"), nullable=False)
+    comment_id = Column(Integer, ForeignKey("post_comments.id", ondelete="CASCADE"), index=True, nullable=False)
     
     __table_args__ = (UniqueConstraint("user_id", "comment_id", name="unique_user_post_comment_like"),)
 
@@ -128,12 +179,20 @@ class PostVote(Base):
 
 class NewsArticle(Base):
     __tablename__ = "news_articles"
+    __table_args__ = (
+        # one row per article and project; upserts conflict on it
+        Index("uq_news_project_url_hash", "project_id", "url_hash", unique=True),
+        # list_project_news: newest first, keyset paginated
+        Index("ix_news_project_date", "project_id", "date", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     project_id = Column(Integer, ForeignKey("projects.id", ondelete="CASCADE"), index=True, nullable=False)
 
     title = Column(String, nullable=False)
     url = Column(String, nullable=False)
+    # sha1 of the normalized url, see news.url_hash()
+    url_hash = Column(String(40), nullable=True)
     source = Column(String, nullable=True)         # e.g. "DN", "SVT"
     date = Column(String, nullable=True)           # ISO date (YYYY-MM-DD) or ISO datetime
     summary = Column(Text, nullable=True)
@@ -145,6 +204,33 @@ class NewsArticle(Base):
         backref=backref("news", cascade="all, delete-orphan")
     )
 
+    @validates("url")
+    def _sync_url_hash(self, key, value):
+        self.url_hash = url_hash(value)
+        return value
+
+
+TRACKING_PARAMS = ("utm_", "fbclid", "gclid", "mc_cid", "mc_eid")
+
+
+def normalize_url(url: str) -> str:
+    """Canonical form for deduplication: lowercase scheme/host, no default port,
+    fragment, tracking parameters or trailing slash, remaining query sorted."""
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").lower()
+    if parts.port and (scheme, parts.port) not in (("http", 80), ("https", 443)):
+        host += f":{parts.port}"
+    query = sorted(
+        (k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+        if not k.lower().startswith(TRACKING_PARAMS)
+    )
+    return urlunsplit((scheme, host, parts.path.rstrip("/") or "/", urlencode(query), ""))
+
+
+def url_hash(url: str) -> str:
+    return hashlib.sha1(normalize_url(url).encode()).hexdigest()
+
 class UserFollow(Base):
     __tablename__ = "user_follows"
     
@@ -156,4 +242,35 @@ class UserFollow(Base):
     __table_args__ = (UniqueConstraint("follower_id", "followed_id", name="uq_user_follow"),)
     
     follower = relationship("User", foreign_keys=[follower_id])
-    followed = relationship("User", foreign_keys=[followed_id])
\ No newline at end of file
+    followed = relationship("User", foreign_keys=[followed_id])
+
+class ContentVersion(Base):
+    """Generation counter per table, bumped in the same transaction as any write to it (see http_cache.py)"""
+    __tablename__ = "content_versions"
+
+    name = Column(String, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+
+
+class JobRun(Base):
+    """Queue of background job runs; also the single-flight lock (see app/jobs.py)"""
+    __tablename__ = "job_runs"
+    __table_args__ = (
+        # at most one queued-or-running run per job, whichever process enqueues or claims it
+        Index("uq_job_runs_pending", "job", unique=True,
+              sqlite_where=text("status IN ('queued', 'running')"),
+              postgresql_where=text("status IN ('queued', 'running')")),
+        Index("ix_job_runs_job_run_at", "job", "run_at"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    job = Column(String, nullable=False)
+    status = Column(String, nullable=False)  # queued | running | done | failed
+    run_at = Column(String, nullable=False)  # due time, ISO
+    attempts = Column(Integer, nullable=False, default=0)
+    locked_by = Column(String, nullable=True)  # host:pid of the runner
+    locked_until = Column(String, nullable=True)  # lease; a running row past it is presumed dead
+    started_at = Column(String, nullable=True)
+    finished_at = Column(String, nullable=True)
+    duration_seconds = Column(Float, nullable=True)
+    result = Column(Text, nullable=True)  # summary or error of the last attempt
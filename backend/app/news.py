@@ -0,0 +1,97 @@
+# app/news.py
+"""Project news: deduplicating bulk upsert and the paginated list.
+
+Articles are keyed on (project_id, url_hash), where url_hash is the sha1 of the
+normalized URL (models.normalize_url), so the crawler can push the same
+article again, with tracking parameters or a trailing slash, and only refresh
+the existing row. The list reads ix_news_project_date newest first and pages
+with a (date, id) cursor.
+"""
+from typing import Iterable, Optional
+
+from sqlalchemy import and_, or_, tuple_
+from sqlalchemy.orm import Session
+
+from .models import NewsArticle, url_hash
+from .toggles import dialect_insert
+
+CHUNK = 300
+UPDATED_COLUMNS = ("title", "url", "source", "date", "summary")
+
+
+def upsert_news(db: Session, items: Iterable[dict]) -> dict[str, int]:
+    """Insert or refresh articles ({project_id, title, url, source?, date?, summary?}) and commit.
+
+    Within one call the last item for a URL wins. Returns counts of inserted,
+    updated and in-batch duplicate items.
+    """
+    rows: dict[tuple[int, str], dict] = {}
+    received = 0
+    for item in items:
+        received += 1
+        row = {
+            "project_id": item["project_id"],
+            "title": item["title"].strip(),
+            "url": item["url"],
+            "url_hash": url_hash(item["url"]),
+            "source": item.get("source") or None,
+            "date": item.get("date") or None,
+            "summary": item.get("summary") or None,
+        }
+        rows[(row["project_id"], row["url_hash"])] = row
+
+    stmt = dialect_insert(db, NewsArticle)
+    # executemany of one cached statement; a multi-VALUES insert recompiles per batch
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["project_id", "url_hash"],
+        set_={c: getattr(stmt.excluded, c) for c in UPDATED_COLUMNS},
+    )
+    keys = list(rows)
+    existing = 0
+    for i in range(0, len(keys), CHUNK):
+        chunk = keys[i:i + CHUNK]
+        existing += (
+            db.query(NewsArticle.id)
+            .filter(tuple_(NewsArticle.project_id, NewsArticle.url_hash).in_(chunk))
+            .count()
+        )
+        db.execute(stmt, [rows[k] for k in chunk])
+    db.commit()
+    return {"inserted": len(rows) - existing, "updated": existing, "duplicates": received - len(rows)}
+
+
+def encode_cursor(date: Optional[str], news_id: int) -> str:
+    return f"{date or ''}|{news_id}"
+
+
+def decode_cursor(cursor: str) -> tuple[Optional[str], int]:
+    """Raises ValueError for malformed cursors"""
+    date, sep, news_id = cursor.rpartition("|")
+    if not sep:
+        raise ValueError("malformed cursor")
+    return date or None, int(news_id)
+
+
+def load_news_page(db: Session, project_id: int, limit: Optional[int] = None, before: Optional[str] = None) -> tuple[list[NewsArticle], Optional[str]]:
+    """Newest first, undated articles last; returns (articles, next_cursor)"""
+    N = NewsArticle
+    query = db.query(N).filter(N.project_id == project_id)
+    if before:
+        date, news_id = decode_cursor(before)
+        if date is None:
+            query = query.filter(N.date.is_(None), N.id < news_id)
+        else:
+            query = query.filter(or_(N.date < date, and_(N.date == date, N.id < news_id), N.date.is_(None)))
+    # SQLite sorts NULL lowest, so date DESC already puts undated articles last
+    # and the order matches the index; other databases need it spelled out
+    date_order = N.date.desc() if db.get_bind().dialect.name == "sqlite" else N.date.desc().nullslast()
+    query = query.order_by(date_order, N.id.desc())
+    if limit:
+        query = query.limit(limit + 1)
+
+    items = query.all()
+    next_cursor = None
+    if limit and len(items) > limit:
+        items = items[:limit]
+        next_cursor = encode_cursor(items[-1].date, items[-1].id)
+    return items, next_cursor
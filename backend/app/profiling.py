@@ -0,0 +1,147 @@
+# app/profiling.py
+"""Slow-query log and an opt-in sampling profiler.
+
+install_slow_query_log() logs every statement slower than a threshold with a
+fingerprint of its parameters (not the values) and the route that ran it.
+
+ProfilingMiddleware samples the stack of the thread running the endpoint of
+selected routes, 1 in `every` requests, and appends collapsed stacks
+("frame;frame;frame count") to <out_dir>/<route>.folded, which flamegraph.pl
+and speedscope read directly. It is only added when PROFILE_ROUTES is set, so
+it costs nothing otherwise.
+"""
+import hashlib
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from itertools import count
+
+from sqlalchemy import event
+from starlette.routing import compile_path
+
+from . import metrics
+
+log = logging.getLogger("stadsurr")
+
+SLOW_QUERIES = metrics.register(metrics.Counter(
+    "stadssurr_slow_queries_total", "Statements over the slow-query threshold", ("route",)
+))
+
+
+# ---- slow-query log ----
+
+def params_fingerprint(parameters) -> str:
+    """Short hash of the bound values, so repeats can be correlated without logging them"""
+    return hashlib.sha1(repr(parameters).encode()).hexdigest()[:10]
+
+
+def install_slow_query_log(engine, threshold_ms: float, max_statement: int = 500):
+    if threshold_ms <= 0:
+        return
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _start(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("slow_query_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _finish(conn, cursor, statement, parameters, context, executemany):
+        elapsed_ms = (time.perf_counter() - conn.info["slow_query_started"].pop()) * 1000
+        if elapsed_ms < threshold_ms:
+            return
+        request = metrics.current_request.get()
+        route = request.route if request else "-"
+        SLOW_QUERIES.inc((route,))
+        log.warning(
+            "🐢 SLOW SQL %.1f ms route=%s params=%s%s: %s",
+            elapsed_ms, route, params_fingerprint(parameters),
+            f" x{len(parameters)}" if executemany else "",
+            " ".join(statement.split())[:max_statement],
+        )
+
+    @event.listens_for(engine, "handle_error")
+    def _failed(exception_context):
+        conn = exception_context.connection
+        if conn is not None and conn.info.get("slow_query_started"):
+            conn.info["slow_query_started"].pop()
+
+
+# ---- sampling profiler ----
+
+def _frame_label(code) -> str:
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})".replace(";", ":")
+
+
+class _Sampler(threading.Thread):
+    """Samples threads whose stack contains the request's endpoint, until stopped"""
+
+    def __init__(self, scope: dict, interval: float):
+        super().__init__(daemon=True, name="stadssurr-profiler")
+        self.scope = scope
+        self.interval = interval
+        self.stacks = Counter()
+        self.done = threading.Event()
+
+    def run(self):
+        own = threading.get_ident()
+        while not self.done.wait(self.interval):
+            endpoint = self.scope.get("endpoint")
+            target = getattr(endpoint, "__code__", None)
+            if target is None:
+                continue  # not routed yet
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(frame.f_code)
+                    if frame.f_code is target:
+                        # drop the threadpool/event loop frames above the endpoint
+                        self.stacks[";".join(_frame_label(c) for c in reversed(stack))] += 1
+                        break
+                    frame = frame.f_back
+
+
+class ProfilingMiddleware:
+    def __init__(self, app, routes: list[str], every: int = 1, interval_ms: float = 5.0, out_dir: str = "./profiles"):
+        self.app = app
+        self.routes = [(template, compile_path(template)[0]) for template in routes]
+        self.every = max(1, every)
+        self.interval = interval_ms / 1000
+        self.out_dir = out_dir
+        self._seen = {template: count() for template in routes}
+        self._write_lock = threading.Lock()
+
+    def _selected(self, path: str):
+        for template, regex in self.routes:
+            if regex.match(path):
+                return template if next(self._seen[template]) % self.every == 0 else None
+        return None
+
+    def _write(self, template: str, stacks: Counter):
+        if not stacks:
+            return
+        os.makedirs(self.out_dir, exist_ok=True)
+        name = re.sub(r"[^A-Za-z0-9]+", "_", template).strip("_") or "root"
+        with self._write_lock, open(os.path.join(self.out_dir, f"{name}.folded"), "a", encoding="utf-8") as f:
+            for stack, samples in stacks.items():
+                f.write(f"{stack} {samples}\n")
+
+    async def __call__(self, scope, receive, send):
+        template = self._selected(scope["path"]) if scope["type"] == "http" else None
+        if template is None:
+            await self.app(scope, receive, send)
+            return
+
+        sampler = _Sampler(scope, self.interval)
+        sampler.start()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            sampler.done.set()
+            sampler.join()
+            self._write(template, sampler.stacks)
+            log.info(f"🔥 PROFILE {scope['path']}: {sum(sampler.stacks.values())} samples -> {self.out_dir}")
@@ -0,0 +1,198 @@
+# app/rate_limit.py
+"""Per-user / per-IP rate limiting for the write routes.
+
+RATE_LIMITS maps "METHOD /route/template" to "N/second|minute|hour". A
+request to a limited route is keyed by the user id from a verified JWT,
+else by client IP, and answered 429 with Retry-After once the key runs out.
+The user_id cookie is never used: it is not signed, so a client could pick a
+fresh value per request. Routes under /api/auth/ (login, register) are always
+keyed by client IP, as their limits are against guessing and sign-up floods. Routes without a rule pass through after one dict lookup.
+
+Two stores:
+
+    TokenBuckets    this process only. A bucket holds up to N tokens and
+                    refills at N per period, so bursts up to N are fine.
+                    O(1) per check; idle buckets (refilled to full, which is
+                    the same as absent) are swept once a minute.
+    SharedWindows   RATE_LIMIT_SHARED=1: fixed-window counters in
+                    SHARED_STATE_URL, so several workers share one limit. One
+                    INCR per check, run off the event loop; keys expire with
+                    their window.
+
+Behind a reverse proxy, set FORWARDED_ALLOW_IPS to the proxy's address so
+uvicorn takes the client address from X-Forwarded-For; otherwise every
+anonymous client shares the proxy's bucket.
+"""
+import logging
+import math
+import time
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+from anyio import to_thread
+
+from . import metrics
+from .serialization import dumps
+from .shared_state import MemoryState, SharedState
+
+log = logging.getLogger("stadsurr")
+
+PERIODS = {"second": 1, "minute": 60, "hour": 3600, "day": 86400}
+SWEEP_INTERVAL = 60.0
+TOKEN_CACHE_SIZE = 10_000
+IP_KEYED_PREFIX = "/api/auth/"
+THROTTLED = metrics.register(metrics.Counter("stadssurr_rate_limited_total", "Requests answered 429", ("rule",)))
+
+
+@dataclass(frozen=True)
+class Rule:
+    name: str  # "POST /api/votes"
+    limit: int
+    period: float
+
+    @property
+    def rate(self) -> float:
+        return self.limit / self.period
+
+    @classmethod
+    def parse(cls, name: str, spec: str) -> "Rule":
+        count, _, unit = spec.partition("/")
+        if unit not in PERIODS:
+            raise ValueError(f"rate limit {name!r}: expected N/{'|'.join(PERIODS)}, got {spec!r}")
+        return cls(name, int(count), float(PERIODS[unit]))
+
+
+class TokenBuckets:
+    def __init__(self):
+        self._buckets: dict[tuple[str, str], list] = {}  # (rule, key) -> [tokens, updated, rule]
+        self._next_sweep = time.monotonic() + SWEEP_INTERVAL
+
+    def acquire(self, rule: Rule, key: str) -> Optional[float]:
+        """None if allowed, else seconds until a token is available"""
+        now = time.monotonic()
+        if now >= self._next_sweep:
+            self.sweep(now)
+        bucket = self._buckets.get((rule.name, key))
+        if bucket is None:
+            self._buckets[(rule.name, key)] = [rule.limit - 1, now, rule]
+            return None
+        tokens = min(rule.limit, bucket[0] + (now - bucket[1]) * rule.rate)
+        bucket[1] = now
+        if tokens >= 1:
+            bucket[0] = tokens - 1
+            return None
+        bucket[0] = tokens
+        return (1 - tokens) / rule.rate
+
+    def sweep(self, now: Optional[float] = None) -> int:
+        """Drop buckets that have refilled; returns how many"""
+        now = now or time.monotonic()
+        self._next_sweep = now + SWEEP_INTERVAL
+        full = [k for k, (tokens, updated, rule) in self._buckets.items() if tokens + (now - updated) * rule.rate >= rule.limit]
+        for k in full:
+            del self._buckets[k]
+        return len(full)
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+
+class SharedWindows:
+    def __init__(self, state: SharedState):
+        self.state = state
+        self.blocking = not isinstance(state, MemoryState)  # network round trip: keep it off the event loop
+
+    def acquire(self, rule: Rule, key: str) -> Optional[float]:
+        now = time.time()
+        window = int(now // rule.period)
+        count = self.state.incr(f"rl:{rule.name}:{key}:{window}", ttl=rule.period + 1)
+        if count <= rule.limit:
+            return None
+        return (window + 1) * rule.period - now
+
+    def __len__(self) -> int:
+        return 0
+
+
+class RateLimitMiddleware:
+    """Add inside MetricsMiddleware so throttled requests are counted (under their route)."""
+
+    def __init__(self, app, rules: dict[str, str], verify_token: Callable[[str], Optional[int]], store=None):
+        self.app = app
+        self.rules = [Rule.parse(name, spec) for name, spec in rules.items()]
+        self.verify_token = verify_token
+        self.store = store if store is not None else TokenBuckets()
+        self.blocking_store = getattr(self.store, "blocking", False)
+        self._routes: Optional[dict[str, list]] = None  # method -> [(route, rule, keyed by IP)]
+        self._tokens: dict[str, Optional[int]] = {}  # bearer token -> user id, so each JWT is verified once
+
+    def _bind_routes(self, app) -> dict[str, list]:
+        """Resolve rule templates to the app's routes once, at the first request"""
+        by_method: dict[str, list] = {}
+        for rule in self.rules:
+            method, _, path = rule.name.partition(" ")
+            route = next((r for r in app.router.routes if getattr(r, "path", None) == path and method in (getattr(r, "methods", None) or ())), None)
+            if route is None:
+                log.warning(f"⚠️ Rate limit for unknown route {rule.name}, ignored")
+                continue
+            by_method.setdefault(method, []).append((route, rule, path.startswith(IP_KEYED_PREFIX)))
+        return by_method
+
+    def _identity(self, scope, by_ip: bool) -> str:
+        # a verified bearer token only; the unsigned user_id cookie would let clients pick their bucket
+        auth = b""
+        if not by_ip:
+            for name, value in scope["headers"]:
+                if name == b"authorization":
+                    auth = value
+                    break
+        if auth.startswith(b"Bearer "):
+            token = auth[7:].decode("latin-1")
+            if token not in self._tokens:
+                if len(self._tokens) >= TOKEN_CACHE_SIZE:
+                    self._tokens.clear()
+                self._tokens[token] = self.verify_token(token)
+            user_id = self._tokens[token]
+            if user_id:
+                return f"user:{user_id}"
+        client = scope.get("client")
+        return f"ip:{client[0] if client else 'unknown'}"
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        if self._routes is None:
+            self._routes = self._bind_routes(scope["app"])
+        candidates = self._routes.get(scope["method"])
+        if candidates:
+            for route, rule, by_ip in candidates:
+                # method already matched; the compiled path regex is all route.matches() adds
+                if route.path_regex.match(scope["path"]):
+                    key = self._identity(scope, by_ip)
+                    if self.blocking_store:
+                        retry_after = await to_thread.run_sync(self.store.acquire, rule, key)
+                    else:
+                        retry_after = self.store.acquire(rule, key)
+                    if retry_after is not None:
+                        THROTTLED.inc((rule.name,))
+                        scope["route"] = route  # metrics label
+                        await self._reject(send, retry_after)
+                        return
+                    break
+        await self.app(scope, receive, send)
+
+    @staticmethod
+    async def _reject(send, retry_after: float):
+        seconds = max(1, math.ceil(retry_after))
+        body = dumps({"detail": f"För många förfrågningar, försök igen om {seconds} s"})
+        await send({
+            "type": "http.response.start",
+            "status": 429,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(seconds).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,152 @@
+# app/records.py
+"""Typed rows for the list routes, serialized directly by FastJSONResponse.
+
+Field order is the JSON key order, so keep it in sync with what the frontend reads.
+"""
+from dataclasses import dataclass
+from typing import Any, Optional
+
+record = dataclass(slots=True, kw_only=True)
+
+
+@record
+class ProjectListItem:
+    id: int
+    title: str
+    description: Optional[str]
+    location: Optional[str]
+    phase: Optional[str]
+    comments_count: int
+    upvotes: int
+    downvotes: int
+    user_vote: Optional[str]
+    latitude: Optional[float]
+    longitude: Optional[float]
+    images: Optional[str]
+    image_width: Optional[int]
+    image_height: Optional[int]
+    image_placeholder: Optional[str]
+
+
+@record
+class PostListItem:
+    id: int
+    title: str
+    content: str
+    image_url: Optional[str]
+    created_at: str
+    author_id: int
+    author_name: str
+    comments_count: int
+    upvotes: int
+    downvotes: int
+    user_vote: Optional[str]
+    latitude: Optional[float]
+    longitude: Optional[float]
+
+
+@record
+class UserPostItem:
+    id: int
+    title: str
+    content: str
+    image_url: Optional[str]
+    created_at: str
+    comments_count: int
+    upvotes: int
+    downvotes: int
+
+
+@record
+class FeedPost:
+    type: str = "post"
+    id: int
+    title: str
+    content: str
+    comments_count: int
+    upvotes: int
+    downvotes: int
+    created_at: str
+    user_id: int
+    user_name: str
+
+
+@record
+class FeedProject:
+    type: str = "project"
+    id: int
+    title: str
+    description: str
+    location: Optional[str]
+    phase: Optional[str]
+    comments_count: int
+    upvotes: int
+    downvotes: int
+
+
+@record
+class Point:
+    type: str = "Point"
+    coordinates: tuple[float, float]
+
+
+@record
+class Feature:
+    type: str = "Feature"
+    geometry: Point
+    properties: Any
+
+
+@record
+class ProjectFeatureProperties:
+    id: int
+    title: str
+    phase: Optional[str]
+    location: Optional[str]
+    widget_text: Optional[str]
+    thumbnail: Optional[str]
+    image_width: Optional[int]
+    image_height: Optional[int]
+    image_placeholder: Optional[str]
+
+
+@record
+class PostFeatureProperties:
+    id: int
+    title: str
+    author_name: str
+    created_at: str
+    thumbnail: Optional[str]
+
+
+@record
+class MilestoneItem:
+    section: Optional[str]
+    label: str
+    date_text: str
+    starts_on: str
+    ends_on: str
+    precision: str
+
+
+@record
+class UpcomingMilestone:
+    project_id: int
+    project_title: str
+    section: Optional[str]
+    label: str
+    date_text: str
+    starts_on: str
+    ends_on: str
+    precision: str
+
+
+def feature_collection(features: list[Feature]) -> dict:
+    return {"type": "FeatureCollection", "features": features}
+
+
+def lat_lng(coordinates: Optional[dict]) -> tuple[Optional[float], Optional[float]]:
+    """(latitude, longitude) from a stored coordinates dict, which may be None"""
+    if not coordinates:
+        return None, None
+    return coordinates.get("latitude"), coordinates.get("longitude")
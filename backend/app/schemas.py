@@ -1,6 +1,6 @@
 # app/schemas.py
-from pydantic import BaseModel, EmailStr, StringConstraints, HttpUrl, AnyHttpUrl
-from typing import Optional, List, Annotated
+from pydantic import BaseModel, EmailStr, StringConstraints, HttpUrl, AnyHttpUrl, Field
+from typing import Any, Optional, List, Annotated
 
 class RegisterBody(BaseModel):
     name: str
@@ -72,6 +72,10 @@ class ConsultationCreate(BaseModel):
     phase: Annotated[str, StringConstraints(min_length=1, max_length=100)]
     content: Annotated[str, StringConstraints(min_length=3, max_length=5000)]
 
+class ConsultationBatch(BaseModel):
+    # raw items, validated one by one so a bad item doesn't reject the batch
+    items: Annotated[List[Any], Field(min_length=1, max_length=1000)]
+
 class ConsultationPublic(BaseModel):
     id: int
     project_id: int
@@ -114,6 +118,9 @@ class NewsArticleCreate(BaseModel):
     date: Optional[str] = None
     summary: Optional[str] = None
 
+class NewsArticleBatch(BaseModel):
+    items: Annotated[List[NewsArticleCreate], Field(min_length=1, max_length=1000)]
+
 class FollowerPublic(BaseModel):
     id: int
     name: str
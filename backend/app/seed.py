@@ -0,0 +1,409 @@
+# app/seed.py
+"""Initial data import, kept out of the startup path.
+
+The app brings the schema up to date synchronously on startup
+(prepare_database(): new tables and columns, their backfill, and the derived
+tables) and, on an empty database, runs seed_database() in a background
+thread (SEED_ON_STARTUP) so it accepts traffic right away. /api/health/ready
+reports 503 until seeding has finished, and keeps doing so, with the error,
+if it failed. With SEED_ON_STARTUP=off an empty database counts as ready and
+the import is left to the operator. It can be run ahead of time with
+
+    python -m app.seed
+"""
+import json
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass, asdict
+from typing import Optional
+
+from sqlalchemy import func, insert, update
+from sqlalchemy.orm import Session
+
+from .auth import hash_fixture_password
+from . import activity, tidplan
+from .database import Base, add_missing_columns
+from .entity_cache import entity_cache
+from .jsonstream import iter_records
+from .models import normalize_name, url_hash, User, Project, Comment, CommentLike, Post, NewsArticle, UserFollow
+from .news import upsert_news
+
+log = logging.getLogger("stadsurr")
+
+SCRAPED_DIR = os.path.join(os.path.dirname(__file__), "..", "data_scraped")
+PROJECT_BATCH_SIZE = 500
+
+
+def project_row(proj: dict) -> dict:
+    return {
+        "title": proj["name"],
+        "widget_text": proj.get("widget_text"),
+        "preamble": proj.get("preamble"),
+        "location": proj.get("location"),
+        "phase": proj.get("current_stage"),
+        "tidplan_html": tidplan.process(proj.get("tidplan_html"), base_url=proj.get("url")).html,
+        "coordinates": proj.get("coordinates"),
+        "image_url": proj.get("image_url"),
+        "image_hash": proj.get("image_hash"),
+        "image_width": proj.get("image_width"),
+        "image_height": proj.get("image_height"),
+        "image_placeholder": proj.get("image_placeholder"),
+        "url": proj.get("url"),
+        "upvotes": proj.get("upvotes", 0),
+        "downvotes": proj.get("downvotes", 0),
+    }
+
+
+def scraped_projects_path() -> Optional[str]:
+    """projects.ndjson or projects.json, whichever the scraper wrote last"""
+    paths = [os.path.join(SCRAPED_DIR, name) for name in ("projects.ndjson", "projects.json")]
+    paths = [path for path in paths if os.path.exists(path)]
+    return max(paths, key=os.path.getmtime) if paths else None
+
+
+def load_projects_from_json(db: Session, path: Optional[str] = None, batch_size: int = PROJECT_BATCH_SIZE):
+    """Stream the scraped projects into the database in fixed-size Core inserts.
+
+    Only one batch of rows is held at a time; everything is committed together
+    so a failed import leaves no partial data behind.
+    """
+    path = path or scraped_projects_path()
+    if not path:
+        log.warning(f"⚠️  projects.json not found in {SCRAPED_DIR}")
+        return
+
+    inserted = 0
+    batch = []
+    for proj in iter_records(path):
+        batch.append(project_row(proj))
+        if len(batch) >= batch_size:
+            db.execute(insert(Project), batch)
+            inserted += len(batch)
+            batch = []
+    if batch:
+        db.execute(insert(Project), batch)
+        inserted += len(batch)
+    milestones = tidplan.store_milestones(db)
+    db.commit()
+    entity_cache.clear("project")
+    log.info(f"✅ Loaded {inserted} projects ({milestones} tidplan milestones) into the database from {os.path.basename(path)}.")
+
+
+REFRESHED_COLUMNS = (
+    "title", "widget_text", "preamble", "location", "phase", "tidplan_html", "coordinates", "url",
+    "image_url", "image_hash", "image_width", "image_height", "image_placeholder",
+)
+
+
+def refresh_projects_from_json(db: Session, path: Optional[str] = None) -> dict[str, int]:
+    """Merge a new scrape into the projects table and commit.
+
+    Projects are matched on url (title when the scrape has no url). Changed
+    ones are updated in place, so ids, votes and comments are kept; new ones
+    are inserted; projects missing from the scrape are left alone. Milestones
+    are re-extracted for projects whose tidplan changed.
+    """
+    path = path or scraped_projects_path()
+    if not path:
+        raise FileNotFoundError(f"no projects.json or projects.ndjson in {SCRAPED_DIR}")
+
+    existing = {}
+    for row in db.query(Project.id, *(getattr(Project, c) for c in REFRESHED_COLUMNS)):
+        current = dict(zip(REFRESHED_COLUMNS, row[1:]))
+        existing[current["url"] or current["title"]] = (row.id, current)
+
+    updates, inserts = [], []
+    retimed = []  # projects whose tidplan changed
+    matched = 0
+    for proj in iter_records(path):
+        row = project_row(proj)
+        match = existing.get(row["url"] or row["title"])
+        if match is None:
+            inserts.append(row)
+            continue
+        project_id, current = match
+        matched += 1
+        scraped = {c: row[c] for c in REFRESHED_COLUMNS}
+        if scraped != current:
+            updates.append({"id": project_id, **scraped})
+            if scraped["tidplan_html"] != current["tidplan_html"]:
+                retimed.append(project_id)
+
+    for i in range(0, len(updates), PROJECT_BATCH_SIZE):
+        db.execute(update(Project), updates[i:i + PROJECT_BATCH_SIZE])  # bulk UPDATE by primary key
+    last_id = db.query(func.max(Project.id)).scalar() or 0
+    for i in range(0, len(inserts), PROJECT_BATCH_SIZE):
+        db.execute(insert(Project), inserts[i:i + PROJECT_BATCH_SIZE])
+    if inserts:
+        retimed += [row.id for row in db.query(Project.id).filter(Project.id > last_id)]
+    if retimed:
+        tidplan.store_milestones(db, retimed)
+    db.commit()
+    if updates or inserts:
+        entity_cache.clear("project")
+    return {"inserted": len(inserts), "updated": len(updates), "unchanged": matched - len(updates)}
+
+
+def load_users_from_json(db: Session):
+    json_path = os.path.join(os.path.dirname(__file__), "..", "mock_data", "users.json")
+    if not os.path.exists(json_path):
+        log.warning(f"⚠️  users.json not found at {json_path}")
+        return
+
+    with open(json_path, "r", encoding="utf-8") as f:
+        users = json.load(f)
+
+    inserted = 0
+    for u in users:
+        existing = db.query(User).filter(User.email == u["email"]).first()
+        if not existing:
+            user = User(
+                name=u["name"],
+                email=u["email"],
+                password_hash=hash_fixture_password(u["email"]),  # mock: password is the email
+            )
+            db.add(user)
+            inserted += 1
+
+    if inserted:
+        db.commit()
+        log.info(f"✅ Loaded {inserted} users from JSON")
+
+
+def load_comments_from_json(db: Session):
+    json_path = os.path.join(os.path.dirname(__file__), "..", "mock_data", "comments.json")
+    if not os.path.exists(json_path):
+        log.warning(f"⚠️  comments.json not found at {json_path}")
+        return
+
+    with open(json_path, "r", encoding="utf-8") as f:
+        comments = json.load(f)
+
+    for c in comments:
+        project = db.query(Project).filter(Project.title == c["project_title"]).first()
+        user = db.query(User).filter(User.email == c["user_email"]).first()
+        if not project or not user:
+            continue
+
+        exists = db.query(Comment).filter(
+            Comment.project_id == project.id,
+            Comment.user_id == user.id,
+            Comment.content == c["content"]
+        ).first()
+
+        if exists:
+            continue
+
+        comment = Comment(
+            project_id=project.id,
+            user_id=user.id,
+            content=c["content"],
+            created_at=c["created_at"],
+        )
+        db.add(comment)
+        db.flush()
+        activity.record_comment(db, user.id, project.id, comment.created_at)
+
+        if c.get("likes", 0) > 0:
+            users = db.query(User).all()
+            for i, u in enumerate(users[:c["likes"]]):
+                db.add(CommentLike(user_id=u.id, comment_id=comment.id))
+
+    
+    db.commit()
+    log.info(f"✅ Loaded {len(comments)} comments from JSON")
+
+
+def load_posts_from_json(db: Session):
+    json_path = os.path.join(os.path.dirname(__file__), "..", "mock_data", "posts.json")
+    if not os.path.exists(json_path):
+        log.warning(f"⚠️  posts.json not found at {json_path}")
+        return
+
+    with open(json_path, "r", encoding="utf-8") as f:
+        posts = json.load(f)
+
+    inserted = 0
+    for p in posts:
+        user = db.query(User).filter(User.email == p["user_email"]).first()
+        if not user:
+            log.warning(f"⚠️  User with email {p['user_email']} not found, skipping post")
+            continue
+
+        # Check if post already exists (by title and user)
+        existing = db.query(Post).filter(
+            Post.title == p["title"],
+            Post.user_id == user.id
+        ).first()
+        
+        if existing:
+            continue
+
+        post = Post(
+            title=p["title"],
+            content=p["content"],
+            user_id=user.id,
+            created_at=p["created_at"],
+            coordinates=p.get("coordinates"),
+            image_url=p.get("image_url"),
+            upvotes=0,
+            downvotes=0
+        )
+        db.add(post)
+        inserted += 1
+
+    if inserted:
+        db.commit()
+        log.info(f"✅ Loaded {inserted} posts from JSON")
+
+
+def load_news_from_json(db: Session):
+    path = os.path.join(os.path.dirname(__file__), "..", "mock_data", "news.json")
+    if not os.path.exists(path):
+        log.warning(f"news.json not found at {path}")
+        return
+
+    with open(path, "r", encoding="utf-8") as f:
+        items = json.load(f)
+
+    # upsert on the normalized URL, so running the import again adds nothing
+    counts = upsert_news(db, items)
+    log.info(f"✅ Loaded {len(items)} news items from JSON ({counts['inserted']} new, {counts['updated']} updated)")
+
+
+LOADERS = [
+    ("projects", load_projects_from_json),
+    ("users", load_users_from_json),
+    ("comments", load_comments_from_json),
+    ("posts", load_posts_from_json),
+    ("news", load_news_from_json),
+]
+
+
+@dataclass
+class SeedStatus:
+    state: str = "idle"  # idle | running | done | failed | skipped
+    step: Optional[str] = None
+    steps_done: int = 0
+    steps_total: int = len(LOADERS)
+    error: Optional[str] = None
+    seconds: Optional[float] = None
+
+    @property
+    def ready(self) -> bool:
+        """Import done or not needed; a failed import stays not ready until restarted"""
+        return self.state in ("done", "skipped")
+
+    def as_dict(self) -> dict:
+        return asdict(self)
+
+
+seed_status = SeedStatus()
+
+
+def backfill_added_columns(db: Session, added: list[tuple[str, str]]):
+    """Populate derived columns that add_missing_columns() just created.
+
+    name_search and url_hash are also filled where they are still NULL, which
+    repairs a database whose columns were added without a backfill.
+    """
+    users = db.query(User)
+    if ("users", "name_search") not in added:
+        users = users.filter(User.name_search.is_(None), User.name.isnot(None))
+    for user in users.all():
+        user.name_search = normalize_name(user.name)
+    if ("users", "followers_count") in added:
+        counts = dict(
+            db.query(UserFollow.followed_id, func.count(UserFollow.id))
+            .group_by(UserFollow.followed_id)
+            .all()
+        )
+        for user in db.query(User).all():
+            user.followers_count = counts.get(user.id, 0)
+    missing_hash = db.query(NewsArticle.id).filter(NewsArticle.url_hash.is_(None)).first() is not None
+    if ("news_articles", "url_hash") in added or missing_hash:
+        # duplicates would violate uq_news_project_url_hash: keep the oldest copy
+        seen = set()
+        for article in db.query(NewsArticle).order_by(NewsArticle.id).all():
+            key = (article.project_id, article.url_hash or url_hash(article.url))
+            if key in seen:
+                db.delete(article)
+            else:
+                seen.add(key)
+                article.url_hash = key[1]
+    db.commit()
+    if added:
+        log.info(f"✅ Added columns: {', '.join(f'{t}.{c}' for t, c in added)}")
+
+
+def prepare_database(engine, session_factory):
+    """Schema and derived data an existing app.db needs before serving:
+    missing tables and columns, their backfill, and the activity and
+    tidplan rebuilds. Run by the app on startup and by `python -m app.seed`"""
+    Base.metadata.create_all(bind=engine)
+    added_columns = add_missing_columns(engine)
+    with session_factory() as db:
+        backfill_added_columns(db, added_columns)
+        if activity.needs_rebuild(db):
+            log.info(f"✅ Built activity rollup ({activity.rebuild(db)} rows)")
+        if tidplan.needs_rebuild(db):
+            cleaned, milestones = tidplan.rebuild(db)
+            log.info(f"✅ Cleaned {cleaned} tidplans and extracted {milestones} milestones")
+
+
+def needs_seed(db: Session) -> bool:
+    return db.query(Project.id).first() is None
+
+
+def seed_database(session_factory, status: SeedStatus = seed_status) -> SeedStatus:
+    """Run every loader in its own session, recording progress in `status`"""
+    start = time.perf_counter()
+    status.state, status.steps_done, status.error = "running", 0, None
+    try:
+        for name, loader in LOADERS:
+            status.step = name
+            log.info(f"🌱 Seeding {name} ({status.steps_done + 1}/{status.steps_total})")
+            with session_factory() as db:
+                loader(db)
+            status.steps_done += 1
+        status.state, status.step = "done", None
+    except Exception as e:
+        status.state, status.error = "failed", str(e)
+        log.error(f"❌ Seeding failed at {status.step}: {e}")
+    status.seconds = round(time.perf_counter() - start, 3)
+    if status.state == "done":
+        log.info(f"✅ Seeding finished in {status.seconds:.1f}s")
+    return status
+
+
+def seed_in_background(session_factory) -> threading.Thread:
+    seed_status.state = "running"
+    thread = threading.Thread(target=seed_database, args=(session_factory,), daemon=True, name="stadssurr-seed")
+    thread.start()
+    return thread
+
+
+def main():
+    import argparse
+
+    from .database import SessionLocal, engine
+
+    parser = argparse.ArgumentParser(description="Create the schema and import the JSON data into an empty database.")
+    parser.add_argument("--force", action="store_true", help="import even if the database already has projects")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+
+    prepare_database(engine, SessionLocal)
+    with SessionLocal() as db:
+        if not args.force and not needs_seed(db):
+            print("Database already has projects, nothing to do (use --force to import anyway).")
+            return
+    status = seed_database(SessionLocal)
+    print(f"{status.state} in {status.seconds:.1f}s")
+    raise SystemExit(0 if status.state == "done" else 1)
+
+
+if __name__ == "__main__":
+    main()
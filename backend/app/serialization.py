@@ -0,0 +1,35 @@
+# app/serialization.py
+"""Fast JSON responses.
+
+FastJSONResponse is the app's default response class. Routes that return it
+directly (instead of a dict) skip jsonable_encoder entirely, and the records in
+records.py are dataclasses that orjson serializes natively. Without orjson it
+falls back to the stdlib json module.
+"""
+import dataclasses
+import json
+from typing import Any
+
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is in requirements.txt
+    orjson = None
+
+
+def _default(obj):
+    if dataclasses.is_dataclass(obj):
+        return dataclasses.asdict(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def dumps(content: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(content, default=_default, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
@@ -9,6 +9,55 @@ class Settings(BaseSettings):
         "https://stadssurr.onrender.com" # Replace with your production domain
     ]
     DB_URL: str = "sqlite:///./app.db"
+    SEED_ON_STARTUP: str = "background"   # empty DB on startup: background | blocking | off
+    SCHEMA_ON_STARTUP: bool = True        # prepare_database() in each process; gunicorn runs it once in the master instead
+    SHARED_STATE_URL: str = "memory://"   # memory:// (single process) or redis://host:6379/0 for multiple workers
+    SQLITE_WAL: bool = False              # WAL journal + busy timeout, for several processes on one SQLite file
+    SOCIAL_GRAPH_CACHE_SIZE: int = 0      # follower adjacency sets kept in memory, 0 = off
+    ENTITY_CACHE_SIZE: int = 0            # user/project snapshots kept in memory, 0 = request scope only
+    ENTITY_CACHE_TTL: float = 60.0        # seconds; bounds staleness across worker processes
+    METRICS_SERVER_TIMING: bool = False   # Server-Timing header with app/db time and query count
+    SLOW_QUERY_MS: float = 250            # log SQL statements slower than this, 0 = off
+    PROFILE_ROUTES: list[str] = []        # route templates to sample, e.g. ["/api/for_you"]
+    PROFILE_EVERY: int = 1                # profile 1 in N matching requests
+    PROFILE_INTERVAL_MS: float = 5
+    PROFILE_DIR: str = "./profiles"       # collapsed stacks, one .folded file per route
+    CONSULTATION_EXPORT_USER_IDS: list[int] = []  # users allowed to export consultations, e.g. [3, 17]
+    WRITE_BUFFER_ENABLED: bool = False    # write-behind buffering of votes and likes
+    WRITE_BUFFER_FLUSH_INTERVAL: float = 0.5
+    WRITE_BUFFER_MAX_BATCH: int = 500
+    WRITE_BUFFER_JOURNAL: str = "./write_buffer.journal"
+    LIVE_MAX_CONNECTIONS: int = 1000      # SSE + WebSocket clients per worker process
+    LIVE_QUEUE_SIZE: int = 256            # events buffered per client before it is disconnected
+    LIVE_HEARTBEAT_SECONDS: float = 15    # SSE keep-alive comment on idle streams
+    LIVE_MAX_TOPICS: int = 50             # topics per connection
+    RATE_LIMIT_ENABLED: bool = True
+    RATE_LIMITS: dict[str, str] = {       # "METHOD /route" -> N/second|minute|hour|day, per signed-in user, else IP; /api/auth/ per IP
+        "POST /api/auth/login": "10/minute",
+        "POST /api/auth/register": "5/hour",
+        "POST /api/votes": "60/minute",
+        "POST /api/comments": "10/minute",
+        "POST /api/posts": "5/minute",
+    }
+    RATE_LIMIT_SHARED: bool = False       # count in SHARED_STATE_URL so the limits hold across workers
+    PUBLIC_BASE_URL: str = ""             # e.g. https://api.stadssurr.se; empty = the request's own base URL
+    IMG_THUMBNAILS: bool = True           # geojson thumbnails point at /api/img instead of the full-size original
+    IMG_CACHE_DIR: str = "./image_cache"
+    IMG_CACHE_MAX_MB: float = 512         # least recently served files are deleted past this
+    IMG_ALLOWED_HOSTS: list[str] = [      # source hosts (and their subdomains) /api/img fetches from; [] = any public host
+        "vaxer.stockholm",                 # scraped project images
+        "images.unsplash.com",             # seeded post images
+    ]
+    IMG_ALLOW_PRIVATE: bool = False       # allow localhost/private addresses, for testing against a local server
+    IMG_MAX_SOURCE_MB: float = 15
+    IMG_FETCH_TIMEOUT: float = 10
+    IMG_MAX_AGE: int = 60*60*24*365       # Cache-Control max-age for resized images
+    JOBS_MODE: str = "inprocess"          # background jobs: inprocess | worker (python -m app.jobs worker) | off
+    JOBS_POLL_SECONDS: float = 5
+    SCRAPE_SCHEDULE: str = ""             # "every 6h", a cron expression like "0 4 * * *", or "" for by hand only
+    SCRAPE_TIMEOUT: float = 3600          # seconds before a scraper run is killed
+    SCRAPE_IMAGES: bool = True            # the scrape job also fills the image cache (scrape.py --images)
+    RECONCILE_SCHEDULE: str = "30 3 * * *"  # recompute activity rollup and follower counts
 
 settings = Settings()
 
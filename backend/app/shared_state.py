@@ -0,0 +1,324 @@
+# app/shared_state.py
+"""State shared between worker processes: a small key/value cache, counters
+for rate limits, and pub/sub for cache invalidation.
+
+SHARED_STATE_URL picks the backend:
+
+    memory://                    one process only (the default)
+    redis://host:6379/0          any server speaking the Redis protocol
+                                 (Redis, Valkey, KeyDB, ...), no client library needed
+
+Values are bytes. Keys are prefixed with `stadssurr:` so a shared server can
+host other applications.
+"""
+import logging
+import socket
+from abc import ABC, abstractmethod
+import threading
+import time
+from typing import Callable, Optional
+from urllib.parse import urlparse
+
+from .settings import settings
+
+log = logging.getLogger("stadsurr")
+
+PREFIX = "stadssurr:"
+
+
+class SharedState(ABC):
+    """Interface implemented by MemoryState and RedisState"""
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[bytes]: ...
+
+    @abstractmethod
+    def set(self, key: str, value: bytes, ttl: Optional[float] = None): ...
+
+    @abstractmethod
+    def delete(self, key: str): ...
+
+    @abstractmethod
+    def incr(self, key: str, amount: int = 1, ttl: Optional[float] = None) -> int:
+        """Add to an integer counter, atomically; ttl applies from the counter's creation"""
+
+    @abstractmethod
+    def publish(self, channel: str, message: str): ...
+
+    @abstractmethod
+    def subscribe(self, channel: str, callback: Callable[[str], None]): ...
+
+    def close(self):
+        pass
+
+
+# ---- in-process ----
+
+class MemoryState(SharedState):
+    def __init__(self):
+        self._data: dict[str, tuple[Optional[float], object]] = {}
+        self._subscribers: dict[str, list[Callable[[str], None]]] = {}
+        self._lock = threading.Lock()
+
+    def _live(self, key: str):
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        expires, value = entry
+        if expires is not None and expires < time.monotonic():
+            del self._data[key]
+            return None
+        return entry
+
+    def get(self, key):
+        with self._lock:
+            entry = self._live(key)
+            return entry[1] if entry else None
+
+    def set(self, key, value, ttl=None):
+        with self._lock:
+            self._data[key] = (time.monotonic() + ttl if ttl else None, value)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def incr(self, key, amount=1, ttl=None):
+        with self._lock:
+            entry = self._live(key)
+            if entry is None:
+                entry = (time.monotonic() + ttl if ttl else None, 0)
+            value = int(entry[1]) + amount
+            self._data[key] = (entry[0], value)
+            return value
+
+    def sweep(self) -> int:
+        """Drop expired keys; returns how many were removed"""
+        now = time.monotonic()
+        with self._lock:
+            expired = [k for k, (expires, _) in self._data.items() if expires is not None and expires < now]
+            for key in expired:
+                del self._data[key]
+        return len(expired)
+
+    def publish(self, channel, message):
+        for callback in list(self._subscribers.get(channel, ())):
+            callback(message)
+
+    def subscribe(self, channel, callback):
+        self._subscribers.setdefault(channel, []).append(callback)
+
+
+# ---- Redis protocol (RESP2) ----
+
+class RedisError(Exception):
+    pass
+
+
+class _RespConnection:
+    def __init__(self, host: str, port: int, db: int, password: Optional[str], timeout: Optional[float]):
+        self.sock = socket.create_connection((host, port), timeout=timeout)
+        self.file = self.sock.makefile("rb")
+        if password:
+            self.command("AUTH", password)
+        if db:
+            self.command("SELECT", db)
+
+    def send(self, *args):
+        parts = [b"*%d\r\n" % len(args)]
+        for arg in args:
+            if not isinstance(arg, bytes):
+                arg = str(arg).encode()
+            parts.append(b"$%d\r\n%s\r\n" % (len(arg), arg))
+        self.sock.sendall(b"".join(parts))
+
+    def read(self):
+        line = self.file.readline()
+        if not line:
+            raise ConnectionError("connection closed by server")
+        kind, rest = line[:1], line[1:-2]
+        if kind == b"+":
+            return rest.decode()
+        if kind == b"-":
+            raise RedisError(rest.decode())
+        if kind == b":":
+            return int(rest)
+        if kind == b"$":
+            n = int(rest)
+            if n < 0:
+                return None
+            data = self.file.read(n + 2)
+            return data[:-2]
+        if kind == b"*":
+            n = int(rest)
+            return None if n < 0 else [self.read() for _ in range(n)]
+        raise RedisError(f"unexpected reply {line!r}")
+
+    def command(self, *args):
+        self.send(*args)
+        return self.read()
+
+    def close(self):
+        try:
+            # shutdown first: it wakes a thread blocked in read(), which holds
+            # the file's lock and would otherwise make file.close() wait forever
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        try:
+            self.file.close()
+            self.sock.close()
+        except OSError:
+            pass
+
+
+# INCRBY and, on a key without an expiry (a new counter), PEXPIRE, run atomically
+INCR_SCRIPT = """
+local value = redis.call('INCRBY', KEYS[1], ARGV[1])
+if tonumber(ARGV[2]) > 0 and redis.call('PTTL', KEYS[1]) == -1 then
+    redis.call('PEXPIRE', KEYS[1], ARGV[2])
+end
+return value
+"""
+
+
+class RedisState(SharedState):
+    """One command connection behind a lock, plus one subscriber connection
+    read by a daemon thread once something subscribes."""
+
+    def __init__(self, url: str, timeout: float = 5.0):
+        parsed = urlparse(url)
+        self._params = dict(
+            host=parsed.hostname or "localhost",
+            port=parsed.port or 6379,
+            db=int(parsed.path.lstrip("/") or 0),
+            password=parsed.password,
+        )
+        self.timeout = timeout
+        self._conn: Optional[_RespConnection] = None
+        self._lock = threading.Lock()
+        self._subscribers: dict[str, list[Callable[[str], None]]] = {}
+        self._sub_conn: Optional[_RespConnection] = None
+        self._closed = False
+
+    def _command(self, *args):
+        with self._lock:
+            for attempt in (1, 2):
+                try:
+                    if self._conn is None:
+                        self._conn = _RespConnection(**self._params, timeout=self.timeout)
+                    return self._conn.command(*args)
+                except (OSError, ConnectionError):
+                    # reconnect once, e.g. after a server restart
+                    if self._conn is not None:
+                        self._conn.close()
+                        self._conn = None
+                    if attempt == 2:
+                        raise
+
+    def get(self, key):
+        return self._command("GET", PREFIX + key)
+
+    def set(self, key, value, ttl=None):
+        if ttl:
+            self._command("SET", PREFIX + key, value, "PX", int(ttl * 1000))
+        else:
+            self._command("SET", PREFIX + key, value)
+
+    def delete(self, key):
+        self._command("DEL", PREFIX + key)
+
+    def incr(self, key, amount=1, ttl=None):
+        # one script, so the key can never be left without its expiry
+        return self._command("EVAL", INCR_SCRIPT, 1, PREFIX + key, amount, int(ttl * 1000) if ttl else 0)
+
+    def publish(self, channel, message):
+        self._command("PUBLISH", PREFIX + channel, message)
+
+    def subscribe(self, channel, callback):
+        with self._lock:
+            first = not self._subscribers
+            new_channel = channel not in self._subscribers
+            self._subscribers.setdefault(channel, []).append(callback)
+        if first:
+            threading.Thread(target=self._listen, daemon=True, name="stadssurr-pubsub").start()
+        elif new_channel and self._sub_conn is not None:
+            self._sub_conn.send("SUBSCRIBE", PREFIX + channel)
+
+    def _listen(self):
+        while not self._closed:
+            try:
+                # no timeout: the subscriber connection blocks until a message arrives
+                self._sub_conn = _RespConnection(**self._params, timeout=None)
+                self._sub_conn.send("SUBSCRIBE", *(PREFIX + c for c in list(self._subscribers)))
+                while not self._closed:
+                    reply = self._sub_conn.read()
+                    if isinstance(reply, list) and reply and reply[0] == b"message":
+                        channel = reply[1].decode().removeprefix(PREFIX)
+                        for callback in list(self._subscribers.get(channel, ())):
+                            try:
+                                callback(reply[2].decode())
+                            except Exception as e:
+                                log.error(f"❌ Subscriber for {channel} failed: {e}")
+            except (OSError, ConnectionError, RedisError) as e:
+                if self._closed:
+                    return
+                log.warning(f"⚠️ Pub/sub connection lost ({e}), reconnecting")
+                time.sleep(1)
+
+    def close(self):
+        self._closed = True
+        for conn in (self._conn, self._sub_conn):
+            if conn is not None:
+                conn.close()
+
+
+def create_shared_state(url: str) -> SharedState:
+    scheme = urlparse(url).scheme
+    if scheme == "memory":
+        return MemoryState()
+    if scheme in ("redis", "valkey"):
+        return RedisState(url)
+    raise ValueError(f"unsupported SHARED_STATE_URL scheme: {scheme!r}")
+
+
+# ---- cache invalidation across workers ----
+
+INVALIDATION_CHANNEL = "invalidate"
+
+
+class InvalidationBus:
+    """Broadcasts "kind:key" messages; every worker, this one included, runs
+    the handlers registered for `kind`. key "*" means everything of that kind."""
+
+    def __init__(self, state: SharedState):
+        self.state = state
+        self._handlers: dict[str, list[Callable[[str], None]]] = {}
+        self._subscribed = False
+
+    def register(self, kind: str, handler: Callable[[str], None]):
+        self._handlers.setdefault(kind, []).append(handler)
+        if not self._subscribed:
+            self._subscribed = True
+            self.state.subscribe(INVALIDATION_CHANNEL, self._dispatch)
+
+    def _dispatch(self, message: str):
+        kind, _, key = message.partition(":")
+        for handler in self._handlers.get(kind, ()):
+            handler(key)
+
+    def publish(self, kind: str, key="*"):
+        message = f"{kind}:{key}"
+        if isinstance(self.state, MemoryState):
+            self.state.publish(INVALIDATION_CHANNEL, message)  # delivered synchronously
+            return
+        # apply locally right away; the echo from the server is harmless
+        self._dispatch(message)
+        try:
+            self.state.publish(INVALIDATION_CHANNEL, message)
+        except (OSError, ConnectionError, RedisError) as e:
+            log.warning(f"⚠️ Could not broadcast invalidation {message}: {e}")
+
+
+shared_state = create_shared_state(settings.SHARED_STATE_URL)
+invalidation = InvalidationBus(shared_state)
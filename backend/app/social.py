@@ -0,0 +1,118 @@
+# app/social.py
+from collections import OrderedDict
+from threading import Lock
+from typing import Iterable, Optional
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from .models import User, UserFollow
+from .settings import settings
+from .shared_state import InvalidationBus, invalidation
+
+
+class SocialGraph:
+    """Batched follow-graph lookups with an optional bounded adjacency cache.
+
+    The cache maps follower_id -> frozenset of followed ids. It is per process
+    and must be invalidated (invalidate()) after every follow/unfollow commit;
+    with a bus the invalidation is broadcast to every worker.
+    cache_size=0 disables it and every lookup goes to the database.
+    """
+
+    def __init__(self, cache_size: int = 0, bus: Optional[InvalidationBus] = None):
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[int, frozenset[int]]" = OrderedDict()
+        self._lock = Lock()
+        self.bus = bus if cache_size else None
+        if self.bus:
+            self.bus.register("follows", self._drop)
+
+    # ---- cache ----
+    def _cached(self, follower_id: int) -> frozenset[int] | None:
+        with self._lock:
+            following = self._cache.get(follower_id)
+            if following is not None:
+                self._cache.move_to_end(follower_id)
+            return following
+
+    def _store(self, follower_id: int, following: frozenset[int]):
+        with self._lock:
+            self._cache[follower_id] = following
+            self._cache.move_to_end(follower_id)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def _drop(self, key: str):
+        with self._lock:
+            if key == "*":
+                self._cache.clear()
+            else:
+                self._cache.pop(int(key), None)
+
+    def invalidate(self, follower_id: int):
+        if self.bus:
+            self.bus.publish("follows", follower_id)
+        else:
+            self._drop(str(follower_id))
+
+    def clear(self):
+        if self.bus:
+            self.bus.publish("follows")
+        else:
+            self._drop("*")
+
+    # ---- queries ----
+    def following_ids(self, db: Session, follower_id: int) -> frozenset[int]:
+        """All user ids that follower_id follows (one query, or none if cached)"""
+        following = self._cached(follower_id) if self.cache_size else None
+        if following is None:
+            following = frozenset(
+                row[0] for row in db.query(UserFollow.followed_id).filter(UserFollow.follower_id == follower_id)
+            )
+            if self.cache_size:
+                self._store(follower_id, following)
+        return following
+
+    def followed_among(self, db: Session, viewer_id: int | None, user_ids: Iterable[int]) -> set[int]:
+        """Which of user_ids viewer_id follows, in at most one query"""
+        user_ids = set(user_ids)
+        if not viewer_id or not user_ids:
+            return set()
+        if self.cache_size:
+            return user_ids & self.following_ids(db, viewer_id)
+        return {
+            row[0]
+            for row in db.query(UserFollow.followed_id).filter(
+                UserFollow.follower_id == viewer_id,
+                UserFollow.followed_id.in_(user_ids),
+            )
+        }
+
+    def is_following(self, db: Session, viewer_id: int | None, user_id: int) -> bool:
+        return user_id in self.followed_among(db, viewer_id, [user_id])
+
+    def counts(self, db: Session, user_ids: Iterable[int]) -> dict[int, dict[str, int]]:
+        """{user_id: {"followers_count", "following_count"}} for user_ids in one query"""
+        user_ids = set(user_ids)
+        if not user_ids:
+            return {}
+        following = (
+            db.query(UserFollow.follower_id.label("user_id"), func.count(UserFollow.id).label("n"))
+            .filter(UserFollow.follower_id.in_(user_ids))
+            .group_by(UserFollow.follower_id)
+            .subquery()
+        )
+        rows = (
+            db.query(User.id, User.followers_count, func.coalesce(following.c.n, 0))
+            .outerjoin(following, following.c.user_id == User.id)
+            .filter(User.id.in_(user_ids))
+            .all()
+        )
+        return {
+            uid: {"followers_count": followers or 0, "following_count": following_count}
+            for uid, followers, following_count in rows
+        }
+
+
+social_graph = SocialGraph(cache_size=settings.SOCIAL_GRAPH_CACHE_SIZE, bus=invalidation)
@@ -0,0 +1,436 @@
+# app/tidplan.py
+"""Tidplan fragments from the scrape, cleaned once at import.
+
+The scraper stores each project's "Tidsplan" section as it appears on the
+page, often with Word markup pasted into the CMS (conditional comments,
+<w:*> and <o:p> tags, inline styles). process() turns that into small, safe
+HTML and a list of dated milestones:
+
+    html        an allowlist of tags (headings, paragraphs, lists, emphasis,
+                links, figures, tables) and attributes (a href, img src/alt);
+                everything else is unwrapped or, for script/style/xml and
+                the like, dropped with its content. Whitespace is collapsed
+                and empty elements removed, so the result is minified and
+                the same input always gives the same output.
+    milestones  one per sentence of a list item or paragraph that names a
+                date: "Samråd: 29 april - 23 juni 2025", "Granskning, våren
+                2026", "Etapp 2 ... till och med kvartal 2 2021". Each gets the
+                date span as ISO dates (starts_on, ends_on), how precise the
+                text was, a label and the heading it was under.
+
+Both are stored by the importer (app/seed.py), in projects.tidplan_html and
+project_milestones, so requests never parse HTML. process() is idempotent:
+running it again on stored HTML gives the same HTML and milestones, which is
+how rebuild() fills the table for an existing database.
+
+load_timeline() and load_upcoming() read the table for the project timeline
+and /api/milestones/upcoming.
+"""
+import calendar
+import html
+import re
+from dataclasses import dataclass
+from datetime import date
+from html.parser import HTMLParser
+from typing import Iterable, Optional
+from urllib.parse import urljoin
+
+from sqlalchemy import and_, delete, insert, or_
+from sqlalchemy.orm import Session
+
+from .comment_threads import decode_cursor, encode_cursor
+from .models import Project, ProjectMilestone
+from .records import MilestoneItem, UpcomingMilestone
+
+ALLOWED = {
+    "h2", "h3", "h4", "p", "ul", "ol", "li", "strong", "em", "br", "a",
+    "figure", "figcaption", "img", "table", "thead", "tbody", "tr", "th", "td",
+}
+RENAMED = {"b": "strong", "i": "em", "h1": "h2", "h5": "h4", "h6": "h4"}
+# dropped together with everything inside them
+DROPPED = {
+    "script", "style", "xml", "head", "title", "iframe", "object", "embed", "template",
+    "noscript", "svg", "math", "form", "button", "select", "textarea",
+}
+VOID = {"br", "img", "source", "hr", "wbr", "meta", "link", "input", "area", "col", "param", "track"}
+BLOCK = {"h2", "h3", "h4", "p", "ul", "ol", "li", "figure", "figcaption", "table", "thead", "tbody", "tr", "th", "td"}
+HEADINGS = {"h2", "h3", "h4"}
+TEXT_BLOCKS = {"p", "li", "tr"}  # where milestone sentences are read from
+ATTRIBUTES = {"a": ("href",), "img": ("src", "alt")}
+URL_ATTRIBUTES = {"href", "src"}
+SAFE_SCHEMES = ("http://", "https://", "mailto:")
+
+SPACE_RE = re.compile(r"[ \t\n\r\f\v]+")
+NBSP_RUN_RE = re.compile(r"[ \xa0]{2,}")
+BLOCK_SPACE_RE = re.compile(r"\s*(</?(?:%s)\b[^>]*>|<br>)\s*" % "|".join(sorted(BLOCK)))
+TAG_RE = re.compile(r"<[^>]+>")
+SENTENCE_RE = re.compile(r"(?<=[.!?])\s+(?=[A-ZÅÄÖ0-9])")
+
+
+@dataclass
+class Node:
+    tag: str
+    attrs: dict
+    children: list
+
+
+class _TreeBuilder(HTMLParser):
+    """Allowlisted tags into a Node tree; tolerant of the unclosed tags CMS output has"""
+
+    def __init__(self, base_url: Optional[str]):
+        super().__init__(convert_charrefs=True)
+        self.base_url = base_url
+        self.root = Node("", {}, [])
+        self.stack = [self.root]
+        self.dropping: list[str] = []
+
+    def handle_starttag(self, tag, attrs):
+        if self.dropping:
+            if tag == self.dropping[-1] and tag not in VOID:
+                self.dropping.append(tag)
+            return
+        if tag in DROPPED:
+            self.dropping.append(tag)
+            return
+        tag = RENAMED.get(tag, tag)
+        if tag not in ALLOWED:
+            return  # unwrapped: its text still arrives through handle_data
+        if tag in ("p", "li") and self.stack[-1].tag == tag:
+            self.stack.pop()  # <li>a<li>b, <p>a<p>b
+        node = Node(tag, self._attributes(tag, attrs), [])
+        self.stack[-1].children.append(node)
+        if tag not in VOID:
+            self.stack.append(node)
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        tag = RENAMED.get(tag, tag)
+        if tag in ALLOWED and tag not in VOID and self.stack[-1].tag == tag:
+            self.stack.pop()
+
+    def handle_endtag(self, tag):
+        if self.dropping:
+            if tag == self.dropping[-1]:
+                self.dropping.pop()
+            return
+        tag = RENAMED.get(tag, tag)
+        for i in range(len(self.stack) - 1, 0, -1):
+            if self.stack[i].tag == tag:
+                del self.stack[i:]
+                return
+
+    def handle_data(self, data):
+        if not self.dropping:
+            self.stack[-1].children.append(data)
+
+    def _attributes(self, tag: str, attrs) -> dict:
+        kept = {}
+        for name, value in attrs:
+            if name not in ATTRIBUTES.get(tag, ()) or value is None:
+                continue
+            value = value.strip()
+            if name in URL_ATTRIBUTES:
+                if self.base_url and not value.lower().startswith(SAFE_SCHEMES) and ":" not in value.split("/")[0]:
+                    value = urljoin(self.base_url, value)
+                if not value.lower().startswith(SAFE_SCHEMES):
+                    continue
+            kept[name] = value
+        if tag == "a" and "href" in kept:
+            kept["rel"] = "noopener noreferrer"
+        return kept
+
+
+def _render(node: Node, out: list[str], blocks: list, state: dict):
+    """Append `node`'s children to out; collects (section, text) for each text block"""
+    for child in node.children:
+        if isinstance(child, str):
+            text = SPACE_RE.sub(" ", child)
+            out.append(html.escape(text, quote=False))
+            if state["text"] is not None:
+                state["text"].append(text)
+            continue
+        if child.tag in VOID:
+            if child.tag == "img" and "src" in child.attrs:
+                out.append(f"<img{_attributes_html(child.attrs)}>")
+            elif child.tag == "br":
+                out.append("<br>")
+                if state["text"] is not None:
+                    state["text"].append(" ")
+            continue
+        if child.tag == "a" and "href" not in child.attrs:
+            _render(child, out, blocks, state)  # unwrapped
+            continue
+
+        outer_text = state["text"]
+        if child.tag in TEXT_BLOCKS or child.tag in HEADINGS:
+            state["text"] = []
+        elif child.tag in BLOCK and outer_text is not None:
+            outer_text.append(" ")
+        inner: list[str] = []
+        _render(child, inner, blocks, state)
+        content = "".join(inner)
+        text = state["text"]
+        state["text"] = outer_text
+
+        if child.tag in TEXT_BLOCKS or child.tag in HEADINGS:
+            plain = NBSP_RUN_RE.sub(" ", "".join(text)).strip()
+            if child.tag in HEADINGS:
+                state["section"] = plain or state["section"]
+            elif plain:
+                blocks.append((state["section"], plain))
+        # nothing but whitespace and line breaks: leave the element out
+        if not content.replace("<br>", "").replace("\xa0", "").strip() and "<img" not in content:
+            continue
+        # nor text blocks left with only punctuation, like Word's list bullets
+        if child.tag in TEXT_BLOCKS and "<img" not in content and not any(c.isalnum() for c in TAG_RE.sub("", content)):
+            continue
+        out.append(f"<{child.tag}{_attributes_html(child.attrs)}>{content}</{child.tag}>")
+
+
+def _attributes_html(attrs: dict) -> str:
+    return "".join(f' {name}="{html.escape(value)}"' for name, value in attrs.items())
+
+
+# ---- dates ----
+
+MONTHS = {
+    "januari": 1, "jan": 1, "februari": 2, "feb": 2, "mars": 3, "mar": 3, "april": 4, "apr": 4,
+    "maj": 5, "juni": 6, "jun": 6, "juli": 7, "jul": 7, "augusti": 8, "aug": 8,
+    "september": 9, "sept": 9, "sep": 9, "oktober": 10, "okt": 10, "november": 11, "nov": 11,
+    "december": 12, "dec": 12,
+}
+# season -> (first month, last month); winter is read as January-February of the year
+SEASONS = {"vår": (3, 5), "sommar": (6, 8), "höst": (9, 11), "vinter": (1, 2)}
+PARTS = {"början": (1, 4), "mitten": (5, 8), "slutet": (9, 12)}
+ORDINALS = {"första": 1, "andra": 2, "tredje": 3, "fjärde": 4}
+
+_MONTH = r"(?:%s)\.?" % "|".join(sorted(MONTHS, key=len, reverse=True))
+_YEAR = r"(?:19|20)\d{2}"
+DATE_RE = re.compile(
+    r"\b(?:"
+    rf"(?P<day>(?P<day_d>\d{{1,2}})\s+(?P<day_m>{_MONTH})(?:,?\s+(?P<day_y>{_YEAR}))?)"
+    rf"|(?P<month>(?P<month_m>{_MONTH})(?:,?\s+(?P<month_y>{_YEAR})|(?=\s*[–-]\s*(?:\d{{1,2}}\s+)?{_MONTH})))"
+    rf"|(?P<season>(?P<season_s>vår|sommar|höst|vinter)(?:en|n)?\s+(?P<season_y>{_YEAR}))"
+    rf"|(?P<quarter>(?:kvartal|kv\.?|q)\s*(?P<quarter_q>[1-4])(?:\s+|\s*[-/,]\s*)(?:år\s+)?(?P<quarter_y>{_YEAR}))"
+    rf"|(?P<quarterpre>(?P<quarterpre_q>[1-4])(?::?[ae])?\s*(?:kv\.?|kvartalet)\s+(?:år\s+)?(?P<quarterpre_y>{_YEAR}))"
+    rf"|(?P<quarterord>(?P<quarterord_q>första|andra|tredje|fjärde)\s+kvartalet\s+(?:år\s+)?(?P<quarterord_y>{_YEAR}))"
+    rf"|(?P<half>(?P<half_h>första|andra)\s+halvåret\s+(?:år\s+)?(?P<half_y>{_YEAR}))"
+    rf"|(?P<part>(?P<part_p>början|mitten|slutet)\s+(?:av|på)\s+(?:år\s+)?(?P<part_y>{_YEAR}))"
+    rf"|(?P<turn>årsskiftet\s+(?P<turn_y>{_YEAR})\s*[/–-]\s*(?:{_YEAR}|\d{{2}}))"
+    rf"|(?P<year>{_YEAR})(?![-–]\d{{5}})"  # not a diarienummer like 2022-01535
+    r")\b",
+    re.IGNORECASE,
+)
+# words left dangling before a date: "beräknas antas i", "pågår till och med"
+TRAILING_WORDS_RE = re.compile(
+    r"(?:[\s,:;–-]+(?:i|under|till|och|med|från|den|om|kring|runt|år|efter|före|innan|vid|på|av|"
+    r"tidigast|senast|preliminärt|ca|cirka|omkring|sedan|fram|mellan|året|åren))+[\s,:;–-]*$",
+    re.IGNORECASE,
+)
+
+
+def _month_span(year: int, first: int, last: int) -> tuple[date, date]:
+    return date(year, first, 1), date(year, last, calendar.monthrange(year, last)[1])
+
+
+def _span(match: re.Match, year: Optional[int] = None) -> Optional[tuple[date, date, str]]:
+    """(start, end, precision) for one DATE_RE match; `year` for "31 augusti" without one"""
+    g = match.groupdict()
+    if g["day"]:
+        y = int(g["day_y"]) if g["day_y"] else year
+        if y is None:
+            return None
+        try:
+            day = date(y, MONTHS[g["day_m"].lower().rstrip(".")], int(g["day_d"]))
+        except ValueError:
+            return None
+        return day, day, "day"
+    if g["month"]:
+        y = int(g["month_y"]) if g["month_y"] else year
+        if y is None:
+            return None
+        m = MONTHS[g["month_m"].lower().rstrip(".")]
+        return (*_month_span(y, m, m), "month")
+    if g["season"]:
+        return (*_month_span(int(g["season_y"]), *SEASONS[g["season_s"].lower()]), "season")
+    if g["quarter"] or g["quarterpre"] or g["quarterord"]:
+        q = int(g["quarter_q"] or g["quarterpre_q"]) if g["quarterord"] is None else ORDINALS[g["quarterord_q"].lower()]
+        y = int(g["quarter_y"] or g["quarterpre_y"] or g["quarterord_y"])
+        return (*_month_span(y, 3 * q - 2, 3 * q), "quarter")
+    if g["half"]:
+        first = 1 if g["half_h"].lower() == "första" else 7
+        return (*_month_span(int(g["half_y"]), first, first + 5), "half")
+    if g["part"]:
+        return (*_month_span(int(g["part_y"]), *PARTS[g["part_p"].lower()]), "season")
+    if g["turn"]:
+        y = int(g["turn_y"])
+        return date(y, 12, 1), date(y + 1, 1, 31), "month"
+    return (*_month_span(int(g["year"]), 1, 12), "year")
+
+
+def find_dates(text: str) -> list[tuple[re.Match, date, date, str]]:
+    """Every date expression in `text`, in order; a day or month without a year
+    takes the year of the next expression that has one ("31 augusti–28
+    september 2016", "juni–augusti 2019")"""
+    matches = list(DATE_RE.finditer(text))
+    found = []
+    for i, match in enumerate(matches):
+        year = None
+        if (match.group("day") and not match.group("day_y")) or (match.group("month") and not match.group("month_y")):
+            year = next((_span(m)[0].year for m in matches[i + 1:] if _span(m)), None)
+        span = _span(match, year)
+        if span:
+            found.append((match, *span))
+    return found
+
+
+# ---- extraction ----
+
+PRECISION = ["day", "month", "quarter", "season", "half", "year"]  # finest first
+
+
+@dataclass
+class Milestone:
+    position: int
+    section: Optional[str]
+    label: str
+    date_text: str
+    starts_on: str  # ISO dates, so they sort and compare as strings
+    ends_on: str
+    precision: str  # the coarsest of the dates it was read from, see PRECISION
+
+
+@dataclass
+class Tidplan:
+    html: Optional[str]
+    milestones: list[Milestone]
+
+
+def _label(sentence: str, first: re.Match, last: re.Match, section: Optional[str]) -> str:
+    label = TRAILING_WORDS_RE.sub("", " " + sentence[:first.start()]).strip(" ,:;–-")
+    if len(label) < 3:
+        label = sentence[last.end():].strip(" ,:;–-.")
+    if len(label) < 3:
+        label = section or sentence
+    return label.rstrip(".")
+
+
+def milestones_from(blocks: Iterable[tuple[Optional[str], str]]) -> list[Milestone]:
+    milestones = []
+    for section, text in blocks:
+        for sentence in SENTENCE_RE.split(text):
+            dates = find_dates(sentence)
+            if not dates:
+                continue
+            first, last = dates[0][0], dates[-1][0]
+            milestones.append(Milestone(
+                position=len(milestones),
+                section=section,
+                label=_label(sentence, first, last, section),
+                date_text=sentence[first.start():last.end()],
+                starts_on=min(d[1] for d in dates).isoformat(),
+                ends_on=max(d[2] for d in dates).isoformat(),
+                precision=max((d[3] for d in dates), key=PRECISION.index),
+            ))
+    return milestones
+
+
+def process(raw: Optional[str], base_url: Optional[str] = None) -> Tidplan:
+    """Sanitized, minified HTML (None if no text is left) and its milestones.
+    Relative links and images resolve against `base_url`, else are dropped."""
+    if not raw or not raw.strip():
+        return Tidplan(None, [])
+    builder = _TreeBuilder(base_url)
+    builder.feed(raw)
+    builder.close()
+    out: list[str] = []
+    blocks: list[tuple[Optional[str], str]] = []
+    _render(builder.root, out, blocks, {"text": None, "section": None})
+    cleaned = BLOCK_SPACE_RE.sub(r"\1", NBSP_RUN_RE.sub(" ", "".join(out))).strip()
+    if not TAG_RE.sub("", cleaned).replace("\xa0", "").strip():
+        return Tidplan(None, [])
+    return Tidplan(cleaned, milestones_from(blocks))
+
+
+# ---- storage ----
+
+def milestone_rows(project_id: int, milestones: Iterable[Milestone]) -> list[dict]:
+    return [{"project_id": project_id, **vars(m)} for m in milestones]
+
+
+def store_milestones(db: Session, project_ids: Optional[list[int]] = None) -> int:
+    """Re-extract milestones from the stored tidplan_html of the given
+    projects (all when None), replacing theirs; returns the number written.
+    The caller commits."""
+    no_sync = {"synchronize_session": False}
+    query = db.query(Project.id, Project.tidplan_html).filter(Project.tidplan_html.isnot(None))
+    if project_ids is None:
+        db.execute(delete(ProjectMilestone), execution_options=no_sync)
+    else:
+        for i in range(0, len(project_ids), 500):
+            chunk = project_ids[i:i + 500]
+            db.execute(delete(ProjectMilestone).where(ProjectMilestone.project_id.in_(chunk)), execution_options=no_sync)
+        query = query.filter(Project.id.in_(project_ids))
+    rows = []
+    for project_id, tidplan_html in query:
+        rows.extend(milestone_rows(project_id, process(tidplan_html).milestones))
+    for i in range(0, len(rows), 500):
+        db.execute(insert(ProjectMilestone), rows[i:i + 500])
+    return len(rows)
+
+
+def rebuild(db: Session) -> tuple[int, int]:
+    """Sanitize every stored tidplan_html in place and rebuild all milestones;
+    commits and returns (projects rewritten, milestones)"""
+    rewritten = 0
+    for project in db.query(Project).filter(Project.tidplan_html.isnot(None)):
+        cleaned = process(project.tidplan_html, base_url=project.url).html
+        if cleaned != project.tidplan_html:
+            project.tidplan_html = cleaned
+            rewritten += 1
+    db.flush()
+    count = store_milestones(db)
+    db.commit()
+    return rewritten, count
+
+
+def needs_rebuild(db: Session) -> bool:
+    """Empty milestone table next to projects with a tidplan, i.e. the table was just added"""
+    if db.query(ProjectMilestone.id).first() is not None:
+        return False
+    return db.query(Project.id).filter(Project.tidplan_html.isnot(None)).first() is not None
+
+
+# ---- read ----
+
+def load_timeline(db: Session, project_id: int) -> list[MilestoneItem]:
+    """A project's milestones, earliest first"""
+    M = ProjectMilestone
+    rows = db.query(M).filter(M.project_id == project_id).order_by(M.starts_on, M.position).all()
+    return [
+        MilestoneItem(section=m.section, label=m.label, date_text=m.date_text,
+                      starts_on=m.starts_on, ends_on=m.ends_on, precision=m.precision)
+        for m in rows
+    ]
+
+
+def load_upcoming(db: Session, on: str, limit: int, after: Optional[str] = None) -> tuple[list[UpcomingMilestone], Optional[str]]:
+    """Milestones across all projects that have not ended by `on` (ISO date),
+    those ending soonest first; returns (items, next_cursor). Raises
+    ValueError for a malformed cursor."""
+    M = ProjectMilestone
+    query = db.query(M, Project.title).join(Project, Project.id == M.project_id).filter(M.ends_on >= on)
+    if after:
+        ends_on, milestone_id = decode_cursor(after)
+        query = query.filter(or_(M.ends_on > ends_on, and_(M.ends_on == ends_on, M.id > milestone_id)))
+    rows = query.order_by(M.ends_on, M.id).limit(limit + 1).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1][0].ends_on, rows[-1][0].id)
+    items = [
+        UpcomingMilestone(project_id=m.project_id, project_title=title, section=m.section, label=m.label,
+                          date_text=m.date_text, starts_on=m.starts_on, ends_on=m.ends_on, precision=m.precision)
+        for m, title in rows
+    ]
+    return items, next_cursor
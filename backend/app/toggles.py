@@ -0,0 +1,91 @@
+# app/toggles.py
+"""Race-free like/vote toggles.
+
+Each toggle is a conditional DELETE ... RETURNING / UPDATE ... RETURNING followed
+by INSERT ... ON CONFLICT DO NOTHING, so two concurrent clicks can never trip the
+unique constraints. The new tally is read in the same transaction before commit.
+
+Only SQLite and PostgreSQL are supported, deliberately: the toggles rely on
+DELETE/UPDATE ... RETURNING, and dialect_insert() is also used for the
+ON CONFLICT upserts of the activity rollup, news, content versions, job
+queue and write buffer, which a SELECT-then-INSERT fallback could not make
+atomic. Any other dialect fails on the first write with NotImplementedError
+rather than racing silently.
+"""
+from sqlalchemy import func, case, delete, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+
+def dialect_insert(db: Session, model):
+    """Dialect insert() that supports on_conflict_do_nothing()/do_update();
+    SQLite and PostgreSQL only, see the module docstring"""
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        return postgresql.insert(model)
+    if dialect == "sqlite":
+        return sqlite.insert(model)
+    raise NotImplementedError(f"Atomic inserts and upserts are only implemented for sqlite and postgresql, not {dialect}")
+
+
+def toggle_like(db: Session, like_model, user_id: int, comment_id: int) -> tuple[bool, int]:
+    """Like or unlike comment_id for user_id and commit. Returns (liked, like_count)."""
+    removed = db.execute(
+        delete(like_model)
+        .where(like_model.user_id == user_id, like_model.comment_id == comment_id)
+        .returning(like_model.id)
+        .execution_options(synchronize_session=False)
+    ).first()
+    if removed is None:
+        # If a concurrent request inserted first the row already exists, which is what we wanted
+        db.execute(
+            dialect_insert(db, like_model)
+            .values(user_id=user_id, comment_id=comment_id)
+            .on_conflict_do_nothing(index_elements=["user_id", "comment_id"])
+        )
+    likes = db.query(func.count(like_model.id)).filter(like_model.comment_id == comment_id).scalar()
+    db.commit()
+    return removed is None, likes
+
+
+def vote_tally(db: Session, vote_model, parent_key: str, parent_id: int) -> dict[str, int]:
+    """{"upvotes", "downvotes"} for one project/post in a single query"""
+    upvotes, downvotes = db.query(
+        func.coalesce(func.sum(case((vote_model.vote_type == "upvote", 1), else_=0)), 0),
+        func.coalesce(func.sum(case((vote_model.vote_type == "downvote", 1), else_=0)), 0),
+    ).filter(getattr(vote_model, parent_key) == parent_id).one()
+    return {"upvotes": upvotes, "downvotes": downvotes}
+
+
+def toggle_vote(db: Session, vote_model, parent_key: str, parent_id: int, user_id: int, vote_type: str, commit: bool = True) -> dict:
+    """Apply a vote click and commit (commit=False leaves that to the caller).
+
+    Same type as the existing vote removes it, the other type changes it, no vote
+    creates one. Returns {"action", "user_vote", "upvotes", "downvotes"}.
+    """
+    parent_col = getattr(vote_model, parent_key)
+    mine = (parent_col == parent_id, vote_model.user_id == user_id)
+    no_sync = {"synchronize_session": False}
+
+    if db.execute(
+        delete(vote_model).where(*mine, vote_model.vote_type == vote_type).returning(vote_model.id),
+        execution_options=no_sync,
+    ).first():
+        action, user_vote = "removed", None
+    elif db.execute(
+        update(vote_model).where(*mine, vote_model.vote_type != vote_type).values(vote_type=vote_type).returning(vote_model.id),
+        execution_options=no_sync,
+    ).first():
+        action, user_vote = "changed", vote_type
+    else:
+        db.execute(
+            dialect_insert(db, vote_model)
+            .values(**{parent_key: parent_id}, user_id=user_id, vote_type=vote_type)
+            .on_conflict_do_nothing(index_elements=[parent_key, "user_id"])
+        )
+        action, user_vote = "created", vote_type
+
+    result = {"action": action, "user_vote": user_vote, **vote_tally(db, vote_model, parent_key, parent_id)}
+    if commit:
+        db.commit()
+    return result
@@ -0,0 +1,299 @@
+# app/write_buffer.py
+"""Optional write-behind buffer for votes and comment likes.
+
+Toggles are resolved in memory against (database state + buffered changes), the
+caller gets the projected tally straight away, and a background thread writes
+the coalesced final state per (target, user) in one transaction every
+flush_interval seconds or once max_batch keys are pending.
+
+Every toggle is appended to a journal file before it is acknowledged. The
+journal is rotated when a batch is taken and the rotated file is deleted only
+after that batch has committed, so whatever is on disk at startup is replayed
+by start(). Entries carry the absolute final state, which makes replay
+idempotent.
+
+The buffer is per process: with several workers each one projects tallies from
+its own pending writes only. Read endpoints see buffered writes once flushed.
+"""
+import glob
+import json
+import logging
+import os
+import threading
+from collections import Counter
+
+from sqlalchemy import delete, func, tuple_
+from sqlalchemy.orm import Session
+
+from . import activity
+from .models import Vote, PostVote, CommentLike, PostCommentLike
+from .toggles import dialect_insert
+
+log = logging.getLogger("stadsurr")
+
+# kind -> (model, target column)
+TARGETS = {
+    "project_vote": (Vote, "project_id"),
+    "post_vote": (PostVote, "post_id"),
+    "comment_like": (CommentLike, "comment_id"),
+    "post_comment_like": (PostCommentLike, "comment_id"),
+}
+LIKE = "like"  # state of a like row; votes use their vote_type
+CHUNK = 300
+
+
+def _is_vote(kind: str) -> bool:
+    return kind.endswith("_vote")
+
+
+class WriteBuffer:
+    def __init__(self, engine, journal_path: str, flush_interval: float = 0.5, max_batch: int = 500):
+        self.engine = engine
+        self.journal_path = journal_path
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+
+        # key = (kind, target_id, user_id) -> (state before buffering, buffered state)
+        self._pending: dict[tuple, tuple] = {}
+        self._inflight: dict[tuple, tuple] = {}
+        # (kind, target_id) -> Counter of state changes not yet committed
+        self._deltas: dict[tuple, Counter] = {}
+        # (kind, target_id) -> committed tally, read once per target between flushes
+        self._committed: dict[tuple, Counter] = {}
+
+        self._lock = threading.RLock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._journal = None
+        # Flushes run under the lock on a dedicated connection: request threads that
+        # wait for the lock may hold every pooled connection.
+        self._connection = None
+        self._rotation = 0
+        self._rotated: list[str] = []  # journals whose entries are not committed yet
+        self._generation = 0  # bumped after every committed flush
+        self.stats = Counter()
+
+    # ---- lifecycle ----
+    def start(self):
+        self._connection = self.engine.connect()
+        self.replay()
+        self._journal = open(self.journal_path, "a", encoding="utf-8")
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="write-buffer", daemon=True)
+        self._thread.start()
+        log.info(f"✅ Write buffer started (interval={self.flush_interval}s, max_batch={self.max_batch})")
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._wake.set()
+        self._thread.join()
+        self._thread = None
+        self.flush()
+        self._journal.close()
+        self._journal = None
+        self._connection.close()
+        self._connection = None
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                # batch stays in the rotated journal and is replayed on next start
+                log.error(f"❌ Write buffer flush failed: {e}")
+
+    # ---- toggles ----
+    def toggle_vote(self, db: Session, kind: str, target_id: int, user_id: int, vote_type: str) -> dict:
+        """Buffered counterpart of toggles.toggle_vote()"""
+        key = (kind, target_id, user_id)
+        prefetched = self._prefetch(db, key)
+        with self._lock:
+            current = self._current_state(db, key, prefetched)
+            if current == vote_type:
+                new, action = None, "removed"
+            else:
+                new, action = vote_type, ("changed" if current else "created")
+            tally = self._record(db, kind, target_id, user_id, current, new)
+        return {"action": action, "user_vote": new, "upvotes": tally["upvote"], "downvotes": tally["downvote"]}
+
+    def toggle_like(self, db: Session, kind: str, comment_id: int, user_id: int) -> tuple[bool, int]:
+        """Buffered counterpart of toggles.toggle_like()"""
+        key = (kind, comment_id, user_id)
+        prefetched = self._prefetch(db, key)
+        with self._lock:
+            current = self._current_state(db, key, prefetched)
+            new = None if current else LIKE
+            tally = self._record(db, kind, comment_id, user_id, current, new)
+        return new is not None, tally[LIKE]
+
+    def _prefetch(self, db: Session, key: tuple) -> tuple[int, object]:
+        """Database state read outside the lock, tagged with the flush generation it saw"""
+        generation = self._generation
+        return generation, self._db_state(db, key)
+
+    def _current_state(self, db: Session, key: tuple, prefetched: tuple[int, object]):
+        """Buffered state if any, else the prefetched database state (re-read if a flush happened since)"""
+        for overlay in (self._pending, self._inflight):
+            if key in overlay:
+                return overlay[key][1]
+        generation, state = prefetched
+        return state if generation == self._generation else self._db_state(db, key)
+
+    def _db_state(self, db: Session, key: tuple):
+        kind, target_id, user_id = key
+        model, column = TARGETS[kind]
+        row = db.query(model.vote_type if _is_vote(kind) else model.id).filter(
+            getattr(model, column) == target_id, model.user_id == user_id
+        ).first()
+        if row is None:
+            return None
+        return row[0] if _is_vote(kind) else LIKE
+
+    def _record(self, db: Session, kind: str, target_id: int, user_id: int, current, new) -> Counter:
+        key = (kind, target_id, user_id)
+        base = self._pending[key][0] if key in self._pending else current
+        self._pending[key] = (base, new)
+        self._journal_write(key, new)
+
+        delta = self._deltas.setdefault((kind, target_id), Counter())
+        if current:
+            delta[current] -= 1
+        if new:
+            delta[new] += 1
+        self.stats["toggles"] += 1
+        if len(self._pending) >= self.max_batch:
+            self._wake.set()
+        if (kind, target_id) not in self._committed:
+            self._committed[(kind, target_id)] = self._db_tally(db, kind, target_id)
+        tally = Counter(self._committed[(kind, target_id)])
+        for state, n in delta.items():
+            tally[state] += n
+        return tally
+
+    def _db_tally(self, db: Session, kind: str, target_id: int) -> Counter:
+        model, column = TARGETS[kind]
+        target = getattr(model, column) == target_id
+        if _is_vote(kind):
+            return Counter(dict(db.query(model.vote_type, func.count(model.id)).filter(target).group_by(model.vote_type).all()))
+        return Counter({LIKE: db.query(func.count(model.id)).filter(target).scalar()})
+
+    def _journal_write(self, key: tuple, state):
+        self._journal.write(json.dumps([*key, state]) + "\n")
+        self._journal.flush()
+
+    # ---- flushing ----
+    def flush(self):
+        """Write everything pending in one transaction"""
+        with self._lock:
+            if not self._pending:
+                return
+            self._inflight, self._pending = self._pending, {}
+            self._rotated.append(self._rotate_journal())
+            batch = {key: new for key, (_, new) in self._inflight.items()}
+
+            db = Session(bind=self._connection)
+            try:
+                apply_states(db, batch)
+                db.commit()
+            except Exception:
+                db.rollback()
+                # keep the batch buffered so projections stay right; the next flush retries it
+                for key, entry in self._inflight.items():
+                    self._pending.setdefault(key, entry)
+                self._inflight = {}
+                raise
+            finally:
+                db.close()
+
+            for (kind, target_id, _), (base, new) in self._inflight.items():
+                delta = self._deltas[(kind, target_id)]
+                if base:
+                    delta[base] += 1
+                if new:
+                    delta[new] -= 1
+            self._deltas = {target: delta for target, delta in self._deltas.items() if any(delta.values())}
+            # other writers may have committed too; re-read tallies on next touch
+            self._committed.clear()
+            self._inflight = {}
+            self._generation += 1
+            for path in self._rotated:
+                os.remove(path)
+            self._rotated = []
+            self.stats["flushes"] += 1
+            self.stats["rows_written"] += len(batch)
+
+    def _rotate_journal(self) -> str:
+        self._journal.close()
+        self._rotation += 1
+        rotated = f"{self.journal_path}.{os.getpid()}.{self._rotation}.flushing"
+        os.replace(self.journal_path, rotated)
+        self._journal = open(self.journal_path, "a", encoding="utf-8")
+        return rotated
+
+    def replay(self):
+        """Apply journals left behind by a crash, oldest first"""
+        paths = sorted(glob.glob(f"{self.journal_path}.*.flushing"), key=os.path.getmtime)
+        if os.path.exists(self.journal_path):
+            paths.append(self.journal_path)
+        states = {}
+        for path in paths:
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        kind, target_id, user_id, state = json.loads(line)
+                    except ValueError:
+                        continue  # torn last line from the crash
+                    states[(kind, target_id, user_id)] = state
+        if states:
+            db = Session(bind=self._connection)
+            try:
+                apply_states(db, states)
+                db.commit()
+            finally:
+                db.close()
+            log.info(f"✅ Replayed {len(states)} buffered vote/like writes")
+        for path in paths:
+            os.remove(path)
+
+
+def apply_states(db: Session, states: dict[tuple, object]):
+    """Upsert/delete rows so each (kind, target, user) ends in the given state"""
+    by_kind: dict[str, tuple[list, list]] = {}
+    for (kind, target_id, user_id), state in states.items():
+        sets, deletes = by_kind.setdefault(kind, ([], []))
+        if state is None:
+            deletes.append((target_id, user_id))
+        else:
+            sets.append((target_id, user_id, state))
+
+    for kind, (sets, deletes) in by_kind.items():
+        model, column = TARGETS[kind]
+        target_col = getattr(model, column)
+        for i in range(0, len(deletes), CHUNK):
+            db.execute(
+                delete(model).where(tuple_(target_col, model.user_id).in_(deletes[i:i + CHUNK])),
+                execution_options={"synchronize_session": False},
+            )
+        for i in range(0, len(sets), CHUNK):
+            chunk = sets[i:i + CHUNK]
+            if _is_vote(kind):
+                stmt = dialect_insert(db, model).values(
+                    [{column: t, "user_id": u, "vote_type": s} for t, u, s in chunk]
+                )
+                stmt = stmt.on_conflict_do_update(
+                    index_elements=[column, "user_id"], set_={"vote_type": stmt.excluded.vote_type}
+                )
+            else:
+                stmt = dialect_insert(db, model).values(
+                    [{column: t, "user_id": u} for t, u, _ in chunk]
+                ).on_conflict_do_nothing(index_elements=["user_id", column])
+            db.execute(stmt)
+
+    project_votes = [(u, t, s) for (kind, t, u), s in states.items() if kind == "project_vote"]
+    if project_votes:
+        activity.record_votes(db, project_votes)
@@ -0,0 +1,97 @@
+# benchmarks/bench_consultations.py
+"""Consultation intake and export: one ORM insert per submission vs batches,
+and peak memory of an export through ORM objects vs the streamed CSV/NDJSON.
+
+Run from backend/:  python -m benchmarks.bench_consultations [--rows 100000]
+
+Export peak memory should stay flat as --rows grows for the streamed
+variants and grow linearly for the ORM one.
+"""
+import argparse
+import csv
+import io
+import time
+import tracemalloc
+
+from app.consultations import export_csv, export_ndjson, insert_batch, validate_batch
+from app.models import Consultation
+
+from .common import temp_database, seed_dataset
+
+PROJECT_ID = 1
+USER_ID = 1
+
+
+def items(n: int) -> list[dict]:
+    phases = ("Samråd", "Granskning")
+    return [{"project_id": PROJECT_ID, "phase": phases[i % 2], "content": f"Synpunkt nummer {i}: mer cykelparkering, tack."}
+            for i in range(n)]
+
+
+def orm_insert(Session, batch: list[dict]):
+    for item in batch:
+        with Session() as db:
+            db.add(Consultation(user_id=USER_ID, consent_at="2025-01-01T00:00:00", created_at="2025-01-01T00:00:00", **item))
+            db.commit()
+
+
+def batch_insert(Session, batch: list[dict]):
+    with Session() as db:
+        rows, _ = validate_batch(batch, PROJECT_ID, USER_ID)
+        insert_batch(db, rows)
+
+
+def orm_export(db) -> int:
+    rows = db.query(Consultation).filter(Consultation.project_id == PROJECT_ID).order_by(Consultation.id).all()
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for c in rows:
+        writer.writerow([c.id, c.project_id, c.user_id, c.phase, c.content, c.consent_at, c.created_at])
+    return len(buffer.getvalue())
+
+
+def drain(chunks) -> int:
+    return sum(len(chunk) for chunk in chunks)
+
+
+def measure(fn) -> tuple[float, int, int]:
+    tracemalloc.start()
+    start = time.perf_counter()
+    size = fn()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak, size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100_000, help="consultations to export")
+    parser.add_argument("--intake", type=int, default=2000, help="submissions for the intake comparison")
+    args = parser.parse_args()
+
+    _, Session = temp_database()
+    seed_dataset(Session)
+    for name, fn in (("one ORM insert each", orm_insert), ("batch endpoint path", batch_insert)):
+        start = time.perf_counter()
+        fn(Session, items(args.intake))
+        elapsed = time.perf_counter() - start
+        print(f"intake  {name:22} {args.intake / elapsed:9.0f} submissions/s")
+
+    _, Session = temp_database()
+    seed_dataset(Session)
+    with Session() as db:
+        rows, _ = validate_batch(items(args.rows), PROJECT_ID, USER_ID)
+        insert_batch(db, rows)
+    print(f"export of {args.rows} consultations:")
+    for name, fn in (
+        ("ORM .all() + csv", lambda: orm_export(Session())),
+        ("streamed csv", lambda: drain(export_csv(Session(), PROJECT_ID))),
+        ("streamed ndjson", lambda: drain(export_ndjson(Session(), PROJECT_ID))),
+    ):
+        elapsed, peak, size = measure(fn)
+        print(f"export  {name:22} {elapsed * 1000:8.0f} ms   peak {peak / 2**20:7.1f} MiB   {size / 2**20:6.1f} MiB out")
+
+
+if __name__ == "__main__":
+    main()
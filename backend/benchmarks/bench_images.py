@@ -0,0 +1,155 @@
+# benchmarks/bench_images.py
+"""Image proxy: bytes per map thumbnail and latency for cold, warm and
+concurrent requests.
+
+Run from backend/:  python -m benchmarks.bench_images [--images 20] [--concurrency 20]
+
+Serves --images generated photos (2400x1600 JPEG, about what the scraped
+project pages link to) from a local http.server, starts uvicorn with
+IMG_ALLOW_PRIVATE=1 (and that server on IMG_ALLOWED_HOSTS) and requests each through /api/img: first fetch and
+resize (cold), a second width from the cached original, the cached variant
+(warm), JPEG for clients without WebP, a 304 revalidation, and
+--concurrency simultaneous requests for one uncached variant, which should
+cost a single fetch.
+
+Then prefetches another --images photos the way scrape.py --images does,
+from this process into the server's cache directory: once cold, once more
+with the images unchanged (no decoding), and the server's first request for
+each afterwards, which should be a cache hit.
+"""
+import argparse
+import asyncio
+import functools
+import http.server
+import logging
+import os
+import random
+import statistics
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+from PIL import Image, ImageDraw
+from sqlalchemy import create_engine
+
+from app.database import Base
+from app.images import DiskCache, ImageProxy
+
+from .bench_workers import start_server
+
+
+def make_photos(directory: str, count: int, size=(2400, 1600)):
+    rng = random.Random(1)
+    for i in range(count):
+        image = Image.new("RGB", size, tuple(rng.randrange(256) for _ in range(3)))
+        draw = ImageDraw.Draw(image)
+        for _ in range(300):  # enough detail that the JPEG is photo-sized
+            x, y = rng.randrange(size[0]), rng.randrange(size[1])
+            draw.ellipse((x, y, x + rng.randrange(20, 400), y + rng.randrange(20, 400)),
+                         fill=tuple(rng.randrange(256) for _ in range(3)))
+        image.save(os.path.join(directory, f"photo{i}.jpg"), "JPEG", quality=90)
+
+
+class QuietHandler(http.server.SimpleHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+def serve(directory: str) -> str:
+    handler = functools.partial(QuietHandler, directory=directory)
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def timed(client: httpx.Client, url: str, **params) -> tuple[float, httpx.Response]:
+    start = time.perf_counter()
+    r = client.get("/api/img", params={"url": url, **params}, headers={"Accept": "image/webp,*/*"})
+    return (time.perf_counter() - start) * 1000, r
+
+
+async def burst(base_url: str, url: str, n: int) -> float:
+    async with httpx.AsyncClient(base_url=base_url, timeout=60) as client:
+        start = time.perf_counter()
+        responses = await asyncio.gather(*(client.get("/api/img", params={"url": url, "w": 640}) for _ in range(n)))
+        for r in responses:
+            r.raise_for_status()
+        return (time.perf_counter() - start) * 1000
+
+
+def fetched(client: httpx.Client) -> int:
+    for line in client.get("/metrics").text.splitlines():
+        if line.startswith('stadssurr_image_proxy_total{event="fetched"}'):
+            return int(float(line.split()[1]))
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--images", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=20)
+    args = parser.parse_args()
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    workdir = tempfile.mkdtemp(prefix="stadssurr-images-")
+    photos = os.path.join(workdir, "photos")
+    os.makedirs(photos)
+    make_photos(photos, args.images * 2 + 1)
+    origin = serve(photos)
+    engine = create_engine(f"sqlite:///{os.path.join(workdir, 'app.db')}")
+    Base.metadata.create_all(bind=engine)
+    engine.dispose()
+
+    process, base_url = start_server(workdir, 1, IMG_ALLOW_PRIVATE="1", IMG_ALLOWED_HOSTS='["127.0.0.1"]',
+                                     METRICS_SERVER_TIMING="0")
+    urls = [f"{origin}/photo{i}.jpg" for i in range(args.images)]
+    results: dict[str, list[float]] = {}
+    sizes: dict[str, list[int]] = {}
+    try:
+        with httpx.Client(base_url=base_url, timeout=60) as client:
+            original = [len(httpx.get(url).content) for url in urls]
+            for url in urls:
+                for name, params in (("cold  w=320 webp", {"w": 320}), ("new width w=640", {"w": 640}),
+                                     ("warm  w=320 webp", {"w": 320}), ("jpeg  w=320", {"w": 320, "fmt": "jpeg"})):
+                    ms, r = timed(client, url, **params)
+                    r.raise_for_status()
+                    results.setdefault(name, []).append(ms)
+                    sizes.setdefault(name, []).append(len(r.content))
+                etag = r.headers["etag"]
+                start = time.perf_counter()
+                r = client.get("/api/img", params={"url": url, "w": 320, "fmt": "jpeg"}, headers={"If-None-Match": etag})
+                assert r.status_code == 304, r.status_code
+                results.setdefault("304 revalidation", []).append((time.perf_counter() - start) * 1000)
+
+            print(f"original JPEG: {statistics.mean(original) / 1024:7.1f} KiB on average")
+            for name, times in results.items():
+                size = f"{statistics.mean(sizes[name]) / 1024:6.1f} KiB" if name in sizes else ""
+                print(f"{name:18} p50 {statistics.median(times):7.1f} ms   max {max(times):7.1f} ms   {size}")
+
+            before = fetched(client)
+            ms = asyncio.run(burst(base_url, f"{origin}/photo{args.images}.jpg", args.concurrency))
+            print(f"{args.concurrency} concurrent requests, one uncached image: {ms:.0f} ms, "
+                  f"{fetched(client) - before} source fetch(es)")
+
+            prefetched = [f"{origin}/photo{args.images + i}.jpg" for i in range(args.images)]
+            proxy = ImageProxy(DiskCache(os.path.join(workdir, "image_cache"), 2**30), ["127.0.0.1"], True, 2**24, 10)
+            with ThreadPoolExecutor(max_workers=4) as pool:
+                for name in ("prefetch, cold", "prefetch, unchanged"):
+                    start = time.perf_counter()
+                    fields = list(pool.map(proxy.prefetch, prefetched))
+                    print(f"{name:20} {(time.perf_counter() - start) * 1000 / len(prefetched):7.1f} ms per image (4 threads)")
+            print(f"placeholder: {statistics.mean(len(f['image_placeholder']) for f in fields):.0f} bytes as a data: URI, "
+                  f"size {fields[0]['image_width']}x{fields[0]['image_height']}")
+            before = fetched(client)
+            times = [timed(client, url, w=320)[0] for url in prefetched]
+            print(f"first request after prefetch: p50 {statistics.median(times):.1f} ms, "
+                  f"{fetched(client) - before} source fetch(es)")
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+
+
+if __name__ == "__main__":
+    main()
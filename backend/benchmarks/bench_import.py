@@ -0,0 +1,76 @@
+# benchmarks/bench_import.py
+"""Peak memory and time of the project import: json.load + ORM objects (the
+old loader) vs the streaming loader with batched Core inserts.
+
+Run from backend/:  python -m benchmarks.bench_import [--copies 20]
+
+The scraped projects.json is repeated --copies times into a temporary .json
+and .ndjson file; each variant imports into its own throwaway database.
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+
+from app.models import Project
+from app.seed import load_projects_from_json, project_row
+
+from .common import temp_database
+
+PROJECTS_JSON = os.path.join(os.path.dirname(__file__), "..", "data_scraped", "projects.json")
+
+
+def old_loader(db, path):
+    with open(path, "r", encoding="utf-8") as f:
+        projects_data = json.load(f)
+    for proj in projects_data:
+        db.add(Project(**project_row(proj)))
+    db.commit()
+
+
+def measure(loader, path) -> tuple[float, int, int]:
+    _, Session = temp_database()
+    with Session() as db:
+        tracemalloc.start()
+        start = time.perf_counter()
+        loader(db, path)
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        return elapsed, peak, db.query(Project).count()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--copies", type=int, default=20)
+    args = parser.parse_args()
+
+    with open(PROJECTS_JSON, encoding="utf-8") as f:
+        scraped = json.load(f)
+    tmpdir = tempfile.mkdtemp(prefix="stadssurr-import-")
+    json_path = os.path.join(tmpdir, "projects.json")
+    ndjson_path = os.path.join(tmpdir, "projects.ndjson")
+    with open(json_path, "w", encoding="utf-8") as f_json, open(ndjson_path, "w", encoding="utf-8") as f_nd:
+        f_json.write("[\n")
+        for n in range(args.copies):
+            for i, proj in enumerate(scraped):
+                if n or i:
+                    f_json.write(",\n")
+                json.dump(proj, f_json, ensure_ascii=False, indent=4)
+                f_nd.write(json.dumps(proj, ensure_ascii=False) + "\n")
+        f_json.write("\n]\n")
+    print(f"{len(scraped) * args.copies} projects, projects.json {os.path.getsize(json_path) / 2**20:.1f} MiB")
+
+    for name, loader, path in (
+        ("json.load + ORM", old_loader, json_path),
+        ("streamed .json", load_projects_from_json, json_path),
+        ("streamed .ndjson", load_projects_from_json, ndjson_path),
+    ):
+        elapsed, peak, rows = measure(loader, path)
+        print(f"{name:18} {elapsed * 1000:8.0f} ms   peak {peak / 2**20:7.1f} MiB   rows {rows}")
+
+
+if __name__ == "__main__":
+    main()
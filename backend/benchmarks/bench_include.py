@@ -0,0 +1,77 @@
+# benchmarks/bench_include.py
+"""Page-load time for the project and profile pages: the request waterfall
+the frontend makes today against one request with ?include=.
+
+Run from backend/:  python -m benchmarks.bench_include [--loads 200] [--rtt-ms 40]
+
+Starts uvicorn on the synthetic dataset and times each page load on the
+client as a logged-in user. --rtt-ms adds that much client-side delay per
+request to stand in for network round trips (TLS, mobile links), which is
+where the waterfall costs most; 0 measures server overhead alone.
+"""
+import argparse
+import logging
+import os
+import random
+import statistics
+import tempfile
+import time
+
+import httpx
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.database import Base
+from app.main import create_access_token
+
+from .bench_workers import start_server
+from .dataset import Scale, generate
+
+PAGES = {
+    "project waterfall": ["/api/projects/{p}", "/api/projects/{p}/comments", "/api/projects/{p}/news"],
+    "project ?include": ["/api/projects/{p}?include=comments,news"],
+    "profile waterfall": ["/api/users/{u}/activity", "/api/users/{u}/posts", "/api/users/{u}/followers", "/api/users/{u}/following"],
+    "profile ?include": ["/api/users/{u}/activity?include=posts,followers,following"],
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--loads", type=int, default=200, help="page loads per variant")
+    parser.add_argument("--rtt-ms", type=float, default=40.0)
+    parser.add_argument("--scale", type=float, default=0.5)
+    args = parser.parse_args()
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    workdir = tempfile.mkdtemp(prefix="stadssurr-include-")
+    engine = create_engine(f"sqlite:///{os.path.join(workdir, 'app.db')}")
+    Base.metadata.create_all(bind=engine)
+    scale = Scale.of(args.scale)
+    generate(sessionmaker(bind=engine), scale, progress=lambda line: None)
+    engine.dispose()
+
+    process, base_url = start_server(workdir, 1, METRICS_SERVER_TIMING="0")
+    headers = {"Authorization": f"Bearer {create_access_token(1)}"}
+    rng = random.Random(1)
+    print(f"{args.loads} loads per variant, {args.rtt_ms:g} ms simulated round trip")
+    try:
+        with httpx.Client(base_url=base_url, headers=headers) as client:
+            for name, paths in PAGES.items():
+                times = []
+                for _ in range(args.loads):
+                    ids = {"p": rng.randint(1, scale.projects), "u": rng.randint(1, scale.users)}
+                    start = time.perf_counter()
+                    for path in paths:
+                        time.sleep(args.rtt_ms / 1000)
+                        client.get(path.format(**ids)).raise_for_status()
+                    times.append((time.perf_counter() - start) * 1000)
+                times.sort()
+                print(f"{name:18} {len(paths)} request(s)   p50 {statistics.median(times):7.1f} ms   "
+                      f"p95 {times[int(len(times) * 0.95)]:7.1f} ms")
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+
+
+if __name__ == "__main__":
+    main()
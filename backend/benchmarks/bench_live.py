@@ -0,0 +1,178 @@
+# benchmarks/bench_live.py
+"""Live updates: open connections a worker holds and broadcast latency.
+
+Run from backend/:
+    python -m benchmarks.bench_live [--connections 500] [--events 50] [--transport sse,ws]
+    python -m benchmarks.bench_live --workers 2 --shared-state redis://localhost:6379/15
+
+Starts uvicorn on a small seeded database, opens --connections clients all
+subscribed to one project, then posts --events comments to it one at a
+time. Reports server memory per held connection and, per event, the time
+from sending the POST to each client receiving the pushed comment (p50/p99
+over all clients) and to the last client receiving it. With several
+workers the clients spread over them, so delivery crosses processes through
+--shared-state.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import resource
+import statistics
+import tempfile
+import time
+
+import httpx
+import websockets
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.database import Base
+from app.main import create_access_token
+
+from .bench_workers import start_server
+from .common import seed_dataset
+
+PROJECT_ID = 1
+TOPIC = f"project:{PROJECT_ID}"
+
+
+def server_rss(pid: int) -> int:
+    """Resident bytes of the server and its worker processes"""
+    def rss(p: int) -> int:
+        with open(f"/proc/{p}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+        return 0
+
+    total, pending = 0, [pid]
+    while pending:
+        p = pending.pop()
+        try:
+            total += rss(p)
+            with open(f"/proc/{p}/task/{p}/children") as f:
+                pending.extend(int(c) for c in f.read().split())
+        except FileNotFoundError:
+            pass
+    return total
+
+
+class Clients:
+    def __init__(self):
+        self.received: dict[int, list[float]] = {}
+        self.ready = 0
+
+    def record(self, data: dict):
+        content = data.get("content", "")
+        if content.startswith("bench "):
+            self.received.setdefault(int(content.split()[1]), []).append(time.perf_counter())
+
+    async def sse(self, client: httpx.AsyncClient, base_url: str, stop: asyncio.Event):
+        async with client.stream("GET", f"{base_url}/api/live/stream", params={"topics": TOPIC}) as response:
+            response.raise_for_status()
+            self.ready += 1
+            lines = response.aiter_lines()
+            while not stop.is_set():
+                line = await lines.__anext__()
+                if line.startswith("data: "):
+                    self.record(json.loads(line[6:]))
+
+    async def ws(self, base_url: str, stop: asyncio.Event):
+        url = base_url.replace("http://", "ws://") + f"/api/live/ws?topics={TOPIC}"
+        async with websockets.connect(url, max_queue=None) as socket:
+            self.ready += 1
+            while not stop.is_set():
+                self.record(json.loads(await socket.recv())["data"])
+
+
+async def run(base_url: str, pid: int, transport: str, connections: int, events: int) -> dict:
+    clients = Clients()
+    stop = asyncio.Event()
+    token = {"Authorization": f"Bearer {create_access_token(2)}"}
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+    async with httpx.AsyncClient(timeout=None, limits=limits) as client:
+        before = server_rss(pid)
+        if transport == "sse":
+            tasks = [asyncio.create_task(clients.sse(client, base_url, stop)) for _ in range(connections)]
+        else:
+            tasks = [asyncio.create_task(clients.ws(base_url, stop)) for _ in range(connections)]
+        deadline = time.monotonic() + 60
+        while clients.ready < connections and time.monotonic() < deadline:
+            failed = [t for t in tasks if t.done()]
+            if failed:
+                raise RuntimeError(f"{len(failed)} clients failed to connect: {failed[0].exception()}")
+            await asyncio.sleep(0.1)
+        await asyncio.sleep(0.5)
+        held = server_rss(pid) - before
+
+        sent: dict[int, float] = {}
+        post_ms = []
+        for seq in range(events):
+            sent[seq] = time.perf_counter()
+            r = await client.post(f"{base_url}/api/comments", headers=token,
+                                  json={"project_id": PROJECT_ID, "content": f"bench {seq}"})
+            r.raise_for_status()
+            post_ms.append((time.perf_counter() - sent[seq]) * 1000)
+            # wait for this event to reach everyone before the next one
+            deadline = time.monotonic() + 10
+            while len(clients.received.get(seq, ())) < clients.ready and time.monotonic() < deadline:
+                await asyncio.sleep(0.001)
+
+        stop.set()
+        for t in tasks:
+            t.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    each = sorted((at - sent[seq]) * 1000 for seq, times in clients.received.items() for at in times)
+    last = [(max(times) - sent[seq]) * 1000 for seq, times in clients.received.items()]
+    expected = events * connections
+    return {
+        "held": clients.ready,
+        "rss_per_conn": held / max(clients.ready, 1),
+        "delivered": len(each) / expected if expected else 0,
+        "post_ms": statistics.median(post_ms),
+        "p50": each[len(each) // 2] if each else 0,
+        "p99": each[int(len(each) * 0.99)] if each else 0,
+        "last": statistics.median(last) if last else 0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--connections", type=int, default=500)
+    parser.add_argument("--events", type=int, default=50)
+    parser.add_argument("--transport", default="sse,ws", help="comma separated: sse, ws")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--shared-state", default="memory://", help="needed for --workers > 1")
+    args = parser.parse_args()
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    # every connection is a file descriptor here and in the server, which inherits this limit
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (min(hard, max(soft, args.connections * 2 + 256)), hard))
+
+    workdir = tempfile.mkdtemp(prefix="stadssurr-live-")
+    engine = create_engine(f"sqlite:///{os.path.join(workdir, 'app.db')}")
+    Base.metadata.create_all(bind=engine)
+    seed_dataset(sessionmaker(bind=engine))
+    engine.dispose()
+
+    print(f"{args.connections} clients on {TOPIC}, {args.events} events, {args.workers} worker(s), {args.shared_state}")
+    for transport in args.transport.split(","):
+        process, base_url = start_server(
+            workdir, args.workers,
+            SHARED_STATE_URL=args.shared_state, LIVE_MAX_CONNECTIONS=str(args.connections * 2),
+        )
+        try:
+            r = asyncio.run(run(base_url, process.pid, transport, args.connections, args.events))
+        finally:
+            process.terminate()
+            process.wait(timeout=30)
+        print(f"{transport:4} held {r['held']:5}   {r['rss_per_conn'] / 1024:6.1f} KiB/conn   "
+              f"delivered {r['delivered']:6.1%}   POST {r['post_ms']:5.1f} ms   "
+              f"POST->client p50 {r['p50']:6.1f} ms  p99 {r['p99']:6.1f} ms  last client {r['last']:6.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+# benchmarks/bench_news.py
+"""News ingestion and listing: one ORM insert per article (the old endpoint)
+vs the batch upsert, and the first page of a project with many articles.
+
+Run from backend/:  python -m benchmarks.bench_news [--articles 5000]
+
+The batch upsert replays the crawler run a second time, which should update
+rows and insert nothing (the ORM path would now hit the unique index).
+"""
+import argparse
+import time
+
+from app.models import NewsArticle
+from app.news import load_news_page, upsert_news
+
+from .common import temp_database, seed_dataset
+
+PROJECT_ID = 1
+
+
+def articles(n: int) -> list[dict]:
+    return [{"project_id": PROJECT_ID, "title": f"Artikel {i}", "url": f"https://news.example.com/feed/{i}/?utm_source=feed",
+             "source": "DN", "date": f"2025-{i % 12 + 1:02d}-{i % 28 + 1:02d}"} for i in range(n)]
+
+
+def orm_insert(Session, items: list[dict]):
+    for item in items:
+        with Session() as db:
+            db.add(NewsArticle(**item))
+            db.commit()
+
+
+def batch_upsert(Session, items: list[dict]):
+    with Session() as db:
+        for i in range(0, len(items), 1000):  # the endpoint takes up to 1000 per request
+            upsert_news(db, items[i:i + 1000])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--articles", type=int, default=5000)
+    args = parser.parse_args()
+    items = articles(args.articles)
+
+    for name, fn, runs in (("one ORM insert each", orm_insert, 1), ("batch upsert", batch_upsert, 2)):
+        _, Session = temp_database()
+        seed_dataset(Session)
+        for run in range(1, runs + 1):
+            start = time.perf_counter()
+            fn(Session, items)
+            elapsed = time.perf_counter() - start
+            with Session() as db:
+                rows = db.query(NewsArticle).filter(NewsArticle.project_id == PROJECT_ID).count()
+            print(f"{name:20} run {run}: {args.articles / elapsed:8.0f} articles/s   rows for project {rows}")
+
+    with Session() as db:
+        start = time.perf_counter()
+        for _ in range(100):
+            load_news_page(db, PROJECT_ID, limit=20)
+        page = (time.perf_counter() - start) * 10
+        start = time.perf_counter()
+        for _ in range(10):
+            load_news_page(db, PROJECT_ID)
+        full = (time.perf_counter() - start) * 100
+    print(f"list: first page of 20 {page:.2f} ms, all {args.articles} {full:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+# benchmarks/bench_projections.py
+"""Memory held per request by the list/map project queries: full rows vs the
+load_only projections in main.py.
+
+Run from backend/:  python -m benchmarks.bench_projections [--copies 25]
+
+The scraped projects.json is inserted `--copies` times, then each query is run
+once with whole Project rows and once with its projection; the peak traced
+allocation while materializing the result is reported.
+"""
+import argparse
+import json
+import os
+import time
+import tracemalloc
+
+from sqlalchemy import insert
+from sqlalchemy.orm import undefer
+
+from app.main import PROJECT_LIST_COLUMNS, PROJECT_MAP_COLUMNS, PROJECT_FEED_COLUMNS
+from app.models import Project
+
+from .common import temp_database
+
+PROJECTS_JSON = os.path.join(os.path.dirname(__file__), "..", "data_scraped", "projects.json")
+
+
+def seed(Session, copies: int) -> int:
+    with open(PROJECTS_JSON, encoding="utf-8") as f:
+        scraped = json.load(f)
+    rows = [
+        {
+            "title": f"{proj['name']} ({n})",
+            "widget_text": proj.get("widget_text"),
+            "preamble": proj.get("preamble"),
+            "location": proj.get("location"),
+            "phase": proj.get("current_stage"),
+            "tidplan_html": proj.get("tidplan_html"),
+            "coordinates": proj.get("coordinates"),
+            "image_url": proj.get("image_url"),
+            "url": proj.get("url"),
+        }
+        for n in range(copies)
+        for proj in scraped
+    ]
+    with Session() as db:
+        db.execute(insert(Project), rows)
+        db.commit()
+    return len(rows)
+
+
+def measure(Session, build) -> tuple[float, int, int]:
+    """(seconds, peak bytes, rows) for materializing build(db).all() in a fresh session"""
+    with Session() as db:
+        tracemalloc.start()
+        start = time.perf_counter()
+        rows = build(db).all()
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        return elapsed, peak, len(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--copies", type=int, default=25, help="times to insert the scraped projects")
+    args = parser.parse_args()
+
+    _, Session = temp_database()
+    total = seed(Session, args.copies)
+    print(f"projects: {total}")
+
+    cases = (
+        ("/api/projects", PROJECT_LIST_COLUMNS),
+        ("/api/projects/geojson", PROJECT_MAP_COLUMNS),
+        ("/api/for_you (feed)", PROJECT_FEED_COLUMNS),
+    )
+    for name, projection in cases:
+        # the old routes loaded every column, including tidplan_html
+        old_s, old_peak, rows = measure(Session, lambda db: db.query(Project).options(undefer("*")))
+        new_s, new_peak, _ = measure(Session, lambda db: db.query(Project).options(projection))
+        print(f"{name:24} full rows: {old_peak / 1024:8.0f} KiB {old_s * 1000:7.1f} ms   "
+              f"projected: {new_peak / 1024:8.0f} KiB {new_s * 1000:7.1f} ms   "
+              f"{old_peak / max(rows, 1):6.0f} -> {new_peak / max(rows, 1):5.0f} B/row")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+# benchmarks/bench_rate_limit.py
+"""Per-request cost of the rate-limit middleware, and token-bucket eviction.
+
+Run from backend/:  python -m benchmarks.bench_rate_limit [--requests 200000] [--url redis://localhost:6379/15]
+
+Calls the middleware directly around a no-op app, so the numbers are the
+middleware alone: a route without a rule, a limited route keyed by JWT user
+and by IP, a throttled request, and the shared (fixed-window) store on
+memory:// and, with --url, on Redis.
+"""
+import argparse
+import asyncio
+import time
+
+from app.main import app, create_access_token, verify_access_token
+from app.rate_limit import RateLimitMiddleware, Rule, SharedWindows, TokenBuckets
+from app.shared_state import create_shared_state
+
+RULES = {"POST /api/votes": "1000000000/second"}
+TIGHT = {"POST /api/votes": "1/hour"}
+
+
+async def noop(scope, receive, send):
+    pass
+
+
+async def drop(message):
+    pass
+
+
+def scope(method: str, path: str, headers: list, client: str = "10.0.0.1") -> dict:
+    return {"type": "http", "app": app, "method": method, "path": path, "root_path": "",
+            "headers": headers, "client": (client, 50000), "query_string": b""}
+
+
+async def per_request_us(middleware, make_scope, n: int) -> float:
+    start = time.perf_counter()
+    for i in range(n):
+        await middleware(make_scope(i), None, drop)
+    return (time.perf_counter() - start) / n * 1e6
+
+
+async def run(n: int, url: str):
+    auth = [(b"authorization", f"Bearer {create_access_token(1)}".encode())]
+    local = RateLimitMiddleware(noop, RULES, verify_access_token, TokenBuckets())
+    print(f"{'no middleware (baseline)':34} {await per_request_us(noop, lambda i: scope('POST', '/api/votes', auth), n):7.2f} µs")
+    cases = [
+        ("route without a rule", local, lambda i: scope("GET", "/api/projects/1", auth)),
+        ("limited route, JWT user", local, lambda i: scope("POST", "/api/votes", auth)),
+        ("limited route, 1000 IPs", local, lambda i: scope("POST", "/api/votes", [], f"10.0.{i % 1000 // 250}.{i % 250}")),
+        ("throttled (429)", RateLimitMiddleware(noop, TIGHT, verify_access_token), lambda i: scope("POST", "/api/votes", auth)),
+        ("shared windows, memory://", RateLimitMiddleware(noop, RULES, verify_access_token, SharedWindows(create_shared_state("memory://"))),
+         lambda i: scope("POST", "/api/votes", auth)),
+    ]
+    if url:
+        cases.append((f"shared windows, {url}", RateLimitMiddleware(noop, RULES, verify_access_token, SharedWindows(create_shared_state(url))),
+                      lambda i: scope("POST", "/api/votes", auth)))
+    for name, middleware, make_scope in cases:
+        await per_request_us(middleware, make_scope, 100)  # bind routes, warm caches
+        count = n if "redis" not in name else min(n, 5000)
+        print(f"{name:34} {await per_request_us(middleware, make_scope, count):7.2f} µs")
+
+
+def eviction(keys: int):
+    buckets = TokenBuckets()
+    rule = Rule.parse("POST /api/votes", "60/minute")
+    for i in range(keys):
+        buckets.acquire(rule, f"ip:{i}")
+    start = time.perf_counter()
+    kept = buckets.sweep(time.monotonic() + 0.5)
+    mid = (time.perf_counter() - start) * 1000
+    removed = buckets.sweep(time.monotonic() + 61)
+    print(f"sweep of {keys} buckets: {kept} evicted while refilling ({mid:.1f} ms), {removed} evicted once full, {len(buckets)} left")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=200_000)
+    parser.add_argument("--url", default="", help="redis:// URL for the shared store")
+    args = parser.parse_args()
+    asyncio.run(run(args.requests, args.url))
+    eviction(100_000)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+# benchmarks/bench_serialization.py
+"""Encoding cost of list responses: dicts through jsonable_encoder + stdlib json
+(FastAPI's default path) vs records rendered by FastJSONResponse.
+
+Run from backend/:  python -m benchmarks.bench_serialization [--rows 10000]
+"""
+import argparse
+import time
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from app.records import ProjectListItem, Feature, Point, ProjectFeatureProperties, feature_collection
+from app.serialization import FastJSONResponse, orjson
+
+# about the size of the 16 px WebP data: URI that scrape.py --images stores
+PLACEHOLDER = "data:image/webp;base64," + "UklGRkQAAABXRUJQVlA4IDgAAAD" * 7
+
+
+def project_rows(n: int) -> list[ProjectListItem]:
+    return [
+        ProjectListItem(
+            id=i,
+            title=f"Kvarteret Exempel {i}",
+            description="Detaljplan för nya bostäder, förskola och en park vid vattnet. " * 3,
+            location="Södermalm",
+            phase="Samråd",
+            comments_count=i % 17,
+            upvotes=i % 101,
+            downvotes=i % 13,
+            user_vote=None if i % 3 else "upvote",
+            latitude=59.3 + i * 1e-5,
+            longitude=18.0 + i * 1e-5,
+            images=f"https://vaxer.stockholm/siteassets/projekt/{i}/bild.jpg",
+            image_width=2400,
+            image_height=1600,
+            image_placeholder=PLACEHOLDER,
+        )
+        for i in range(n)
+    ]
+
+
+def geo_rows(n: int) -> dict:
+    return feature_collection([
+        Feature(
+            geometry=Point(coordinates=(18.0 + i * 1e-5, 59.3 + i * 1e-5)),
+            properties=ProjectFeatureProperties(
+                id=i, title=f"Kvarteret Exempel {i}", phase="Samråd", location="Södermalm",
+                widget_text="Nya bostäder vid vattnet", thumbnail=f"https://vaxer.stockholm/{i}.jpg",
+                image_width=2400, image_height=1600, image_placeholder=PLACEHOLDER,
+            ),
+        )
+        for i in range(n)
+    ])
+
+
+def best_of(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=10_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"orjson: {'yes' if orjson else 'no (stdlib fallback)'}, rows: {args.rows}")
+    for name, records in (("/api/projects", project_rows(args.rows)), ("geojson", geo_rows(args.rows))):
+        as_dicts = jsonable_encoder(records)  # what the old routes built by hand
+
+        old = best_of(lambda: JSONResponse(jsonable_encoder(as_dicts)), args.repeat)
+        new = best_of(lambda: FastJSONResponse(records), args.repeat)
+        size = len(FastJSONResponse(records).body)
+        print(f"{name:14} dicts+jsonable_encoder+json: {old * 1000:8.1f} ms   records+FastJSONResponse: {new * 1000:7.1f} ms   "
+              f"x{old / new:.1f}   body {size / 1024:.0f} KiB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+# benchmarks/bench_startup.py
+"""Cold-start time on an empty database: until the app serves requests (live)
+and until the JSON import has finished (ready), per SEED_ON_STARTUP mode.
+
+Run from backend/:  python -m benchmarks.bench_startup [--runs 3]
+
+Each run is a fresh interpreter in an empty temp directory, so app.db is
+created from scratch. Also compares the mock-user password hash with the
+real one.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from passlib.hash import pbkdf2_sha256
+
+from app.auth import hash_fixture_password
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD = """
+import json, time
+start = time.perf_counter()
+from fastapi.testclient import TestClient
+from app.main import app
+imported = time.perf_counter()
+with TestClient(app) as client:
+    live = time.perf_counter()
+    while (r := client.get("/api/health/ready")).status_code != 200:
+        if r.json()["seed"]["state"] == "failed":
+            raise SystemExit(r.json()["seed"]["error"])
+        time.sleep(0.01)
+    ready = time.perf_counter()
+print(json.dumps({"import": imported - start, "live": live - start, "ready": ready - start}))
+"""
+
+
+def cold_start(mode: str) -> dict:
+    with tempfile.TemporaryDirectory(prefix="stadssurr-startup-") as cwd:
+        env = {**os.environ, "PYTHONPATH": BACKEND, "SEED_ON_STARTUP": mode}
+        out = subprocess.run([sys.executable, "-c", CHILD], cwd=cwd, env=env, capture_output=True, text=True, check=True)
+        return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    for mode in ("blocking", "background"):
+        runs = [cold_start(mode) for _ in range(args.runs)]
+        best = {k: min(r[k] for r in runs) for k in runs[0]}
+        print(f"{mode:10}  import {best['import'] * 1000:6.0f} ms   live {best['live'] * 1000:6.0f} ms   ready {best['ready'] * 1000:6.0f} ms")
+
+    with open(os.path.join(BACKEND, "mock_data", "users.json"), encoding="utf-8") as f:
+        emails = [u["email"] for u in json.load(f)]
+    for name, hash_fn in (("pbkdf2_sha256 default", pbkdf2_sha256.hash), ("fixture hash", hash_fixture_password)):
+        start = time.perf_counter()
+        for email in emails:
+            hash_fn(email)
+        print(f"{name:22} {len(emails)} mock users: {(time.perf_counter() - start) * 1000:7.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
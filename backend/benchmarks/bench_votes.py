@@ -0,0 +1,96 @@
+# benchmarks/bench_votes.py
+"""Sustained vote throughput: direct transactional toggles vs the write-behind buffer.
+
+Run from backend/:  python -m benchmarks.bench_votes [--threads 16] [--seconds 5] [--users 2000]
+
+Every thread votes on the same project as a rotating set of users, which is the
+"project goes viral" case. After each run the final rows are checked against
+the state each mode reported (one vote per user, tallies match).
+"""
+import argparse
+import os
+import random
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from app.models import User, Project, Vote
+from app.toggles import toggle_vote
+from app.write_buffer import WriteBuffer
+
+from .common import temp_database
+
+
+def run(mode: str, threads: int, seconds: float, n_users: int) -> dict:
+    engine, Session = temp_database()
+    with Session() as db:
+        db.add(Project(id=1, title="Viral", coordinates={}))
+        db.add_all(User(id=i, name=f"Voter {i}", email=f"voter{i}@example.com", password_hash="x") for i in range(1, n_users + 1))
+        db.commit()
+
+    buffer = None
+    if mode == "buffered":
+        buffer = WriteBuffer(engine, os.path.join(os.path.dirname(engine.url.database), "votes.journal"))
+        buffer.start()
+
+    deadline = time.perf_counter() + seconds
+    final_state: dict[int, str | None] = {}
+    state_lock = threading.Lock()
+    # users are partitioned across threads so each user's clicks stay ordered
+    def worker(t):
+        rng = random.Random(t)
+        my_users = list(range(t + 1, n_users + 1, threads))
+        done = 0
+        with Session() as db:
+            while time.perf_counter() < deadline:
+                user_id = rng.choice(my_users)
+                vote_type = rng.choice(("upvote", "downvote"))
+                if buffer:
+                    result = buffer.toggle_vote(db, "project_vote", 1, user_id, vote_type)
+                else:
+                    result = toggle_vote(db, Vote, "project_id", 1, user_id, vote_type)
+                db.rollback()  # end the read transaction between clicks
+                with state_lock:
+                    final_state[user_id] = result["user_vote"]
+                done += 1
+        return done
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        total = sum(pool.map(worker, range(threads)))
+    elapsed = time.perf_counter() - start
+    if buffer:
+        buffer.stop()
+
+    with Session() as db:
+        rows = db.query(Vote.user_id, Vote.vote_type).filter(Vote.project_id == 1).all()
+    engine.dispose()
+
+    expected = {u: v for u, v in final_state.items() if v}
+    actual = dict(rows)
+    assert len(rows) == len(actual), "more than one vote per user"
+    assert actual == expected, "final votes differ from acknowledged state"
+    return {
+        "mode": mode,
+        "votes": total,
+        "seconds": round(elapsed, 2),
+        "votes_per_second": round(total / elapsed),
+        "tally": dict(Counter(actual.values())),
+        "flushes": buffer.stats["flushes"] if buffer else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--users", type=int, default=2000)
+    args = parser.parse_args()
+
+    for mode in ("direct", "buffered"):
+        print(run(mode, args.threads, args.seconds, args.users))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+# benchmarks/bench_workers.py
+"""Throughput against the number of worker processes.
+
+Run from backend/:
+    python -m benchmarks.bench_workers [--workers 1,2,4] [--scale 1] [--seconds 10]
+
+Generates the synthetic dataset into a temporary directory as app.db, then
+for each worker count starts `uvicorn app.main:app --workers N` there (WAL
+mode, seeding off) and drives the read scenarios from benchmarks/loadtest.py.
+Reports RPS per scenario and the speed-up relative to the first worker count.
+Scaling is bounded by the CPU count of the machine, which is printed.
+"""
+import argparse
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.database import Base
+from app.main import create_access_token
+
+from .dataset import Scale, generate
+from .loadtest import TOKEN_USERS, free_port, run_scenario
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+READ_SCENARIOS = ["list", "detail", "geojson", "for_you"]
+
+
+def start_server(workdir: str, workers: int, **extra_env: str) -> tuple[subprocess.Popen, str]:
+    port = free_port()
+    env = dict(
+        os.environ,
+        PYTHONPATH=BACKEND_DIR,
+        SQLITE_WAL="1",
+        SEED_ON_STARTUP="off",
+        METRICS_SERVER_TIMING="1",
+        RATE_LIMIT_ENABLED="0",
+    )
+    env.update(extra_env)
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--workers", str(workers), "--log-level", "warning", "--no-access-log"],
+        cwd=workdir, env=env,
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(f"{base_url}/api/health/ready", timeout=1).status_code == 200:
+                return process, base_url
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError(f"server with {workers} workers did not become ready")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", default="1,2,4", help="comma separated worker counts")
+    parser.add_argument("--scale", type=float, default=1.0)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--seconds", type=float, default=10.0, help="per scenario and worker count")
+    args = parser.parse_args()
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    worker_counts = [int(n) for n in args.workers.split(",") if n.strip()]
+
+    workdir = tempfile.mkdtemp(prefix="stadssurr-workers-")
+    engine = create_engine(f"sqlite:///{os.path.join(workdir, 'app.db')}")
+    Base.metadata.create_all(bind=engine)
+    scale = Scale.of(args.scale)
+    generate(sessionmaker(bind=engine), scale, seed=args.seed, progress=lambda line: None)
+    engine.dispose()
+    ctx = {
+        "users": scale.users,
+        "projects": scale.projects,
+        "tokens": {u: {"Authorization": f"Bearer {create_access_token(u)}"} for u in range(1, min(TOKEN_USERS, scale.users) + 1)},
+    }
+    print(f"{os.cpu_count()} CPUs, dataset scale {args.scale}, {args.concurrency} clients, {args.seconds:g}s per run")
+
+    rps: dict[int, dict[str, float]] = {}
+    for workers in worker_counts:
+        process, base_url = start_server(workdir, workers)
+        try:
+            rps[workers] = {}
+            for name in READ_SCENARIOS:
+                result = run_scenario(base_url, name, ctx, args.concurrency, args.seconds, args.seed)
+                rps[workers][name] = result["rps"]
+                if result["errors"]:
+                    print(f"  {workers} workers, {name}: {result['errors']} errors {result['statuses']}")
+        finally:
+            process.terminate()
+            process.wait(timeout=30)
+
+    first = worker_counts[0]
+    print(f"{'workers':>7} " + " ".join(f"{name:>16}" for name in READ_SCENARIOS))
+    for workers in worker_counts:
+        cells = []
+        for name in READ_SCENARIOS:
+            speedup = rps[workers][name] / rps[first][name] if rps[first][name] else 0
+            cells.append(f"{rps[workers][name]:8.1f} ({speedup:4.2f}x)")
+        print(f"{workers:7} " + " ".join(cells))
+
+
+if __name__ == "__main__":
+    main()
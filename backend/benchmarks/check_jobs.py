@@ -0,0 +1,176 @@
+# benchmarks/check_jobs.py
+"""Behaviour check for the background job runner.
+
+Run from backend/:  python -m benchmarks.check_jobs
+
+Covers trigger arithmetic, single flight with several runners polling one
+SQLite file, coalescing of runs missed during downtime, retry with backoff,
+lease recovery and the built-in reconcile job. Exits 1 on the first failed expectation.
+"""
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+
+from app.jobs import Cron, Interval, Job, JobRunner, enqueue, parse_trigger, reconcile_counters
+from app.models import JobRun, User
+
+from .common import seed_dataset, temp_database
+
+
+def check(name: str, condition: bool):
+    print(f"{'ok  ' if condition else 'FAIL'} {name}")
+    if not condition:
+        sys.exit(1)
+
+
+def triggers():
+    t = datetime(2025, 3, 14, 10, 17, 30)  # a Friday
+    check("interval", Interval(90).next_after(t) == t + timedelta(seconds=90))
+    check("cron daily", Cron("30 3 * * *").next_after(t) == datetime(2025, 3, 15, 3, 30))
+    check("cron every 15 min", Cron("*/15 * * * *").next_after(t) == datetime(2025, 3, 14, 10, 30))
+    check("cron weekdays only", Cron("0 9 * * 1-5").next_after(t) == datetime(2025, 3, 17, 9, 0))
+    check("cron sunday as 7", Cron("0 0 * * 7").next_after(t) == datetime(2025, 3, 16, 0, 0))
+    check("cron day of month or weekday", Cron("0 12 1 * 1").next_after(t) == datetime(2025, 3, 17, 12, 0))
+    check("cron month rollover", Cron("0 0 1 1 *").next_after(t) == datetime(2026, 1, 1, 0, 0))
+    check("cron leap day", Cron("0 0 29 2 *").next_after(t) == datetime(2028, 2, 29, 0, 0))
+    check("parse every 6h", parse_trigger("every 6h") == Interval(6 * 3600))
+    check("parse empty is manual", parse_trigger("") is None)
+    try:
+        Cron("61 * * * *")
+        check("cron rejects out of range", False)
+    except ValueError:
+        check("cron rejects out of range", True)
+
+
+def single_flight():
+    _, Session = temp_database()
+    active, overlaps, calls = [0], [0], [0]
+    lock = threading.Lock()
+
+    def slow(db):
+        with lock:
+            active[0] += 1
+            calls[0] += 1
+            overlaps[0] = max(overlaps[0], active[0])
+        time.sleep(0.3)
+        with lock:
+            active[0] -= 1
+
+    jobs = {"slow": Job("slow", slow, Interval(3600))}
+    with Session() as db:
+        check("enqueue inserts", enqueue(db, "slow"))
+        check("second enqueue is a no-op", not enqueue(db, "slow"))
+    runners = [JobRunner(Session, jobs) for _ in range(4)]
+    threads = [threading.Thread(target=r.tick) for r in runners]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    check("one run among four runners", calls[0] == 1 and overlaps[0] == 1)
+    with Session() as db:
+        runs = db.query(JobRun).order_by(JobRun.id).all()
+        check("run recorded as done with a duration", runs[0].status == "done" and runs[0].duration_seconds >= 0.3)
+
+    runners[0].tick()
+    with Session() as db:
+        pending = db.query(JobRun).filter(JobRun.status == "queued").one()
+        check("next occurrence scheduled from the last run",
+              pending.run_at == (datetime.fromisoformat(runs[0].run_at) + timedelta(hours=1)).isoformat(timespec="seconds"))
+
+
+def missed_runs():
+    _, Session = temp_database()
+    calls = [0]
+    runner = JobRunner(Session, {"hourly": Job("hourly", lambda db: calls.__setitem__(0, calls[0] + 1), Interval(3600))})
+    now = datetime.now()
+    with Session() as db:
+        # last ran two days ago, before some downtime
+        db.add(JobRun(job="hourly", status="done", attempts=1, run_at=(now - timedelta(days=2)).isoformat(timespec="seconds")))
+        db.commit()
+    for i in range(5):
+        runner.tick(now + timedelta(seconds=i))
+    check("missed occurrences coalesce into one run", calls[0] == 1)
+    with Session() as db:
+        pending = db.query(JobRun).filter(JobRun.status == "queued").one()
+        check("next occurrence counted from now", pending.run_at >= (now + timedelta(hours=1)).isoformat(timespec="seconds"))
+
+
+def retries():
+    _, Session = temp_database()
+    attempts = [0]
+
+    def flaky(db):
+        attempts[0] += 1
+        if attempts[0] < 3:
+            raise RuntimeError("upstream timeout")
+        return "third time lucky"
+
+    runner = JobRunner(Session, {"flaky": Job("flaky", flaky, max_attempts=3, retry_delay=10)})
+    with Session() as db:
+        enqueue(db, "flaky")
+    now = datetime.now()
+    runner.tick(now)
+    with Session() as db:
+        run = db.query(JobRun).one()
+        check("failure requeued", run.status == "queued" and run.attempts == 1 and "upstream timeout" in run.result)
+    runner.tick(now + timedelta(seconds=5))
+    check("retry waits for the backoff", attempts[0] == 1)
+    runner.tick(now + timedelta(seconds=11))
+    runner.tick(now + timedelta(seconds=40))
+    with Session() as db:
+        run = db.query(JobRun).one()
+        check("succeeds on the third attempt", run.status == "done" and run.attempts == 3 and run.result == "third time lucky")
+
+    runner.jobs = {"broken": Job("broken", lambda db: 1 / 0, max_attempts=2, retry_delay=0)}
+    with Session() as db:
+        enqueue(db, "broken")
+    runner.tick()
+    runner.tick()
+    with Session() as db:
+        run = db.query(JobRun).filter(JobRun.job == "broken").one()
+        check("gives up after max_attempts", run.status == "failed" and run.attempts == 2)
+
+
+def lease_recovery():
+    _, Session = temp_database()
+    calls = [0]
+    job = Job("lease", lambda db: calls.__setitem__(0, calls[0] + 1), lease=60)
+    runner = JobRunner(Session, {"lease": job})
+    with Session() as db:
+        enqueue(db, "lease")
+        # a runner that claimed the run and died
+        run = db.query(JobRun).one()
+        run.status, run.attempts, run.locked_by = "running", 1, "gone:1"
+        run.locked_until = (datetime.now() + timedelta(seconds=60)).isoformat(timespec="seconds")
+        db.commit()
+    runner.tick()
+    check("live lease is respected", calls[0] == 0)
+    runner.tick(datetime.now() + timedelta(seconds=120))
+    runner.tick(datetime.now() + timedelta(seconds=300))
+    check("expired lease is retried", calls[0] == 1)
+
+
+def reconcile():
+    _, Session = temp_database()
+    seed_dataset(Session)
+    with Session() as db:
+        db.query(User).update({User.followers_count: 999})
+        db.commit()
+        summary = reconcile_counters(db)
+        check("reconcile fixes follower counts", db.query(User).filter(User.followers_count == 999).count() == 0)
+    print(f"     {summary}")
+
+
+def main():
+    triggers()
+    single_flight()
+    missed_runs()
+    retries()
+    lease_recovery()
+    reconcile()
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+# benchmarks/check_query_budgets.py
+"""Fail if a main read route runs more SQL statements than its budget.
+
+Run from backend/:  python -m benchmarks.check_query_budgets [--scale 2]
+
+Counts come from the Server-Timing header written by MetricsMiddleware. Each
+route is checked at --scale and at 1; a count that grows with the dataset is
+a per-row (N+1) query and fails even when it is under budget.
+"""
+import argparse
+import os
+import re
+import sys
+
+os.environ["METRICS_SERVER_TIMING"] = "1"  # before the app reads its settings
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+from app.main import app, get_db, create_access_token  # noqa: E402
+
+from .common import temp_database, seed_dataset  # noqa: E402
+
+# route -> max statements as the logged-in user 1, including the ETag version lookup
+BUDGETS = {
+    "/api/projects": 5,
+    "/api/projects/geojson": 2,
+    "/api/projects/1": 6,
+    "/api/projects/1?include=comments,news": 10,
+    "/api/projects/1/comments": 3,
+    "/api/projects/1/news": 3,
+    "/api/projects/1/milestones": 3,
+    "/api/projects/1?include=comments,news,milestones": 11,
+    "/api/milestones/upcoming?on=2000-01-01": 1,
+    "/api/posts": 5,
+    "/api/posts/geojson": 2,
+    "/api/posts/1": 6,
+    "/api/posts/1/comments": 3,
+    "/api/users?q=anv": 2,
+    "/api/users/1/posts": 4,
+    "/api/users/1/followers": 3,
+    "/api/users/1/following": 3,
+    "/api/users/1/activity": 3,
+    "/api/users/1/activity?include=posts,followers,following": 10,
+    "/api/for_you": 8,
+}
+QUERIES = re.compile(r'desc="(\d+) queries"')
+
+
+def query_counts(scale: int) -> dict[str, int]:
+    engine, Session = temp_database()
+    seed_dataset(Session, scale=scale)
+
+    def override_db():
+        db = Session()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app.dependency_overrides[get_db] = override_db
+    headers = {"Authorization": f"Bearer {create_access_token(1)}"}
+    counts = {}
+    try:
+        client = TestClient(app)  # no lifespan: the real app.db is not opened
+        for path in BUDGETS:
+            response = client.get(path, headers=headers)
+            if response.status_code != 200:
+                raise SystemExit(f"{path}: HTTP {response.status_code}")
+            counts[path] = int(QUERIES.search(response.headers["server-timing"]).group(1))
+    finally:
+        app.dependency_overrides.clear()
+        engine.dispose()
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scale", type=int, default=3)
+    args = parser.parse_args()
+
+    small = query_counts(1)
+    large = query_counts(args.scale)
+    ok = True
+    for path, budget in BUDGETS.items():
+        status = "ok"
+        if budget is None:
+            status = "not enforced"
+        elif large[path] > budget:
+            status = "OVER BUDGET"
+        elif large[path] != small[path]:
+            status = "GROWS WITH DATA"
+        ok &= status in ("ok", "not enforced")
+        print(f"{path:28} {small[path]:4} -> {large[path]:4} queries (budget {budget or '-':>3})  {status}")
+    print("OK" if ok else "FAILED")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
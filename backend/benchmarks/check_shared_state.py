@@ -0,0 +1,71 @@
+# benchmarks/check_shared_state.py
+"""Behaviour check for a shared-state backend.
+
+Run from backend/:
+    python -m benchmarks.check_shared_state                           # memory://
+    python -m benchmarks.check_shared_state --url redis://localhost:6379/15
+
+Against Redis, use a scratch database: keys under stadssurr:check:* are written
+and deleted. Exits 1 on the first failed expectation.
+"""
+import argparse
+import sys
+import threading
+import time
+import uuid
+
+from app.shared_state import InvalidationBus, create_shared_state
+
+
+def check(name: str, condition: bool):
+    print(f"{'ok  ' if condition else 'FAIL'} {name}")
+    if not condition:
+        sys.exit(1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default="memory://")
+    args = parser.parse_args()
+
+    state = create_shared_state(args.url)
+    key = f"check:{uuid.uuid4().hex}"
+
+    check("get missing key", state.get(key) is None)
+    state.set(key, b"v1")
+    check("set/get", state.get(key) == b"v1")
+    state.delete(key)
+    check("delete", state.get(key) is None)
+
+    state.set(key, b"short", ttl=0.2)
+    time.sleep(0.4)
+    check("ttl expiry", state.get(key) is None)
+
+    counter = f"{key}:n"
+    check("incr creates", state.incr(counter, ttl=0.5) == 1)
+    check("incr adds", state.incr(counter, 4, ttl=0.5) == 5)
+    time.sleep(0.7)
+    check("incr ttl from creation", state.incr(counter, ttl=0.5) == 1)
+    state.delete(counter)
+
+    # two buses on separate connections stand in for two workers; memory://
+    # has no second process to reach, so there the bus only delivers locally
+    separate = not args.url.startswith("memory://")
+    other = create_shared_state(args.url) if separate else state
+    received = []
+    done = threading.Event()
+    listener = InvalidationBus(other)
+    listener.register("check", lambda k: (received.append(k), done.set()))
+    time.sleep(0.3)  # let the subscription reach the server
+    InvalidationBus(state).publish("check", 42)
+    done.wait(2)
+    check("invalidation reaches the other worker" if separate else "invalidation delivered locally", received == ["42"])
+
+    state.close()
+    if separate:
+        other.close()
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+# benchmarks/common.py
+import os
+import random
+import tempfile
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app import activity, tidplan
+from app.database import Base
+from app.models import (
+    User, Project, Comment, CommentLike, Vote, Post, PostComment, PostVote, UserFollow, NewsArticle,
+)
+
+
+def temp_database():
+    """(engine, Session) for a throwaway SQLite file with the app schema created"""
+    tmpdir = tempfile.mkdtemp(prefix="stadssurr-bench-")
+    engine = create_engine(
+        f"sqlite:///{os.path.join(tmpdir, 'bench.db')}",
+        connect_args={"check_same_thread": False, "timeout": 30},
+    )
+    Base.metadata.create_all(bind=engine)
+    return engine, sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+def seed_dataset(Session, scale: int = 1, seed: int = 1) -> dict:
+    """Small deterministic dataset: every table the read routes touch gets rows.
+
+    User 1 follows a handful of users and has commented on and voted for
+    several projects, so the per-user routes have something to return.
+    """
+    rng = random.Random(seed)
+    n_users, n_projects, n_posts = 20 * scale, 30 * scale, 20 * scale
+    with Session() as db:
+        db.add_all(User(id=i, name=f"Användare {i}", email=f"user{i}@example.com", password_hash="x", bio="Hej")
+                   for i in range(1, n_users + 1))
+        db.add_all(
+            Project(id=i, title=f"Projekt {i}", preamble="Nya bostäder. " * 5, widget_text="Bostäder",
+                    location="Södermalm", phase=rng.choice(["Samråd", "Granskning", "Antagande"]),
+                    tidplan_html="<ul><li>2025: Samråd</li></ul>",
+                    coordinates={"latitude": 59.3 + i / 1000, "longitude": 18.0 + i / 1000},
+                    image_url=f"https://example.com/{i}.jpg")
+            for i in range(1, n_projects + 1)
+        )
+        db.add_all(
+            Post(id=i, title=f"Inlägg {i}", content="Vad tycker ni om parken?", created_at=f"2025-01-{i % 28 + 1:02d}T12:00:00",
+                 user_id=rng.randint(1, n_users), coordinates={"latitude": 59.3, "longitude": 18.0})
+            for i in range(1, n_posts + 1)
+        )
+        db.flush()
+        comment_id = 0
+        for project_id in range(1, n_projects + 1):
+            for _ in range(5):
+                comment_id += 1
+                author = 1 if project_id <= 8 * scale and comment_id % 5 == 0 else rng.randint(2, n_users)
+                db.add(Comment(id=comment_id, project_id=project_id, user_id=author, content="Bra förslag",
+                               created_at=f"2025-02-{comment_id % 28 + 1:02d}T10:00:{comment_id % 60:02d}"))
+            voters = rng.sample(range(1, n_users + 1), k=min(10, n_users))
+            db.add_all(Vote(project_id=project_id, user_id=u, vote_type=rng.choice(["upvote", "downvote"])) for u in voters)
+            db.add(NewsArticle(project_id=project_id, title="Nyhet", url=f"https://news.example.com/{project_id}",
+                               date="2025-03-01"))
+        db.flush()
+        for c in range(1, comment_id + 1, 3):
+            db.add(CommentLike(comment_id=c, user_id=rng.randint(1, n_users)))
+        for post_id in range(1, n_posts + 1):
+            for k in range(3):
+                db.add(PostComment(post_id=post_id, user_id=rng.randint(1, n_users), content="Håller med",
+                                   created_at=f"2025-02-01T10:00:0{k}"))
+            db.add_all(PostVote(post_id=post_id, user_id=u, vote_type="upvote") for u in rng.sample(range(1, n_users + 1), k=5))
+        for followed in range(2, 7):
+            db.add(UserFollow(follower_id=1, followed_id=followed, created_at="2025-01-01T00:00:00"))
+            db.add(UserFollow(follower_id=followed, followed_id=1, created_at="2025-01-01T00:00:00"))
+        db.query(User).filter(User.id.in_(range(1, 7))).update({User.followers_count: 1}, synchronize_session=False)
+        db.query(User).filter(User.id == 1).update({User.followers_count: 5}, synchronize_session=False)
+        db.commit()
+        activity.rebuild(db)
+        tidplan.rebuild(db)
+    return {"users": n_users, "projects": n_projects, "posts": n_posts, "comments": comment_id}
@@ -0,0 +1,146 @@
+# benchmarks/dataset.py
+"""Synthetic dataset at a configurable scale, inserted through the app models.
+
+    python -m benchmarks.dataset --scale 10 --db /tmp/stadssurr-10.db
+
+Scale 1 is roughly the size of the scraped data (400 projects) with 1000
+users; everything grows linearly. Generation is seeded, so the same scale and
+seed always produce the same rows.
+"""
+import argparse
+import random
+import time
+from dataclasses import dataclass, asdict
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, insert, select, update, func
+from sqlalchemy.orm import sessionmaker
+
+from app import activity, tidplan
+from app.database import Base
+from app.models import normalize_name, User, Project, Comment, CommentLike, Vote, Post, PostComment, PostVote, UserFollow
+
+PHASES = ["Samråd", "Granskning", "Antagande", "Genomförande", "Klart"]
+AREAS = ["Södermalm", "Kungsholmen", "Vasastan", "Hammarby sjöstad", "Bromma", "Skarpnäck", "Kista"]
+BATCH = 5000
+
+
+@dataclass
+class Scale:
+    users: int
+    projects: int
+    posts: int
+    comments_per_project: int = 8
+    votes_per_project: int = 25
+    comments_per_post: int = 4
+    votes_per_post: int = 10
+    likes_per_comment: float = 0.5
+    follows_per_user: int = 10
+
+    @classmethod
+    def of(cls, factor: float) -> "Scale":
+        return cls(users=int(1000 * factor), projects=int(400 * factor), posts=int(300 * factor))
+
+
+def _batches(rows):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= BATCH:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def generate(Session, scale: Scale, seed: int = 1, progress=print) -> dict[str, int]:
+    """Insert the dataset and return row counts per table. Expects empty tables."""
+    rng = random.Random(seed)
+    epoch = datetime(2025, 1, 1)
+    counts = {}
+
+    def timestamp(i: int) -> str:
+        return (epoch + timedelta(minutes=i * 7 % 500_000)).isoformat()
+
+    def vote_rows(parent_key: str, n_parents: int, per_parent: int):
+        for parent_id in range(1, n_parents + 1):
+            for user_id in rng.sample(range(1, scale.users + 1), k=min(per_parent, scale.users)):
+                yield {parent_key: parent_id, "user_id": user_id, "vote_type": "upvote" if rng.random() < 0.7 else "downvote"}
+
+    def follow_rows():
+        for follower_id in range(1, scale.users + 1):
+            for followed_id in rng.sample(range(1, scale.users + 1), k=min(scale.follows_per_user + 1, scale.users)):
+                if followed_id != follower_id:
+                    yield {"follower_id": follower_id, "followed_id": followed_id, "created_at": timestamp(follower_id)}
+
+    n_comments = scale.projects * scale.comments_per_project
+    n_post_comments = scale.posts * scale.comments_per_post
+    tables = [
+        (User, ({"id": i, "name": f"Användare {i}", "name_search": normalize_name(f"Användare {i}"),
+                 "email": f"user{i}@example.com", "password_hash": "x", "bio": "Bor i stan och gillar parker."}
+                for i in range(1, scale.users + 1))),
+        (Project, ({"id": i, "title": f"Kvarteret {i}", "preamble": "Nya bostäder, förskola och park. " * 4,
+                    "widget_text": "Bostäder och park", "location": rng.choice(AREAS), "phase": rng.choice(PHASES),
+                    "tidplan_html": "<ul><li>2025: Samråd</li><li>2026: Granskning</li></ul>",
+                    "coordinates": {"latitude": 59.2 + rng.random() * 0.2, "longitude": 17.9 + rng.random() * 0.2},
+                    "image_url": f"https://example.com/projects/{i}.jpg", "upvotes": 0, "downvotes": 0}
+                   for i in range(1, scale.projects + 1))),
+        (Post, ({"id": i, "title": f"Inlägg {i}", "content": "Vad tycker ni om den nya parken vid vattnet?",
+                 "created_at": timestamp(i), "user_id": rng.randint(1, scale.users),
+                 "coordinates": {"latitude": 59.3, "longitude": 18.05}, "upvotes": 0, "downvotes": 0}
+                for i in range(1, scale.posts + 1))),
+        (Comment, ({"id": i, "project_id": (i - 1) // scale.comments_per_project + 1, "user_id": rng.randint(1, scale.users),
+                    "content": "Bra förslag, men tänk på cykelbanorna.", "created_at": timestamp(i)}
+                   for i in range(1, n_comments + 1))),
+        (PostComment, ({"id": i, "post_id": (i - 1) // scale.comments_per_post + 1, "user_id": rng.randint(1, scale.users),
+                        "content": "Håller med!", "created_at": timestamp(i)}
+                       for i in range(1, n_post_comments + 1))),
+        (Vote, vote_rows("project_id", scale.projects, scale.votes_per_project)),
+        (PostVote, vote_rows("post_id", scale.posts, scale.votes_per_post)),
+        (CommentLike, ({"comment_id": c, "user_id": u}
+                       for c in range(1, n_comments + 1) if rng.random() < scale.likes_per_comment
+                       for u in [rng.randint(1, scale.users)])),
+        (UserFollow, follow_rows()),
+    ]
+
+    with Session() as db:
+        for model, rows in tables:
+            start = time.perf_counter()
+            n = 0
+            for batch in _batches(rows):
+                db.execute(insert(model), batch)
+                n += len(batch)
+            db.commit()
+            counts[model.__tablename__] = n
+            progress(f"  {model.__tablename__:14} {n:9,} rows  {time.perf_counter() - start:6.2f}s")
+
+        # denormalized counter maintained by follow/unfollow
+        followers = select(func.count(UserFollow.id)).where(UserFollow.followed_id == User.id).scalar_subquery()
+        db.execute(update(User).values(followers_count=followers).execution_options(synchronize_session=False))
+        db.commit()
+        # rollup maintained by comment/vote writes
+        start = time.perf_counter()
+        counts["user_project_activity"] = activity.rebuild(db)
+        progress(f"  {'user_project_activity':14} {counts['user_project_activity']:9,} rows  {time.perf_counter() - start:6.2f}s")
+        start = time.perf_counter()
+        counts["project_milestones"] = tidplan.rebuild(db)[1]
+        progress(f"  {'project_milestones':14} {counts['project_milestones']:9,} rows  {time.perf_counter() - start:6.2f}s")
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scale", type=float, default=1.0)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--db", required=True, help="SQLite file to create")
+    args = parser.parse_args()
+
+    engine = create_engine(f"sqlite:///{args.db}")
+    Base.metadata.create_all(bind=engine)
+    scale = Scale.of(args.scale)
+    print(f"generating {asdict(scale)}")
+    generate(sessionmaker(bind=engine), scale, seed=args.seed)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,265 @@
+# benchmarks/loadtest.py
+"""Load test of the main endpoints against a synthetic dataset.
+
+Run from backend/:
+    python -m benchmarks.loadtest [--scale 1] [--concurrency 8] [--seconds 10]
+    python -m benchmarks.loadtest --compare benchmarks/results/<older>.json
+
+Generates the dataset (benchmarks/dataset.py) in a throwaway SQLite file,
+serves the app with uvicorn on a free local port, and drives each scenario
+for --seconds from --concurrency closed-loop clients. Reports RPS,
+p50/p95/p99 latency and SQL statements per request (from the Server-Timing
+header) and writes everything to a JSON file for later comparison.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import socket
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict
+from datetime import datetime, timezone
+
+os.environ["METRICS_SERVER_TIMING"] = "1"  # before the app reads its settings
+os.environ.setdefault("RATE_LIMIT_ENABLED", "0")  # the write scenarios would be throttled
+
+import httpx  # noqa: E402
+import uvicorn  # noqa: E402
+
+from app.main import app, get_db, create_access_token  # noqa: E402
+
+from .common import temp_database  # noqa: E402
+from .dataset import Scale, generate  # noqa: E402
+from .check_query_budgets import QUERIES  # noqa: E402
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+TOKEN_USERS = 200  # distinct logged-in users the clients rotate through
+
+
+# ---- scenarios: (client, rng, ctx) -> list of responses ----
+
+def _auth(rng, ctx) -> tuple[int, dict]:
+    user_id = rng.randint(1, min(TOKEN_USERS, ctx["users"]))
+    return user_id, ctx["tokens"][user_id]
+
+
+def list_projects(client, rng, ctx):
+    return [client.get("/api/projects", headers=_auth(rng, ctx)[1])]
+
+
+def project_detail(client, rng, ctx):
+    return [client.get(f"/api/projects/{rng.randint(1, ctx['projects'])}", headers=_auth(rng, ctx)[1])]
+
+
+def projects_geojson(client, rng, ctx):
+    return [client.get("/api/projects/geojson")]
+
+
+def vote(client, rng, ctx):
+    body = {"project_id": rng.randint(1, ctx["projects"]), "vote_type": rng.choice(["upvote", "downvote"])}
+    return [client.post("/api/votes", json=body, headers=_auth(rng, ctx)[1])]
+
+
+def comment(client, rng, ctx):
+    body = {"project_id": rng.randint(1, ctx["projects"]), "content": "Lasttest: bra förslag!"}
+    return [client.post("/api/comments", json=body, headers=_auth(rng, ctx)[1])]
+
+
+def user_activity(client, rng, ctx):
+    return [client.get(f"/api/users/{rng.randint(1, ctx['users'])}/activity")]
+
+
+def for_you(client, rng, ctx):
+    return [client.get("/api/for_you", headers=_auth(rng, ctx)[1])]
+
+
+def follow(client, rng, ctx):
+    user_id, headers = _auth(rng, ctx)
+    target = rng.choice([u for u in rng.sample(range(1, ctx["users"] + 1), 2) if u != user_id])
+    response = client.post(f"/api/users/{target}/follow", headers=headers)
+    if response.status_code != 400:
+        return [response]
+    # already following: unfollow instead, so the graph keeps changing
+    return [response, client.delete(f"/api/users/{target}/follow", headers=headers)]
+
+
+SCENARIOS = {
+    "list": list_projects,
+    "detail": project_detail,
+    "geojson": projects_geojson,
+    "vote": vote,
+    "comment": comment,
+    "activity": user_activity,
+    "for_you": for_you,
+    "follow": follow,
+}
+
+
+# ---- server ----
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def serve(Session) -> tuple[uvicorn.Server, threading.Thread, str]:
+    def override_db():
+        db = Session()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app.dependency_overrides[get_db] = override_db
+    port = free_port()
+    # lifespan off: the real app.db is never opened or seeded
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, lifespan="off", log_level="warning", access_log=False))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+    return server, thread, f"http://127.0.0.1:{port}"
+
+
+# ---- measurement ----
+
+def percentile(sorted_values: list[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+def run_scenario(base_url: str, name: str, ctx: dict, concurrency: int, seconds: float, seed: int) -> dict:
+    scenario = SCENARIOS[name]
+    deadline = time.perf_counter() + seconds
+
+    def worker(n: int):
+        rng = random.Random(f"{seed}-{name}-{n}")
+        samples, statuses = [], {}
+        with httpx.Client(base_url=base_url, timeout=30) as client:
+            while time.perf_counter() < deadline:
+                start = time.perf_counter()
+                try:
+                    responses = scenario(client, rng, ctx)
+                except httpx.HTTPError:
+                    statuses["exception"] = statuses.get("exception", 0) + 1
+                    continue
+                elapsed = (time.perf_counter() - start) / len(responses)
+                for response in responses:
+                    statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+                    match = QUERIES.search(response.headers.get("server-timing", ""))
+                    samples.append((elapsed, int(match.group(1)) if match else 0))
+        return samples, statuses
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(worker, range(concurrency)))
+    wall = time.perf_counter() - started
+
+    samples = [s for worker_samples, _ in results for s in worker_samples]
+    statuses = {}
+    for _, worker_statuses in results:
+        for status, n in worker_statuses.items():
+            statuses[str(status)] = statuses.get(str(status), 0) + n
+    latencies = sorted(s[0] * 1000 for s in samples)
+    return {
+        "requests": len(samples),
+        "errors": sum(n for status, n in statuses.items() if status == "exception" or int(status) >= 500),
+        "statuses": statuses,
+        "rps": round(len(samples) / wall, 1),
+        "p50_ms": round(percentile(latencies, 0.50), 2),
+        "p95_ms": round(percentile(latencies, 0.95), 2),
+        "p99_ms": round(percentile(latencies, 0.99), 2),
+        "queries_per_request": round(sum(s[1] for s in samples) / len(samples), 2) if samples else 0,
+    }
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def print_results(results: dict, baseline: dict | None = None):
+    print(f"{'scenario':10} {'req':>7} {'err':>5} {'rps':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'q/req':>6}")
+    for name, r in results["scenarios"].items():
+        line = (f"{name:10} {r['requests']:7} {r['errors']:5} {r['rps']:8.1f} {r['p50_ms']:8.2f} "
+                f"{r['p95_ms']:8.2f} {r['p99_ms']:8.2f} {r['queries_per_request']:6.1f}")
+        old = (baseline or {}).get("scenarios", {}).get(name)
+        if old and old["rps"]:
+            line += f"   rps {(r['rps'] / old['rps'] - 1) * 100:+6.1f}%  p95 {r['p95_ms'] - old['p95_ms']:+7.2f} ms"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scale", type=float, default=1.0)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=10.0, help="per scenario")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="comma separated, default all")
+    parser.add_argument("--out", help="results file (default benchmarks/results/<time>-<rev>.json)")
+    parser.add_argument("--compare", help="earlier results file to diff against")
+    args = parser.parse_args()
+
+    names = [n.strip() for n in args.scenarios.split(",") if n.strip()]
+    unknown = set(names) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+
+    engine, Session = temp_database()
+    scale = Scale.of(args.scale)
+    print(f"dataset scale {args.scale}: {scale.users} users, {scale.projects} projects, {scale.posts} posts")
+    counts = generate(Session, scale, seed=args.seed)
+    ctx = {
+        "users": scale.users,
+        "projects": scale.projects,
+        "tokens": {u: {"Authorization": f"Bearer {create_access_token(u)}"} for u in range(1, min(TOKEN_USERS, scale.users) + 1)},
+    }
+
+    server, thread, base_url = serve(Session)
+    results = {
+        "meta": {
+            "revision": git_revision(),
+            "started_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "scale": args.scale,
+            "dataset": {"scale": asdict(scale), "rows": counts},
+            "concurrency": args.concurrency,
+            "seconds": args.seconds,
+            "seed": args.seed,
+        },
+        "scenarios": {},
+    }
+    try:
+        for name in names:
+            print(f"running {name} ...", flush=True)
+            results["scenarios"][name] = run_scenario(base_url, name, ctx, args.concurrency, args.seconds, args.seed)
+    finally:
+        server.should_exit = True
+        thread.join()
+        app.dependency_overrides.clear()
+        engine.dispose()
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+    print_results(results, baseline)
+
+    out = args.out or os.path.join(RESULTS_DIR, f"{datetime.now():%Y%m%d-%H%M%S}-{results['meta']['revision']}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"results written to {out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+# benchmarks/stress_toggles.py
+"""Hammer the like/vote toggles on the same rows from many threads.
+
+Run from backend/:  python -m benchmarks.stress_toggles [--threads 32] [--clicks 50]
+
+Uses a throwaway SQLite file, so app.db is never touched. Fails (exit 1) if any
+request returns 5xx or the final tallies disagree with the number of clicks.
+"""
+import argparse
+import os
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+os.environ.setdefault("RATE_LIMIT_ENABLED", "0")  # before the app reads its settings
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+from app.main import app, get_db, create_access_token  # noqa: E402
+from app.models import User, Project, Comment, CommentLike, Vote  # noqa: E402
+
+from .common import temp_database  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--threads", type=int, default=32)
+    parser.add_argument("--clicks", type=int, default=50, help="toggles per thread")
+    args = parser.parse_args()
+
+    engine, Session = temp_database()
+
+    with Session() as db:
+        users = [User(name=f"Stress {i}", email=f"stress{i}@example.com", password_hash="x") for i in range(args.threads + 1)]
+        db.add_all(users)
+        db.add(Project(id=1, title="Stress", coordinates={}))
+        db.flush()
+        db.add(Comment(id=1, project_id=1, user_id=users[0].id, content="hammer me", created_at="2025-01-01T00:00:00"))
+        db.commit()
+        voter_ids = [u.id for u in users[1:]]
+
+    def override_db():
+        db = Session()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app.dependency_overrides[get_db] = override_db
+    client = TestClient(app)  # no lifespan: the real app.db is not opened
+    shared = {"Authorization": f"Bearer {create_access_token(voter_ids[0])}"}
+
+    def worker(i):
+        own = {"Authorization": f"Bearer {create_access_token(voter_ids[i])}"}
+        statuses = Counter()
+        for n in range(args.clicks):
+            # every thread double-clicks the same like row, and votes on the same project
+            statuses[client.post("/api/comments/1/like", headers=shared).status_code] += 1
+            vote_type = "upvote" if n % 3 else "downvote"
+            statuses[client.post("/api/votes", json={"project_id": 1, "vote_type": vote_type}, headers=own).status_code] += 1
+        return statuses
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.threads) as pool:
+        statuses = sum(pool.map(worker, range(args.threads)), Counter())
+    elapsed = time.perf_counter() - start
+    app.dependency_overrides.clear()
+
+    total = sum(statuses.values())
+    print(f"{total} requests in {elapsed:.2f}s ({total / elapsed:.0f} req/s), statuses: {dict(statuses)}")
+
+    ok = not any(code >= 500 for code in statuses)
+    with Session() as db:
+        likes = db.query(CommentLike).filter(CommentLike.comment_id == 1).count()
+        expected_likes = (args.threads * args.clicks) % 2
+        print(f"likes on shared row: {likes} (expected {expected_likes})")
+        ok &= likes == expected_likes
+
+        # replay each voter's clicks sequentially to get the expected final vote
+        expected = Counter()
+        for _ in voter_ids:
+            current = None
+            for n in range(args.clicks):
+                clicked = "upvote" if n % 3 else "downvote"
+                current = None if current == clicked else clicked
+            if current:
+                expected[current] += 1
+        actual = Counter(vt for (vt,) in db.query(Vote.vote_type).filter(Vote.project_id == 1))
+        print(f"votes: {dict(actual)} (expected {dict(expected)})")
+        ok &= actual == expected
+
+    engine.dispose()
+    print("OK" if ok else "FAILED")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+# backend/gunicorn.conf.py
+"""Multi-worker deployment:
+
+    cd backend && gunicorn app.main:app -c gunicorn.conf.py
+
+WEB_CONCURRENCY sets the number of workers. The schema setup (new columns
+and their backfill, the activity and tidplan rebuilds) and the initial JSON
+import run once in the master, through `python -m app.seed`, before any
+worker starts; workers skip both, so they never race on the database. All workers share one SQLite file in WAL mode. Set
+SHARED_STATE_URL=redis://... when the entity or social-graph caches are
+enabled (ENTITY_CACHE_SIZE, SOCIAL_GRAPH_CACHE_SIZE), so that invalidations
+reach every worker.
+"""
+import multiprocessing
+import os
+import subprocess
+import sys
+
+bind = os.environ.get("BIND", f"0.0.0.0:{os.environ.get('PORT', '8000')}")
+workers = int(os.environ.get("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+worker_class = "uvicorn.workers.UvicornWorker"
+timeout = 60
+graceful_timeout = 20
+keepalive = 5
+
+# read by the workers' settings
+os.environ.setdefault("SQLITE_WAL", "1")
+os.environ.setdefault("SEED_ON_STARTUP", "off")
+os.environ.setdefault("SCHEMA_ON_STARTUP", "0")
+
+
+def _enabled(name: str) -> bool:
+    return os.environ.get(name, "").lower() in ("1", "true", "yes")
+
+
+def on_starting(server):
+    if workers > 1 and _enabled("WRITE_BUFFER_ENABLED"):
+        raise RuntimeError("WRITE_BUFFER_ENABLED keeps per-process state and a single journal; use one worker")
+    if workers > 1 and not _enabled("RATE_LIMIT_SHARED"):
+        server.log.warning("rate limits are counted per worker; set RATE_LIMIT_SHARED=1 with a redis:// SHARED_STATE_URL to share them")
+    caches = [n for n in ("ENTITY_CACHE_SIZE", "SOCIAL_GRAPH_CACHE_SIZE") if os.environ.get(n, "0") not in ("", "0")]
+    if workers > 1 and caches and os.environ.get("SHARED_STATE_URL", "memory://").startswith("memory"):
+        server.log.warning(f"{', '.join(caches)} set with memory:// shared state: invalidations won't reach other workers")
+    # a separate interpreter, so no app state (threads, connections) is inherited by the forked workers
+    subprocess.run([sys.executable, "-m", "app.seed"], check=True)
@@ -6,6 +6,10 @@ import time
 import json5
 import os
 import json
+import argparse
+import sys
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from urllib.parse import urljoin
 
 
@@ -197,20 +201,94 @@ def projects_to_json(projects):
 	print(f"✅ Saved projects to {output_path}")
 
 
+def open_image_prefetcher(cache_dir):
+	"""ImageProxy.prefetch from the backend app, storing into the same cache the
+	/api/img endpoint serves from. None (images are skipped) without Pillow."""
+	sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+	from app.images import create_image_proxy
+	from app.settings import settings
+
+	if cache_dir:
+		settings.IMG_CACHE_DIR = cache_dir
+	proxy = create_image_proxy(settings)
+	return proxy.prefetch if proxy else None
+
+
+def prefetch_image(prefetch, image_url):
+	"""Image fields for the project record; empty if there is no image or it failed"""
+	if not image_url:
+		return {}
+	try:
+		return prefetch(image_url)
+	except Exception as e:  # one bad image must not stop the scrape
+		print(f"⚠️ Could not prefetch {image_url}: {e}")
+		return {}
+
+
+def open_ndjson():
+	"""projects.ndjson, written one project per line as each one is scraped.
+	The importer reads whichever of the two was written last."""
+	output_dir = os.path.join(os.path.dirname(__file__), "..", "data_scraped")
+	os.makedirs(output_dir, exist_ok=True)
+	output_path = os.path.join(output_dir, "projects.ndjson")
+	return output_path, open(output_path + ".tmp", "w", encoding="utf-8")
+
+
 
 
 if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description="Scrape projects from vaxer.stockholm")
+	parser.add_argument("--format", choices=["json", "ndjson"], default="json",
+		help="ndjson streams each project to data_scraped/projects.ndjson as it is fetched")
+	parser.add_argument("--images", action="store_true",
+		help="download and resize each project image into the image cache, and record its size and placeholder")
+	parser.add_argument("--image-cache-dir", default=None, help="default: IMG_CACHE_DIR")
+	parser.add_argument("--image-workers", type=int, default=4)
+	args = parser.parse_args()
+
 	projects = scrape_all_projects()
-	
+	if args.format == "ndjson":
+		ndjson_path, ndjson_file = open_ndjson()
+
+	prefetch = open_image_prefetcher(args.image_cache_dir) if args.images else None
+	# images download on worker threads while the next pages are scraped
+	image_pool = ThreadPoolExecutor(max_workers=args.image_workers) if prefetch else None
+	pending = deque()  # (project, details, image future) in scrape order
+
+	def finish(proj, details, image):
+		if image is not None:
+			details.update(image.result())
+		if args.format == "ndjson":
+			# written as soon as its image is done, so the details are never all held in memory
+			ndjson_file.write(json.dumps({**proj, **details}, ensure_ascii=False) + "\n")
+			ndjson_file.flush()
+		else:
+			proj.update(details)
+
 	i = 1
 	for proj in projects:
 		proj['coordinates'] = convert_SWEREF_to_WGS84(proj['coordinates'])
 		if proj['url'] is None:
 			print(proj)
 		
-		proj.update(scrape_project_details(proj['url']))
-		print(f"Fetched {i}/{len(projects)} projects, Image URL for Project: {proj['image_url']}")
+		details = scrape_project_details(proj['url'])
+		print(f"Fetched {i}/{len(projects)} projects, Image URL for Project: {details['image_url']}")
+		image = image_pool.submit(prefetch_image, prefetch, details['image_url']) if image_pool else None
+		pending.append((proj, details, image))
+		while pending and (pending[0][2] is None or pending[0][2].done()):
+			finish(*pending.popleft())
 		i += 1
 		time.sleep(0.5)
 
-	projects_to_json(projects)
+	while pending:
+		finish(*pending.popleft())
+	if image_pool:
+		image_pool.shutdown()
+
+	if args.format == "ndjson":
+		ndjson_file.close()
+		# only replace the previous file once the scrape completed
+		os.replace(ndjson_path + ".tmp", ndjson_path)
+		print(f"✅ Saved projects to {ndjson_path}")
+	else:
+		projects_to_json(projects)
@@ -2,7 +2,7 @@ import { useState, useEffect } from "react";
 import { Link, useNavigate } from "react-router-dom";
 import { User, Search } from "lucide-react";
 import Navigation from "@/components/Navigation";
-import { Card, CardContent, CardDescription, CardHeader, CardTitle } from "@/components/ui/card";
+import { Card, CardContent, CardHeader, CardTitle } from "@/components/ui/card";
 import { Input } from "@/components/ui/input";
 import { useAuth } from "@/hooks/useAuth";
 import { apiFetch } from "@/api/config";
@@ -10,11 +10,12 @@ import { apiFetch } from "@/api/config";
 interface UserResult {
   id: number;
   name: string;
-  email: string;
   bio: string | null;
   followers_count: number;
 }
 
+const SEARCH_DEBOUNCE_MS = 250;
+
 const UserSearch = () => {
   const { isAuthenticated, user: currentUser, loading: authLoading } = useAuth();
   const navigate = useNavigate();
@@ -30,30 +31,32 @@ const UserSearch = () => {
       return;
     }
 
-    // Load all users initially
-    apiFetch("/users", { credentials: "include" })
-      .then(res => res.json())
-      .then(data => {
-        setUsers(data);
-        setLoading(false);
-      })
-      .catch(err => {
-        console.error("Failed to fetch users:", err);
-        setLoading(false);
-      });
-  }, [isAuthenticated, authLoading, navigate]);
+    // Search is done server-side (prefix match on name), debounced while typing
+    const controller = new AbortController();
+    const timer = setTimeout(() => {
+      const params = new URLSearchParams();
+      const query = searchQuery.trim();
+      if (query) params.set("q", query);
+      apiFetch(`/users?${params.toString()}`, { credentials: "include", signal: controller.signal })
+        .then(res => res.json())
+        .then(data => {
+          setUsers(data);
+          setLoading(false);
+        })
+        .catch(err => {
+          if (err.name === "AbortError") return;
+          console.error("Failed to fetch users:", err);
+          setLoading(false);
+        });
+    }, searchQuery ? SEARCH_DEBOUNCE_MS : 0);
 
-  const filteredUsers = users.filter(u => {
-    if (u.id === currentUser?.id) return false; // Don't show current user
-    if (!searchQuery) return true;
-    
-    const query = searchQuery.toLowerCase();
-    return (
-      u.name.toLowerCase().includes(query) ||
-      u.email.toLowerCase().includes(query) ||
-      (u.bio && u.bio.toLowerCase().includes(query))
-    );
-  });
+    return () => {
+      clearTimeout(timer);
+      controller.abort();
+    };
+  }, [isAuthenticated, authLoading, navigate, searchQuery]);
+
+  const filteredUsers = users.filter(u => u.id !== currentUser?.id); // Don't show current user
 
   if (loading) {
     return (
@@ -83,7 +86,7 @@ const UserSearch = () => {
             <Search className="absolute left-3 top-1/2 transform -translate-y-1/2 h-4 w-4 text-muted-foreground" />
             <Input
               type="text"
-              placeholder="Sök efter namn, e-post eller biografi..."
+              placeholder="Sök efter namn..."
               value={searchQuery}
               onChange={(e) => setSearchQuery(e.target.value)}
               className="pl-10"
@@ -109,7 +112,6 @@ const UserSearch = () => {
                      <CardTitle className="text-xl hover:text-primary transition-colors">
                        {user.name}
                      </CardTitle>
-                     <CardDescription>{user.email}</CardDescription>
                    </CardHeader>
                    <CardContent>
                      {user.bio && (